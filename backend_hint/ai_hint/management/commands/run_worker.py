@@ -1,40 +1,30 @@
-import json
 import os
 import time
 import logging
 import pika
 from django.core.management.base import BaseCommand
 
+from ai_hint.workers.scheduler import FairScheduler
 from ai_hint.workers.task_processors import process_task
 from ai_hint.utils.queue_utils import get_connection
+from user_customizable_configs.scheduler.loader import get_scheduler_config
 
 logger = logging.getLogger(__name__)
 
 
-def callback(ch, method, properties, body):
-    logger.info(f" [x] Worker callback received `{str(body)[:120]}`")
-    args = json.loads(body)
-
-    process_task(args)
-
-    ch.basic_ack(delivery_tag=method.delivery_tag)
-    logger.info(f" [x] Worker has done processing request {str(args)[:120]}")
-
-
 class Command(BaseCommand):
-    help = "Run a RabbitMQ task worker"
+    help = "Run a RabbitMQ task worker, taking tasks from the per-type lanes of the task queue"
 
     def add_arguments(self, parser):
         parser.add_argument("--queue", default=os.getenv("TASK_QUEUE", "task_queue"))
         parser.add_argument("--max-priority", type=int, default=int(os.getenv("QUEUE_MAX_PRIORITY", "3")))
-        parser.add_argument("--prefetch", type=int, default=1)
         parser.add_argument("--reconnect-delay", type=int, default=3)
 
 
     def handle(self, *args, **options):
         queue = options["queue"]
         max_priority = options["max_priority"]
-        prefetch = options["prefetch"]
+        config = get_scheduler_config()
         reconnect_delay = options["reconnect_delay"]
 
         self.stdout.write(self.style.SUCCESS(
@@ -47,19 +37,20 @@ class Command(BaseCommand):
                 connection = get_connection()
                 channel = connection.channel()
 
-                # Declare the task queue
-                channel.queue_declare(
-                    queue=queue,
-                    durable=True,
-                    arguments={"x-max-priority": max_priority},
-                )
+                # Declare the lanes and process their tasks one at a time
+                scheduler = FairScheduler(channel, queue, max_priority, config)
+                logger.info(f"Worker polling the lanes of '{queue}'...")
+                while True:
+                    task = scheduler.next_task()
+                    if task is None:
+                        # Keeps the connection alive (heartbeats) while idle
+                        connection.sleep(config.idle_sleep_seconds)
+                        continue
+                    logger.info(f" [x] Worker received from {task.lane}: `{str(task.arguments)[:120]}`")
+                    process_task(task.arguments)
+                    scheduler.done(task)
+                    logger.info(f" [x] Worker has done processing request {str(task.arguments)[:120]}")
 
-                # Set QoS and consume messages
-                channel.basic_qos(prefetch_count=prefetch)
-                channel.basic_consume(queue=queue, on_message_callback=callback)
-                logger.info(f"Worker consuming on '{queue}'...")
-                channel.start_consuming()
-            
             except (pika.exceptions.AMQPConnectionError, OSError):
                 logger.warning(f"RabbitMQ not reachable. Retry in {reconnect_delay}s")
                 time.sleep(reconnect_delay)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_hint', '0006_request_student_notebook'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programenhancementphase',
+            name='llm_attempts',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='hintgenerationphase',
+            name='llm_attempts',
+            field=models.IntegerField(null=True),
+        ),
+    ]
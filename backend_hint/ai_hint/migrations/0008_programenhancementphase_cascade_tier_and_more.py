@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_hint', '0007_programenhancementphase_llm_attempts_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programenhancementphase',
+            name='cascade_tier',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='programenhancementphase',
+            name='is_final_tier',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='programenhancementphase',
+            name='escalated',
+            field=models.BooleanField(default=False),
+        ),
+    ]
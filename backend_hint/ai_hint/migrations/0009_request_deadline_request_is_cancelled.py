@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_hint', '0008_programenhancementphase_cascade_tier_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='deadline',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='is_cancelled',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_hint', '0009_request_deadline_request_is_cancelled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='student_id',
+            field=models.CharField(max_length=100, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_hint', '0010_request_student_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enhancedprogram',
+            name='run_time_mad',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='enhancedprogram',
+            name='peak_memory_kb',
+            field=models.IntegerField(null=True),
+        ),
+    ]
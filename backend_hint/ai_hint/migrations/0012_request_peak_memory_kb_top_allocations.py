@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_hint', '0011_enhancedprogram_run_time_mad_peak_memory_kb'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='peak_memory_kb',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='top_allocations',
+            field=models.JSONField(null=True),
+        ),
+    ]
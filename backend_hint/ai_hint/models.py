@@ -7,9 +7,18 @@ class Request(models.Model):
     student_program = models.TextField()
     student_notebook = models.JSONField(null=True, blank=True, default=None)
     hint_type = models.CharField(max_length=20)
+    # Student who asked for the hint, used to schedule tasks fairly across students
+    student_id = models.CharField(max_length=100, null=True)
 
     student_program_output = models.TextField(null=True)
     run_time = models.FloatField(null=True)
+    # Memory profile of the student program (optimize hints): peak allocated, top allocation sites
+    peak_memory_kb = models.IntegerField(null=True)
+    top_allocations = models.JSONField(null=True)
+
+    # Time after which no more work is done for the request, and whether the student cancelled it
+    deadline = models.DateTimeField(null=True)
+    is_cancelled = models.BooleanField(default=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -31,6 +40,12 @@ class ProgramEnhancementPhase(models.Model):
     model_n = models.IntegerField()
     whole_llm_response = models.TextField()
     llm_waiting_seconds = models.FloatField()
+    llm_attempts = models.IntegerField(null=True)
+
+    # Position in the program generation cascade (0 when the cascade is disabled)
+    cascade_tier = models.IntegerField(default=0)
+    is_final_tier = models.BooleanField(default=True)
+    escalated = models.BooleanField(default=False)
 
     n_correct_enhancements = models.IntegerField(null=True)
     best_enhanced_program = models.TextField(null=True)
@@ -44,7 +59,11 @@ class EnhancedProgram(models.Model):
     enhanced_program = models.TextField()
     is_correct = models.BooleanField(null=True)
     program_output = models.TextField(null=True)
+    # Median CPU time of the test cases when benchmarked (optimize hints), else the CPU time of the test run
     run_time = models.FloatField(null=True)
+    # Benchmark figures (optimize hints): median absolute deviation of the CPU time, peak memory allocated
+    run_time_mad = models.FloatField(null=True)
+    peak_memory_kb = models.IntegerField(null=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -57,6 +76,7 @@ class HintGenerationPhase(models.Model):
     model_temperature = models.FloatField()
     whole_llm_response = models.TextField()
     llm_waiting_seconds = models.FloatField()
+    llm_attempts = models.IntegerField(null=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -1,3 +1,312 @@
-from django.test import TestCase
+import json
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+
+from ai_hint.models import EnhancedProgram, ProgramEnhancementPhase, Reflection, Request
+from ai_hint.utils.db_utils import add_request, escalate_program_enhancement_phase, get_request_deadline, is_data_ready_for_hint_generation
+from ai_hint.utils.openai_utils import PRIORITY_HIGH, PRIORITY_LOW, LLMDeadlineExceededError, LLMRateLimiter
+from ai_hint.utils.prompt_utils import build_problem_prefix, estimate_tokens, fit_to_token_budget
+from ai_hint.workers.scheduler import FairScheduler
+from ai_hint.workers.task_processors import RequestDeadlineExceededError, check_request_alive
+from user_customizable_configs.ai_config.loader import AIConfig, RateLimitConfig, get_ai_config
+from user_customizable_configs.scheduler.loader import SchedulerConfig
+
+
+class RequestDeadlineTests(TestCase):
+    def setUp(self):
+        # The student took longer than the whole budget to write the reflection
+        self.stale_deadline = time.time() - 60
+        add_request(
+            request_id=1,
+            problem_id="sum_two_numbers",
+            hint_type="debug",
+            student_program="print(1)",
+            deadline=datetime.fromtimestamp(self.stale_deadline, tz=timezone.utc),
+        )
+
+    def post_reflection(self, **data):
+        body = {"request_id": 1, "data": {"reflection_question": "q", "reflection_answer": "a", **data}}
+        with mock.patch("ai_hint.views.publish_task") as publish_task, \
+                mock.patch.dict("os.environ", {"ADD_REFLECTION_PRIORITY": "1"}):
+            response = self.client.post("/ai_hint/add_reflection/", json.dumps(body), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        return publish_task.call_args.kwargs["data"]
+
+    def test_reflection_restarts_the_budget(self):
+        data = self.post_reflection()
+        self.assertGreater(data["deadline"], time.time())
+        self.assertAlmostEqual(Request.objects.get(request_id=1).deadline.timestamp(), data["deadline"], places=3)
+        check_request_alive({"type": "generate_hint", "data": data})
+
+    def test_tasks_published_before_the_reflection_follow_the_extended_deadline(self):
+        self.post_reflection()
+        check_request_alive({"type": "generate_hint", "data": {"request_id": 1, "deadline": self.stale_deadline}})
+
+    def test_reflection_never_shortens_the_deadline(self):
+        later = time.time() + 3600
+        Request.objects.filter(request_id=1).update(deadline=datetime.fromtimestamp(later, tz=timezone.utc))
+        self.post_reflection(deadline=time.time() + 10)
+        self.assertAlmostEqual(Request.objects.get(request_id=1).deadline.timestamp(), later, places=3)
+
+    def add_reflection(self):
+        # The add_reflection task stores the reflection after the view has extended the deadline
+        return Reflection.objects.create(request_id=1, reflection_question="q", reflection_answer="a")
+
+    def test_budget_starts_with_the_reflection(self):
+        check_request_alive({"type": "run_student_program", "data": {"request_id": 1, "deadline": self.stale_deadline}})
+        self.assertGreater(get_request_deadline(Request.objects.get(request_id=1)), time.time())
+
+        self.post_reflection(deadline=time.time() + 60)
+        self.add_reflection()
+        self.assertLessEqual(get_request_deadline(Request.objects.get(request_id=1)), time.time() + 60)
+        Request.objects.filter(request_id=1).update(deadline=datetime.now(timezone.utc) - timedelta(seconds=1))
+        with self.assertRaises(RequestDeadlineExceededError):
+            check_request_alive({"type": "generate_hint", "data": {"request_id": 1}})
+        check_request_alive({"type": "return_hint", "data": {"request_id": 1}})
+
+    def test_reflection_relative_budget_without_stored_deadline(self):
+        Request.objects.filter(request_id=1).update(deadline=None)
+        reflection = self.add_reflection()
+        budget = get_ai_config().deadlines.hint_budget_seconds
+        self.assertEqual(get_request_deadline(Request.objects.get(request_id=1)), reflection.created_at.timestamp() + budget)
+
+
+class LLMRateLimiterTests(SimpleTestCase):
+    def limiter(self, **config):
+        # Slow refill (1 request, 10 tokens per 6 seconds), so that the tests see the buckets as they left them
+        config = {"requests_per_minute": 10, "tokens_per_minute": 100, "max_concurrent_requests": 100, "high_priority_reserve": 0.2, **config}
+        return LLMRateLimiter(RateLimitConfig(**config))
+
+    def test_low_priority_calls_leave_the_reserve_to_high_priority_ones(self):
+        limiter = self.limiter()
+        admitted = 0
+        while limiter.try_acquire("model", 10, PRIORITY_LOW):
+            admitted += 1
+        # 20 tokens and 2 requests are reserved
+        self.assertEqual(admitted, 8)
+        self.assertTrue(limiter.try_acquire("model", 10, PRIORITY_HIGH))
+        self.assertTrue(limiter.try_acquire("model", 10, PRIORITY_HIGH))
+        self.assertFalse(limiter.try_acquire("model", 10, PRIORITY_HIGH))
+
+    def test_buckets_are_per_model(self):
+        limiter = self.limiter()
+        self.assertTrue(limiter.try_acquire("model", 80, PRIORITY_LOW))
+        self.assertFalse(limiter.try_acquire("model", 80, PRIORITY_LOW))
+        self.assertTrue(limiter.try_acquire("other-model", 80, PRIORITY_LOW))
+
+    def test_oversized_call_is_admitted_with_a_full_bucket(self):
+        limiter = self.limiter()
+        self.assertTrue(limiter.try_acquire("model", 10_000, PRIORITY_LOW))
+        self.assertFalse(limiter.try_acquire("model", 10, PRIORITY_LOW))
+        self.assertTrue(limiter.try_acquire("model", 10, PRIORITY_HIGH))
+
+    def test_acquire_gives_up_at_the_deadline(self):
+        limiter = self.limiter()
+        limiter.acquire("model", 80, PRIORITY_LOW)
+        with self.assertRaises(LLMDeadlineExceededError):
+            limiter.acquire("model", 80, PRIORITY_LOW, deadline=time.time() + 1)
+
+    def test_concurrency_cap(self):
+        limiter = self.limiter(max_concurrent_requests=1)
+        self.assertTrue(limiter.try_acquire("model", 1, PRIORITY_HIGH))
+        self.assertFalse(limiter.try_acquire("model", 1, PRIORITY_HIGH))
+        limiter.release()
+        self.assertTrue(limiter.try_acquire("model", 1, PRIORITY_HIGH))
+
+    def test_headers_and_rate_limit_errors_update_the_buckets(self):
+        limiter = self.limiter()
+        limiter.update_from_headers("model", {"x-ratelimit-remaining-tokens": "15", "x-ratelimit-limit-tokens": "100"})
+        self.assertFalse(limiter.try_acquire("model", 10, PRIORITY_LOW))
+        self.assertTrue(limiter.try_acquire("model", 10, PRIORITY_HIGH))
+
+        limiter = self.limiter()
+        limiter.penalize("model", retry_after_seconds=30)
+        self.assertFalse(limiter.try_acquire("model", 1, PRIORITY_HIGH))
+
+    def test_shared_state_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_file = f"{tmp_dir}/rate_limits.json"
+            first, second = self.limiter(shared_state_file=state_file), self.limiter(shared_state_file=state_file)
+            self.assertTrue(first.try_acquire("model", 80, PRIORITY_LOW))
+            self.assertFalse(second.try_acquire("model", 80, PRIORITY_LOW))
+
+
+class PromptBudgetTests(SimpleTestCase):
+    def test_short_text_is_kept(self):
+        self.assertIsNone(fit_to_token_budget(None, 10))
+        self.assertEqual(fit_to_token_budget("print(1)\n", 10), "print(1)\n")
+
+    def test_keeps_whole_lines_from_the_start_and_end(self):
+        lines = [f"line {i:03}\n" for i in range(100)]
+        fitted = fit_to_token_budget("".join(lines), 50)
+        self.assertLessEqual(estimate_tokens(fitted), 60)
+        kept = fitted.splitlines(keepends=True)
+        marker = next(i for i, line in enumerate(kept) if "lines omitted" in line)
+        self.assertEqual(kept[:marker], lines[:marker])
+        self.assertEqual(kept[marker + 1:], lines[len(lines) - len(kept) + marker + 1:])
+        self.assertIn(f"[{len(lines) - len(kept) + 1} lines omitted]", kept[marker])
+
+    def test_head_share(self):
+        text = "".join(f"line {i:03}\n" for i in range(100))
+        self.assertTrue(fit_to_token_budget(text, 50, head_share=0.0).startswith("... ["))
+        self.assertTrue(fit_to_token_budget(text, 50, head_share=1.0).endswith("lines omitted] ...\n"))
+
+    def test_single_oversized_line_is_cut_by_characters(self):
+        text = "a" * 500 + "b" * 500
+        fitted = fit_to_token_budget(text, 50)
+        self.assertTrue(fitted.startswith("a" * 100))
+        self.assertTrue(fitted.endswith("b" * 100))
+        self.assertIn("[800 characters omitted]", fitted)
+
+    def test_problem_prefix_is_stable(self):
+        prefix = build_problem_prefix("Add two numbers.", "def foo(a, b):\n    pass")
+        self.assertEqual(prefix, build_problem_prefix("Add two numbers.", "def foo(a, b):\n    pass"))
+        self.assertTrue(prefix.startswith("Problem description:\nAdd two numbers.\n"))
+        self.assertNotIn("Starter template code", build_problem_prefix("Add two numbers."))
+
+
+# Advisory locks are PostgreSQL functions; the tests may run on another database
+@mock.patch("ai_hint.utils.db_utils._release_advisory")
+@mock.patch("ai_hint.utils.db_utils._acquire_advisory")
+class ProgramGenerationCascadeTests(TestCase):
+    def setUp(self):
+        self.request = add_request(request_id=1, problem_id="sum_two_numbers", hint_type="debug", student_program="print(1)")
+        Request.objects.filter(request_id=1).update(student_program_output="", run_time=0.1)
+        Reflection.objects.create(request=self.request, reflection_question="q", reflection_answer="a")
+        config = AIConfig(program_generation_cascade={"min_correct_programs": 1})
+        patcher = mock.patch("ai_hint.utils.db_utils.get_ai_config", return_value=config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_tier(self, cascade_tier, is_final_tier, results):
+        phase = ProgramEnhancementPhase.objects.create(
+            request=self.request, prompt="", model_id=f"model-{cascade_tier}", model_temperature=0.5, model_n=len(results),
+            whole_llm_response="", llm_waiting_seconds=0.0, cascade_tier=cascade_tier, is_final_tier=is_final_tier,
+        )
+        for is_correct in results:
+            EnhancedProgram.objects.create(phase=phase, enhanced_program="print(1)", is_correct=is_correct)
+        return phase
+
+    def test_tiers(self, *_):
+        config = AIConfig()
+        self.assertEqual(config.program_generation_tiers(), [config.program_generation_model])
+        config = AIConfig(program_generation_cascade={"enabled": True, "tiers": [{"name": "small"}, {"name": "large"}]})
+        self.assertEqual([tier.name for tier in config.program_generation_tiers()], ["small", "large"])
+
+    def test_tier_without_correct_programs_is_escalated_once(self, *_):
+        phase = self.add_tier(0, is_final_tier=False, results=[False, False])
+        self.assertFalse(is_data_ready_for_hint_generation(1))
+        self.assertEqual(escalate_program_enhancement_phase(phase.id), 1)
+        self.assertIsNone(escalate_program_enhancement_phase(phase.id))
+        phase.refresh_from_db()
+        self.assertTrue(phase.escalated)
+        self.assertEqual(phase.n_correct_enhancements, 0)
+
+        self.add_tier(1, is_final_tier=True, results=[False])
+        self.assertTrue(is_data_ready_for_hint_generation(1))
+
+    def test_tier_with_a_correct_program_goes_to_hint_generation(self, *_):
+        phase = self.add_tier(0, is_final_tier=False, results=[False, True])
+        self.assertIsNone(escalate_program_enhancement_phase(phase.id))
+        phase.refresh_from_db()
+        self.assertFalse(phase.escalated)
+        self.assertEqual(phase.n_correct_enhancements, 1)
+        self.assertTrue(is_data_ready_for_hint_generation(1))
+
+    def test_unfinished_or_final_tier_is_not_escalated(self, *_):
+        phase = self.add_tier(0, is_final_tier=False, results=[False, None])
+        self.assertIsNone(escalate_program_enhancement_phase(phase.id))
+        self.assertFalse(is_data_ready_for_hint_generation(1))
+        phase = self.add_tier(1, is_final_tier=True, results=[False])
+        self.assertIsNone(escalate_program_enhancement_phase(phase.id))
+
+
+class FakeChannel:
+    """In-memory stand-in for a RabbitMQ channel: queues keep their order, requeued messages go back to their position."""
+
+    def __init__(self):
+        self.queues = {}
+        self.unacked = {}
+        self.delivery_tags = iter(range(1, 1_000_000))
+
+    def queue_declare(self, queue, arguments, durable):
+        self.queues.setdefault(queue, [])
+
+    def publish(self, queue, arguments):
+        self.queues[queue].append((next(self.delivery_tags), json.dumps(arguments)))
+
+    def basic_get(self, queue, auto_ack):
+        if not self.queues[queue]:
+            return None, None, None
+        delivery_tag, body = self.queues[queue].pop(0)
+        self.unacked[delivery_tag] = (queue, body)
+        return SimpleNamespace(delivery_tag=delivery_tag), None, body
+
+    def basic_ack(self, delivery_tag):
+        del self.unacked[delivery_tag]
+
+    def basic_nack(self, delivery_tag, requeue):
+        queue, body = self.unacked.pop(delivery_tag)
+        self.queues[queue].append((delivery_tag, body))
+        self.queues[queue].sort()
+
+
+class FairSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.channel = FakeChannel()
+        self.scheduler = FairScheduler(self.channel, "tasks", 10, SchedulerConfig())
+
+    def publish(self, type, student_id, request_id=1):
+        self.channel.publish(f"tasks.{type}", {"type": type, "data": {"request_id": request_id, "student_id": student_id}})
+
+    def serve(self, n):
+        served = []
+        for _ in range(n):
+            task = self.scheduler.next_task()
+            if task is None:
+                break
+            self.scheduler.done(task)
+            served.append(task)
+        return served
+
+    def test_lanes_are_served_by_weight(self):
+        for i in range(100):
+            self.publish("generate_hint", f"student-{i}")
+            self.publish("query_for_enhanced_programs", f"student-{i}")
+        # Once the empty lanes are known, weights 6 and 2 among the lanes with waiting tasks
+        self.serve(8)
+        served = Counter(task.arguments["type"] for task in self.serve(40))
+        self.assertEqual(served, {"generate_hint": 30, "query_for_enhanced_programs": 10})
+
+    def test_a_burst_from_one_student_does_not_hold_up_the_others(self):
+        for request_id in range(5):
+            self.publish("run_student_buggy_program", "alice", request_id)
+        self.publish("run_student_buggy_program", "bob", 5)
+        served = [task.arguments["data"]["student_id"] for task in self.serve(10)]
+        self.assertEqual(served, ["alice", "bob", "alice", "alice", "alice", "alice"])
+        # Alice's tasks were put back in their order
+        self.assertEqual(self.channel.unacked, {})
+
+    def test_tasks_without_student_count_per_request(self):
+        self.channel.publish("tasks.generate_hint", {"type": "generate_hint", "data": {"request_id": 1}})
+        self.channel.publish("tasks.generate_hint", {"type": "generate_hint", "data": {"request_id": 1}})
+        self.channel.publish("tasks.generate_hint", {"type": "generate_hint", "data": {"request_id": 2}})
+        served = [task.arguments["data"]["request_id"] for task in self.serve(3)]
+        self.assertEqual(served, [1, 2, 1])
+
+    def test_malformed_tasks_are_dropped(self):
+        self.channel.queues["tasks.generate_hint"].append((0, b"not json"))
+        self.publish("generate_hint", "alice")
+        self.assertEqual(len(self.serve(5)), 1)
+        self.assertEqual(self.channel.unacked, {})
+
+    def test_base_queue_is_drained(self):
+        self.channel.publish("tasks", {"type": "generate_hint", "data": {"request_id": 1}})
+        self.assertEqual(len(self.serve(5)), 1)
+        self.assertIsNone(self.scheduler.next_task())
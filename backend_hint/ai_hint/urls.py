@@ -6,4 +6,5 @@ app_name = "ai_hint"
 urlpatterns = [
     path("add_request/", views.add_request, name="add_request_for_ai"),  # Orchestration backend adds request for AI hint
     path("add_reflection/", views.add_reflection, name="add_reflection_for_ai"),  # Orchestration backend adds reflection for AI hint
+    path("cancel_request/", views.cancel_request, name="cancel_request_for_ai"),  # Orchestration backend cancels a request for AI hint
 ]
\ No newline at end of file
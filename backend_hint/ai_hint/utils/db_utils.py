@@ -1,8 +1,11 @@
 import logging
+import time
+from datetime import datetime
 from typing import Tuple
 from django.db import IntegrityError, transaction, connection, models
 
 from ai_hint.models import EnhancedProgram, HintGenerationPhase, ProgramEnhancementPhase, Request, Reflection, Hint
+from user_customizable_configs.ai_config.loader import get_ai_config
 
 
 logger = logging.getLogger(__name__)
@@ -14,6 +17,8 @@ def add_request(
     hint_type: str,
     student_program: str = "",
     student_notebook: dict = None,
+    deadline: datetime | None = None,
+    student_id: str | None = None,
 ) -> Request:
     """
     Add a Request to the database.
@@ -27,6 +32,8 @@ def add_request(
             student_program=student_program,
             student_notebook=student_notebook,
             hint_type=hint_type,
+            deadline=deadline,
+            student_id=student_id,
         )
         logger.info("Request %s added to database", request_id)
         return obj
@@ -41,10 +48,12 @@ def add_request(
 def update_request_with_test_results(
     request_id: int,
     student_program_output: str,
-    run_time: float
+    run_time: float,
+    peak_memory_kb: int | None = None,
+    top_allocations: list | None = None,
 ) -> Tuple[Request, bool]:
     """
-    Update an existing Request with the results of running the student program.
+    Update an existing Request with the results of running the student program (and its memory profile, if benchmarked).
     Returns a boolean indicating if data is ready for hint generation.
     """
     _acquire_advisory(request_id)
@@ -56,9 +65,13 @@ def update_request_with_test_results(
             # Update fields
             req.student_program_output = student_program_output
             req.run_time = run_time
+            req.peak_memory_kb = peak_memory_kb
+            req.top_allocations = top_allocations
             req.save(update_fields=[
                 "student_program_output",
-                "run_time"
+                "run_time",
+                "peak_memory_kb",
+                "top_allocations",
             ])
             logger.info(f"Request {request_id} updated with test results")
 
@@ -84,6 +97,55 @@ def load_request(request_id: int) -> Request:
         raise
 
 
+def cancel_request(request_id: int) -> bool:
+    """
+    Mark a Request as cancelled, so that its pending tasks are dropped.
+    Returns False if the request does not exist.
+    """
+    updated = Request.objects.filter(request_id=request_id).update(is_cancelled=True)
+    if updated:
+        logger.info(f"Request {request_id} cancelled")
+    else:
+        logger.warning(f"Cannot cancel request {request_id}: does not exist")
+    return bool(updated)
+
+
+def is_request_cancelled(request_id: int) -> bool:
+    return Request.objects.filter(request_id=request_id, is_cancelled=True).exists()
+
+
+def get_request_student_id(request_id: int) -> str | None:
+    return Request.objects.filter(request_id=request_id).values_list("student_id", flat=True).first()
+
+
+def get_request_deadline(request: Request) -> float:
+    """
+    Deadline of a request as epoch seconds, counted from its reflection.
+    Before the reflection arrives the budget has not started yet, so it is counted from now;
+    requests created without a deadline get the configured hint budget.
+    """
+    budget = get_ai_config().deadlines.hint_budget_seconds
+    reflection_time = Reflection.objects.filter(request=request).values_list("created_at", flat=True).first()
+    if reflection_time is None:
+        return max(request.deadline.timestamp() if request.deadline is not None else 0, time.time() + budget)
+    if request.deadline is not None:
+        return request.deadline.timestamp()
+    return reflection_time.timestamp() + budget
+
+
+def extend_request_deadline(request_id: int, deadline: datetime) -> None:
+    """
+    Move the deadline of a request to `deadline`, unless it is already later.
+    """
+    updated = (
+        Request.objects.filter(request_id=request_id)
+        .filter(models.Q(deadline__isnull=True) | models.Q(deadline__lt=deadline))
+        .update(deadline=deadline)
+    )
+    if updated:
+        logger.info("Deadline of request %s extended to %s", request_id, deadline.isoformat())
+
+
 def add_reflection(
     request_id: int,
     reflection_question: str,
@@ -141,6 +203,9 @@ def add_program_enhancement_phase(
     model_n: int,
     whole_llm_response: str,
     llm_waiting_seconds: float,
+    llm_attempts: int | None = None,
+    cascade_tier: int = 0,
+    is_final_tier: bool = True,
 ) -> ProgramEnhancementPhase:
     """
     Create (once) the ProgramEnhancementPhase for a request.
@@ -158,8 +223,11 @@ def add_program_enhancement_phase(
                 model_n=model_n,
                 whole_llm_response=whole_llm_response,
                 llm_waiting_seconds=llm_waiting_seconds,
+                llm_attempts=llm_attempts,
+                cascade_tier=cascade_tier,
+                is_final_tier=is_final_tier,
             )
-            logger.info(f"ProgramEnhancementPhase {phase.id} created for request {request_id} (model_n={model_n})")
+            logger.info(f"ProgramEnhancementPhase {phase.id} created for request {request_id} (model_n={model_n}, cascade_tier={cascade_tier})")
             return phase
     except Request.DoesNotExist:
         logger.error(f"Cannot create ProgramEnhancementPhase: request {request_id} does not exist")
@@ -197,6 +265,45 @@ def update_program_enhancement_phase(
         raise
 
 
+def escalate_program_enhancement_phase(program_enhancement_phase_id: int) -> int | None:
+    """
+    Decide (once) whether a finished, non-final cascade tier must be escalated to the next tier.
+    Records the tier's number of correct programs. Returns the next tier, or None if no escalation is needed.
+    """
+    try:
+        request_id = ProgramEnhancementPhase.objects.get(id=program_enhancement_phase_id).request.request_id
+    except Exception as e:
+        logger.error(f"Error acquiring request_id for ProgramEnhancementPhase {program_enhancement_phase_id}: {e}")
+        raise
+
+    _acquire_advisory(request_id)
+    try:
+        with transaction.atomic():
+            phase = ProgramEnhancementPhase.objects.select_for_update().get(id=program_enhancement_phase_id)
+            if phase.is_final_tier or phase.escalated:
+                return None
+
+            eps_qs = EnhancedProgram.objects.filter(phase=phase)
+            if eps_qs.count() < phase.model_n or eps_qs.filter(is_correct__isnull=True).exists():
+                return None  # tier not finished yet
+
+            n_correct = eps_qs.filter(is_correct=True).count()
+            phase.n_correct_enhancements = n_correct
+            if n_correct >= get_ai_config().program_generation_cascade.min_correct_programs:
+                phase.save(update_fields=["n_correct_enhancements"])
+                return None
+
+            phase.escalated = True
+            phase.save(update_fields=["n_correct_enhancements", "escalated"])
+            logger.info(f"Escalating request {request_id} from cascade tier {phase.cascade_tier} ({n_correct} correct programs)")
+            return phase.cascade_tier + 1
+    except Exception:
+        logger.exception(f"Failed escalating ProgramEnhancementPhase {program_enhancement_phase_id}")
+        raise
+    finally:
+        _release_advisory(request_id)
+
+
 def load_program_enhancement_phase(
     request_id: int
 ) -> ProgramEnhancementPhase | None:
@@ -246,9 +353,11 @@ def update_enhanced_program(
     is_correct: bool | None,
     program_output: str | None = None,
     run_time: float | None = None,
+    run_time_mad: float | None = None,
+    peak_memory_kb: int | None = None,
 ) -> Tuple[EnhancedProgram, bool]:
     """
-    Update an existing EnhancedProgram with correctness, output and runtime.
+    Update an existing EnhancedProgram with correctness, output, runtime and benchmark figures.
     Returns a boolean indicating if data is ready for hint generation.
     """
     try:
@@ -264,7 +373,9 @@ def update_enhanced_program(
             ep.is_correct = is_correct
             ep.program_output = program_output
             ep.run_time = run_time
-            ep.save(update_fields=["is_correct", "program_output", "run_time"])
+            ep.run_time_mad = run_time_mad
+            ep.peak_memory_kb = peak_memory_kb
+            ep.save(update_fields=["is_correct", "program_output", "run_time", "run_time_mad", "peak_memory_kb"])
             logger.info(f"EnhancedProgram updated for program id {enhanced_program_id}")
             return ep, is_data_ready_for_hint_generation(request_id)
     except EnhancedProgram.DoesNotExist:
@@ -309,6 +420,7 @@ def add_hint_generation_phase(
     model_temperature: float,
     whole_llm_response: str,
     llm_waiting_seconds: float,
+    llm_attempts: int | None = None,
 ) -> HintGenerationPhase:
     """
     Add a new HintGenerationPhase for a given request.
@@ -327,6 +439,7 @@ def add_hint_generation_phase(
             model_temperature=model_temperature,
             whole_llm_response=whole_llm_response,
             llm_waiting_seconds=llm_waiting_seconds,
+            llm_attempts=llm_attempts,
         )
         logger.info(f"HintGenerationPhase added for request {request_id}")
         return phase
@@ -367,6 +480,13 @@ def add_generated_hint(
         raise
 
 
+def has_hint(request_id: int) -> bool:
+    """
+    Whether a Hint (successful or not) has already been recorded for a request.
+    """
+    return Hint.objects.filter(request__request_id=request_id).exists()
+
+
 def load_hint(request_id: int) -> Hint:
     """
     Load the generated hint for a given request ID.
@@ -406,11 +526,17 @@ def load_other_hint_data(request_id: int) -> dict:
     if prog_phase:
         for ep in EnhancedProgram.objects.filter(phase=prog_phase).order_by("id"):
             enhanced_programs.append(_serialize_instance(ep))
+    # All tiers of the program generation cascade (a single phase when the cascade is disabled)
+    prog_phases = [
+        _serialize_instance(phase)
+        for phase in ProgramEnhancementPhase.objects.filter(request=req).order_by("id")
+    ]
 
     return {
         "request": _serialize_instance(req),
         "reflection": _serialize_instance(reflection),
         "program_enhancement_phase": _serialize_instance(prog_phase),
+        "program_enhancement_phases": prog_phases,
         "enhanced_programs": enhanced_programs,
         "hint_generation_phase": _serialize_instance(hint_gen_phase),
         "hint": _serialize_instance(hint),
@@ -430,6 +556,7 @@ def is_data_ready_for_hint_generation(
       4. A ProgramEnhancementPhase exists.
       5. The expected number (model_n) of EnhancedProgram rows for THAT phase have been created.
       6. Each EnhancedProgram for the phase has not-None is_correct.
+      7. The phase is the final cascade tier, or it has enough correct EnhancedPrograms (otherwise it is escalated).
 
     Returns:
         bool (True if all conditions satisfied, else False)
@@ -476,6 +603,13 @@ def is_data_ready_for_hint_generation(
         logger.info(f"Readiness check: request id {request_id} has only {enhancement_run} / {generated} enhanced programs run")
         return False
 
+    # 7. Cascade tiers without enough correct programs are escalated instead
+    if not phase.is_final_tier:
+        n_correct = eps_qs.filter(is_correct=True).count()
+        if n_correct < get_ai_config().program_generation_cascade.min_correct_programs:
+            logger.info(f"Readiness check: request id {request_id} cascade tier {phase.cascade_tier} has only {n_correct} correct programs (escalating)")
+            return False
+
     logger.info(f"Readiness check: request id {request_id} READY")
     return True
 
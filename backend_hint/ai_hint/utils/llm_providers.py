@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Iterator, Mapping, Sequence
+import logging
+
+import httpx
+import openai
+from openai import OpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_chunk import Choice as ChunkChoice, ChoiceDelta
+
+from user_customizable_configs.ai_config.loader import StubProviderConfig, get_ai_config
+
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAIProvider:
+    """
+    Chat completions served by OpenAI. The client is created on first use, so importing
+    the module does not require `OPENAI_API_KEY`.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> OpenAI:
+        with self._lock:
+            if self._client is None:
+                api_key = os.environ["OPENAI_API_KEY"]
+                logger.info(f"Loaded OpenAI API key: {api_key[:5]}***")
+                # Retries are handled by ask_chatgpt so that they go through the rate limiter
+                self._client = OpenAI(api_key=api_key, max_retries=0)
+            return self._client
+
+    def create_chat_completion(self, model: str, timeout: float, stream: bool = False, **call_kwargs):
+        """
+        Returns the response headers and either a ChatCompletion or, if `stream`, an iterator of ChatCompletionChunk.
+        """
+        raw_response = self.client.with_options(timeout=timeout).chat.completions.with_raw_response.create(
+            model=model,
+            stream=stream,
+            **call_kwargs,
+        )
+        return raw_response.headers, raw_response.parse()
+
+
+class StubProvider:
+    """
+    Local stand-in for an LLM provider, for offline load tests of the worker pipeline.
+
+    Answers after a latency drawn from the configured distribution with canned JSON:
+    the program requested by the enhanced-program prompts (`fixed_program`/`optimized_program`),
+    or an explanation and hint otherwise. Draws are seeded by the configured seed, the prompt
+    and the number of times the prompt has been seen, so a benchmark replays identically.
+    """
+
+    def __init__(self, config: StubProviderConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self._prompt_counts: Counter = Counter()
+
+    def create_chat_completion(self, model: str, timeout: float, stream: bool = False, **call_kwargs):
+        messages = call_kwargs["messages"]
+        n = call_kwargs.get("n", 1)
+        rng = self._rng(model, messages)
+
+        latency = self._sample_latency(rng)
+        if latency > timeout:
+            time.sleep(timeout)
+            raise openai.APITimeoutError(request=httpx.Request("POST", "stub://chat/completions"))
+        if rng.random() < self.config.rate_limit_error_rate:
+            time.sleep(latency / 10)
+            raise openai.RateLimitError(
+                "Simulated rate limit",
+                response=httpx.Response(429, request=httpx.Request("POST", "stub://chat/completions"), headers={"retry-after": "1"}),
+                body=None,
+            )
+
+        content = self._answer(messages)
+        if stream:
+            return {}, self._stream(model, content, n, latency)
+
+        time.sleep(latency)
+        return {}, ChatCompletion(
+            id=f"stub-{rng.getrandbits(32):08x}",
+            choices=[
+                Choice(
+                    index=index,
+                    finish_reason="stop",
+                    logprobs=None,
+                    message=ChatCompletionMessage(role="assistant", content=content),
+                )
+                for index in range(n)
+            ],
+            created=int(time.time()),
+            model=model,
+            object="chat.completion",
+        )
+
+    def _stream(self, model: str, content: str, n: int, latency: float) -> Iterator[ChatCompletionChunk]:
+        """
+        Spread the latency over the chunks: the first chunk arrives after `first_token_share` of it.
+        """
+        chunk_size = self.config.stream_chunk_chars
+        pieces = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)] or [""]
+        time.sleep(latency * self.config.first_token_share)
+        inter_chunk_seconds = latency * (1 - self.config.first_token_share) / len(pieces)
+        for position, piece in enumerate(pieces):
+            if position:
+                time.sleep(inter_chunk_seconds)
+            is_last = position == len(pieces) - 1
+            yield ChatCompletionChunk(
+                id="stub-stream",
+                choices=[
+                    ChunkChoice(
+                        index=index,
+                        delta=ChoiceDelta(content=piece),
+                        finish_reason="stop" if is_last else None,
+                    )
+                    for index in range(n)
+                ],
+                created=int(time.time()),
+                model=model,
+                object="chat.completion.chunk",
+            )
+
+    def _rng(self, model: str, messages: Sequence[Mapping[str, str]]) -> random.Random:
+        digest = hashlib.sha256(json.dumps(list(messages), sort_keys=True).encode("utf-8")).hexdigest()
+        with self._lock:
+            self._prompt_counts[digest] += 1
+            count = self._prompt_counts[digest]
+        return random.Random(f"{self.config.seed}:{model}:{digest}:{count}")
+
+    def _sample_latency(self, rng: random.Random) -> float:
+        config = self.config
+        if config.latency_distribution == "fixed":
+            latency = config.latency_median_seconds
+        elif config.latency_distribution == "uniform":
+            latency = rng.uniform(0.0, 2 * config.latency_median_seconds)
+        else:  # lognormal: long right tail, like real completions
+            latency = rng.lognormvariate(0.0, config.latency_sigma) * config.latency_median_seconds
+        return min(latency, config.latency_max_seconds)
+
+    def _answer(self, messages: Sequence[Mapping[str, str]]) -> str:
+        user_message = str(messages[-1].get("content") or "")
+        field = re.search(r'field name "(fixed_program|optimized_program)"', user_message)
+        if field:
+            program = self.config.program
+            if program is None:
+                # Echo the student's program from the prompt
+                student_program = re.search(r"Student's program:\n```\n(.*?)\n```", user_message, re.DOTALL)
+                program = student_program.group(1) if student_program else ""
+            return json.dumps({field.group(1): program})
+        return json.dumps({"explanation": self.config.explanation, "hint": self.config.hint})
+
+
+@lru_cache(maxsize=1)
+def get_llm_provider():
+    """
+    The provider selected by `llm_provider.name` in the AI config.
+    """
+    provider_config = get_ai_config().llm_provider
+    if provider_config.name == "stub":
+        logger.warning("Using the local stub LLM provider: hints are canned, not generated")
+        return StubProvider(provider_config.stub)
+    return OpenAIProvider()
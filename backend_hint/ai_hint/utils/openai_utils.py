@@ -1,15 +1,239 @@
-import os
+import fcntl
+import json
+import random
+import re
+import threading
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Sequence
+from typing import Callable, Dict, Mapping, Optional, Sequence
 import logging
 
 import openai
-from openai import OpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+
+from ai_hint.utils.llm_providers import get_llm_provider
+from user_customizable_configs.ai_config.loader import RateLimitConfig, get_ai_config
 
 
 logger = logging.getLogger(__name__)
 
+# Priorities for admission when rate-limit capacity is scarce
+PRIORITY_HIGH = "high"  # e.g., hint generation: the student is waiting on it
+PRIORITY_LOW = "low"  # e.g., enhanced program generation
+
+# A call held back by the rate limiter waits at least MIN_ADMISSION_SLEEP_SECONDS
+MIN_ADMISSION_SLEEP_SECONDS = 0.05
+MAX_ADMISSION_SLEEP_SECONDS = 5.0
+MAX_BACKOFF_SECONDS = 30.0
+
+
+class LLMDeadlineExceededError(RuntimeError):
+    """Raised when an LLM call cannot complete before its deadline."""
+
+
+# Errors that will not go away by retrying the same request
+NON_RETRYABLE_ERRORS = (
+    openai.BadRequestError,
+    openai.AuthenticationError,
+    openai.PermissionDeniedError,
+    openai.NotFoundError,
+    openai.UnprocessableEntityError,
+)
+
+
+class LLMRateLimiter:
+    """
+    Token-bucket admission control for LLM calls.
+
+    Each model has two buckets (requests per minute, tokens per minute) that refill continuously.
+    The limits start from the AI config and are corrected from the provider's `x-ratelimit-*`
+    response headers. Low-priority calls cannot use the reserved share of a bucket, so hint
+    generation keeps getting through when capacity is scarce.
+
+    State is shared between the threads of a process. If `shared_state_file` is configured,
+    it is kept in that file under an exclusive `flock`, so all worker processes on the same
+    host draw from the same buckets.
+    """
+
+    def __init__(self, config: RateLimitConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self._state: Dict[str, dict] = {}
+        self._concurrency = threading.BoundedSemaphore(config.max_concurrent_requests)
+
+    def acquire(self, model: str, tokens: int, priority: str = PRIORITY_LOW, deadline: Optional[float] = None) -> float:
+        """
+        Block until the call is admitted. Returns the seconds spent waiting for admission.
+        Raises LLMDeadlineExceededError if the call cannot be admitted before `deadline`.
+        """
+        start_time = time.time()
+        while True:
+            wait_seconds = self._try_acquire(model, tokens, priority)
+            if wait_seconds <= 0:
+                break
+            if deadline is not None and time.time() + wait_seconds >= deadline:
+                raise LLMDeadlineExceededError(f"Rate limit for {model} does not admit the call before its deadline")
+            # Jitter so that workers woken up by the same refill do not retry in lockstep
+            time.sleep(min(wait_seconds, MAX_ADMISSION_SLEEP_SECONDS) * random.uniform(1.0, 1.25))
+        self._concurrency.acquire()
+        return time.time() - start_time
+
+    def try_acquire(self, model: str, tokens: int, priority: str = PRIORITY_LOW) -> bool:
+        """
+        Admit the call only if it can be admitted right away; nothing is taken otherwise.
+        """
+        if not self._concurrency.acquire(blocking=False):
+            return False
+        if self._try_acquire(model, tokens, priority) > 0:
+            self._concurrency.release()
+            return False
+        return True
+
+    def release(self) -> None:
+        self._concurrency.release()
+
+    def update_from_headers(self, model: str, headers: Optional[Mapping[str, str]]) -> None:
+        """
+        Synchronize a model's buckets with the rate-limit headers returned by the provider.
+        """
+        if not headers:
+            return
+        limit_requests = _parse_int_header(headers, "x-ratelimit-limit-requests")
+        limit_tokens = _parse_int_header(headers, "x-ratelimit-limit-tokens")
+        remaining_requests = _parse_int_header(headers, "x-ratelimit-remaining-requests")
+        remaining_tokens = _parse_int_header(headers, "x-ratelimit-remaining-tokens")
+
+        with self._locked_state() as state:
+            bucket = self._bucket(state, model, time.time())
+            if limit_requests:
+                bucket["rpm"] = limit_requests
+            if limit_tokens:
+                bucket["tpm"] = limit_tokens
+            if remaining_requests is not None:
+                bucket["requests"] = min(bucket["requests"], remaining_requests)
+            if remaining_tokens is not None:
+                bucket["tokens"] = min(bucket["tokens"], remaining_tokens)
+
+    def penalize(self, model: str, retry_after_seconds: float) -> None:
+        """
+        Empty a model's buckets until `retry_after_seconds` from now (after a rate-limit error).
+        """
+        with self._locked_state() as state:
+            bucket = self._bucket(state, model, time.time())
+            bucket["requests"] = 0.0
+            bucket["tokens"] = 0.0
+            bucket["updated_at"] = max(bucket["updated_at"], time.time() + retry_after_seconds)
+
+    def _try_acquire(self, model: str, tokens: int, priority: str) -> float:
+        """
+        Take capacity for one call if available and return 0; otherwise return the seconds to wait.
+        """
+        now = time.time()
+        with self._locked_state() as state:
+            bucket = self._bucket(state, model, now)
+            reserve = 0.0 if priority == PRIORITY_HIGH else self.config.high_priority_reserve
+            reserved_tokens = reserve * bucket["tpm"]
+            # A single oversized call must still be admissible: it takes at most the share of the
+            # bucket its priority may use (the bucket never holds more than tpm tokens)
+            tokens = min(tokens, bucket["tpm"] - reserved_tokens)
+            requests_needed = 1 + reserve * bucket["rpm"]
+            tokens_needed = tokens + reserved_tokens
+
+            if bucket["updated_at"] <= now and bucket["requests"] >= requests_needed and bucket["tokens"] >= tokens_needed:
+                bucket["requests"] -= 1
+                bucket["tokens"] -= tokens
+                return 0.0
+
+            return max(
+                bucket["updated_at"] - now,
+                (requests_needed - bucket["requests"]) * 60.0 / bucket["rpm"],
+                (tokens_needed - bucket["tokens"]) * 60.0 / bucket["tpm"],
+                MIN_ADMISSION_SLEEP_SECONDS,
+            )
+
+    def _bucket(self, state: Dict[str, dict], model: str, now: float) -> dict:
+        bucket = state.get(model)
+        if bucket is None:
+            bucket = {
+                "rpm": self.config.requests_per_minute,
+                "tpm": self.config.tokens_per_minute,
+                "requests": float(self.config.requests_per_minute),
+                "tokens": float(self.config.tokens_per_minute),
+                "updated_at": now,
+            }
+            state[model] = bucket
+
+        # Refill proportionally to the time elapsed since the last update
+        elapsed = now - bucket["updated_at"]
+        if elapsed > 0:
+            bucket["requests"] = min(bucket["rpm"], bucket["requests"] + elapsed * bucket["rpm"] / 60.0)
+            bucket["tokens"] = min(bucket["tpm"], bucket["tokens"] + elapsed * bucket["tpm"] / 60.0)
+            bucket["updated_at"] = now
+        return bucket
+
+    @contextmanager
+    def _locked_state(self):
+        with self._lock:
+            path = self.config.shared_state_file
+            if not path:
+                yield self._state
+                return
+
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or "{}")
+                    except ValueError:
+                        logger.warning(f"Discarding unreadable rate-limit state in {path}")
+                        state = {}
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    json.dump(state, f)
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@lru_cache(maxsize=1)
+def get_rate_limiter() -> LLMRateLimiter:
+    return LLMRateLimiter(get_ai_config().rate_limits)
+
+
+class LatencyTracker:
+    """
+    Sliding window of recent successful call latencies per model, used to decide when to hedge.
+    """
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {}
+        self._window = window
+
+    def record(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self._window)).append(seconds)
+
+    def percentile(self, model: str, percentile: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+
+latency_tracker = LatencyTracker()
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+
 
 def ask_chatgpt(
     messages: Sequence[Dict[str, str]],
@@ -19,48 +243,283 @@ def ask_chatgpt(
     n: int=1,
     presence_penalty=0,
     frequency_penalty=0,
+    priority: str = PRIORITY_LOW,
+    deadline: Optional[float] = None,  # epoch seconds; defaults to now + the hint budget
+    hedge_model: Optional[str] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
 ):
     """
-    Query OpenAI's API with handling of errors.
+    Query the configured LLM provider (see `llm_providers.py`) with handling of errors.
+    Calls are admitted through the shared rate limiter; retries back off with jitter and stop at the deadline.
+    If `hedge_model` is set and the call is slower than the model's usual tail latency, the same request is
+    also sent to `hedge_model` and the first answer wins.
+    If `on_delta` is set, the completion is streamed instead (without hedging) and `on_delta` is called with
+    the text received so far for the first choice. A retried attempt starts again from an empty text.
+
+    Returns the completion, the seconds spent in total (admission, retries and backoff included) and the number of attempts.
+    Raises LLMDeadlineExceededError once the deadline has passed, and re-raises non-retryable API errors immediately.
     """
+    deadline_config = get_ai_config().deadlines
+    start_time = time.time()
+    if deadline is None:
+        deadline = start_time + deadline_config.hint_budget_seconds
+
+    call_kwargs = dict(
+        messages=messages,
+        n=n,
+        temperature=temperature,
+        presence_penalty=presence_penalty,
+        frequency_penalty=frequency_penalty,
+        response_format={"type": response_format},
+    )
+    attempts = 0
     while True:
-        try:
-            start_time = time.time()
-            # Query
-            request_output = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                n=n,
-                temperature=temperature,
-                presence_penalty=presence_penalty,
-                frequency_penalty=frequency_penalty,
-                response_format={"type": response_format},
+        if time.time() >= deadline:
+            raise LLMDeadlineExceededError(
+                f"LLM call to {model} exceeded its deadline after {attempts} attempts ({time.time() - start_time:.1f}s)"
             )
-            end_time = time.time()
-            waiting_seconds = end_time - start_time
-
-            return request_output, waiting_seconds
+        attempts += 1
+        retry_delay = 0.0
+        try:
+            if on_delta is not None:
+                request_output = _stream_once(model, call_kwargs, priority, deadline, on_delta)
+            else:
+                request_output = _call_with_hedge(model, hedge_model, call_kwargs, priority, deadline)
+            waiting_seconds = time.time() - start_time
+            return request_output, waiting_seconds, attempts
 
+        except LLMDeadlineExceededError:
+            raise
+        except NON_RETRYABLE_ERRORS as e:
+            logger.error(f"Non-retryable error from OpenAI: status {e.status_code}, message: {getattr(e, 'message', '<<unknown>>')}")
+            raise
         except openai.RateLimitError:
             logger.error("Rate limited")
-            time.sleep(5)
+            retry_delay = 0.0  # the rate limiter holds back the next attempt
         except openai.APIStatusError as e:
             logger.error("Status error")
             logger.error(f"Status: {e.status_code}, Response: {e.response}, Message: {getattr(e, 'message', '<<unknown>>')}")
-            time.sleep(5)
+            retry_delay = _backoff_seconds(attempts - 1)
         except openai.APITimeoutError:
             logger.error("Timeout")
-            time.sleep(5)
+            retry_delay = _backoff_seconds(attempts - 1)
         except (
             openai.APIConnectionError,
             openai.APIError,
         ):
-            time.sleep(15)
+            retry_delay = _backoff_seconds(attempts - 1, base=15.0)
         except KeyError as e:
             logger.error(f"KeyError when invoking OpenAI client: {e}")
+            retry_delay = _backoff_seconds(attempts - 1)
+
+        time.sleep(max(0.0, min(retry_delay, deadline - time.time())))
+
+
+def _call_with_hedge(model: str, hedge_model: Optional[str], call_kwargs: dict, priority: str, deadline: float):
+    """
+    Run one attempt. If a hedge model is configured and the primary call outlives the model's
+    tail latency, fire the same request at the hedge model and return whichever succeeds first.
+    """
+    deadline_config = get_ai_config().deadlines
+    hedge_delay = None
+    if hedge_model and hedge_model != model:
+        hedge_delay = latency_tracker.percentile(
+            model, deadline_config.hedge_after_percentile, deadline_config.hedge_min_samples
+        )
+    if hedge_delay is None or hedge_delay >= deadline - time.time():
+        return _call_once(model, call_kwargs, priority, deadline)
+
+    # Admitted in this thread, so that the hedge delay only counts the call itself
+    rate_limiter = get_rate_limiter()
+    estimated_tokens = _estimate_call_tokens(rate_limiter, call_kwargs)
+    admission_seconds = rate_limiter.acquire(model, estimated_tokens, priority, deadline=deadline)
+    if admission_seconds >= MIN_ADMISSION_SLEEP_SECONDS:
+        # Capacity is scarce: a hedged call would only add to the load
+        return _call_admitted(model, call_kwargs, deadline)
+
+    primary_started = threading.Event()
+
+    def run_primary():
+        primary_started.set()
+        return _call_admitted(model, call_kwargs, deadline)
+
+    primary = _hedge_executor.submit(run_primary)
+    primary_started.wait()
+    done, _ = wait([primary], timeout=hedge_delay)
+    if done:
+        return primary.result()
+    if not rate_limiter.try_acquire(hedge_model, estimated_tokens, priority):
+        logger.info(
+            f"LLM call to {model} slower than p{deadline_config.hedge_after_percentile:g} ({hedge_delay:.1f}s); "
+            f"no capacity to hedge to {hedge_model}"
+        )
+        return primary.result()
+
+    logger.info(f"LLM call to {model} slower than p{deadline_config.hedge_after_percentile:g} ({hedge_delay:.1f}s); hedging to {hedge_model}")
+    secondary = _hedge_executor.submit(_call_admitted, hedge_model, call_kwargs, deadline)
+    pending = {primary, secondary}
+    first_error = None
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is secondary:
+                        logger.info(f"Hedged call to {hedge_model} answered first")
+                    return future.result()
+                first_error = first_error or future.exception()
+        raise first_error
+    finally:
+        # A losing call that has not started gives its admission back; one in flight runs to its timeout
+        for future in pending:
+            if future.cancel():
+                rate_limiter.release()
+
+
+def _call_once(model: str, call_kwargs: dict, priority: str, deadline: float):
+    """
+    A single call, admitted through the rate limiter (see `_call_admitted`).
+    """
+    rate_limiter = get_rate_limiter()
+    rate_limiter.acquire(model, _estimate_call_tokens(rate_limiter, call_kwargs), priority, deadline=deadline)
+    return _call_admitted(model, call_kwargs, deadline)
+
+
+def _call_admitted(model: str, call_kwargs: dict, deadline: float):
+    """
+    A single call already admitted by the rate limiter (released when it ends), bounded by the
+    per-call timeout and the remaining time to the deadline.
+    """
+    rate_limiter = get_rate_limiter()
+    try:
+        timeout = min(get_ai_config().deadlines.request_timeout_seconds, deadline - time.time())
+        if timeout <= 0:
+            raise LLMDeadlineExceededError(f"No time left for an LLM call to {model}")
+        start_time = time.time()
+        headers, completion = get_llm_provider().create_chat_completion(model, timeout, **call_kwargs)
+        latency_tracker.record(model, time.time() - start_time)
+        rate_limiter.update_from_headers(model, headers)
+        return completion
+    except openai.RateLimitError as e:
+        rate_limiter.update_from_headers(model, e.response.headers)
+        retry_after = _retry_after_seconds(e.response.headers)
+        rate_limiter.penalize(model, retry_after if retry_after is not None else _backoff_seconds(0))
+        raise
+    finally:
+        rate_limiter.release()
+
+
+def _stream_once(model: str, call_kwargs: dict, priority: str, deadline: float, on_delta: Callable[[str], None]):
+    """
+    A single admitted streaming call. The chunks are assembled into a regular ChatCompletion,
+    so that callers handle streamed and non-streamed completions the same way.
+    """
+    rate_limiter = get_rate_limiter()
+    rate_limiter.acquire(model, _estimate_call_tokens(rate_limiter, call_kwargs), priority, deadline=deadline)
+    try:
+        timeout = min(get_ai_config().deadlines.request_timeout_seconds, deadline - time.time())
+        if timeout <= 0:
+            raise LLMDeadlineExceededError(f"No time left for an LLM call to {model}")
+        start_time = time.time()
+        headers, chunks = get_llm_provider().create_chat_completion(model, timeout, stream=True, **call_kwargs)
+        rate_limiter.update_from_headers(model, headers)
+
+        contents: Dict[int, list] = {}
+        finish_reasons: Dict[int, Optional[str]] = {}
+        completion_id, created = "", int(start_time)
+        for chunk in chunks:
+            completion_id, created = chunk.id, chunk.created
+            for choice in chunk.choices:
+                if choice.delta.content:
+                    contents.setdefault(choice.index, []).append(choice.delta.content)
+                    if choice.index == 0:
+                        on_delta("".join(contents[0]))
+                if choice.finish_reason:
+                    finish_reasons[choice.index] = choice.finish_reason
+            if time.time() >= deadline:
+                raise LLMDeadlineExceededError(f"Streaming call to {model} exceeded its deadline")
+        latency_tracker.record(model, time.time() - start_time)
+
+        return ChatCompletion(
+            id=completion_id,
+            choices=[
+                Choice(
+                    index=index,
+                    finish_reason=finish_reasons.get(index) or "stop",
+                    logprobs=None,
+                    message=ChatCompletionMessage(role="assistant", content="".join(contents.get(index, []))),
+                )
+                for index in range(call_kwargs["n"])
+            ],
+            created=created,
+            model=model,
+            object="chat.completion",
+        )
+    except openai.RateLimitError as e:
+        rate_limiter.update_from_headers(model, e.response.headers)
+        retry_after = _retry_after_seconds(e.response.headers)
+        rate_limiter.penalize(model, retry_after if retry_after is not None else _backoff_seconds(0))
+        raise
+    finally:
+        rate_limiter.release()
+
+
+def _estimate_call_tokens(rate_limiter: LLMRateLimiter, call_kwargs: dict) -> int:
+    return _estimate_request_tokens(
+        call_kwargs["messages"], call_kwargs["n"], rate_limiter.config.completion_tokens_estimate
+    )
+
+
+def _estimate_request_tokens(messages: Sequence[Dict[str, str]], n: int, completion_tokens_estimate: int) -> int:
+    """
+    Rough token estimate (~4 characters per token) for the prompt plus the expected completions.
+    """
+    prompt_chars = sum(len(str(m.get("content") or "")) for m in messages)
+    return prompt_chars // 4 + n * completion_tokens_estimate
+
+
+def _backoff_seconds(attempt: int, base: float = 5.0) -> float:
+    """
+    Exponential backoff with full jitter, so that concurrent workers spread out their retries.
+    """
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, base * (2 ** attempt)))
+
+
+def _retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    # e.g. "x-ratelimit-reset-requests: 1s" or "6m0s"
+    reset = headers.get("x-ratelimit-reset-requests") or headers.get("x-ratelimit-reset-tokens")
+    if reset:
+        return _parse_duration(reset)
+    return None
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    multipliers = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(number) * multipliers[unit] for number, unit in parts)
 
 
-# Load openai
-api_key = os.environ["OPENAI_API_KEY"]
-logger.info(f"Loaded OpenAI API key: {api_key[:5]}***")
-client = OpenAI(api_key=api_key)
+def _parse_int_header(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
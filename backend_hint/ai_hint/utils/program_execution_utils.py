@@ -1,9 +1,13 @@
 import os
 import logging
 import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Union
 
 import requests
 
+from ai_hint.utils.http_utils import get_http_session
+
 logger = logging.getLogger(__name__)
 
 
@@ -11,13 +15,39 @@ class ProgramExecutionError(RuntimeError):
     """Raised when remote program execution fails."""
 
 
-def run_program_on_test_cases(problem_id: str, program: str) -> tuple[bool, str, float]:
+class ProgramExecutionCancelledError(ProgramExecutionError):
+    """Raised when a remote program execution is cancelled because its result is no longer needed."""
+
+
+@dataclass
+class BenchmarkStats:
+    """Benchmark figures of a correct program, from the problem handler's benchmark mode."""
+    # Median and median absolute deviation of the CPU time of the test cases, in seconds
+    cpu_time_median: float
+    cpu_time_mad: float
+    # Peak memory allocated while running the test cases, in KiB
+    peak_memory_kb: Optional[int]
+    # Lines of the program holding the most memory at its peak: {"line", "code", "size_kb", "count"}
+    top_allocations: List[dict] = field(default_factory=list)
+
+
+def run_program_on_test_cases(
+    problem_id: str,
+    program: str,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    notebook: Optional[Union[dict, str]] = None,
+) -> tuple[bool, str, float]:
     """
     Delegate execution to the problem handler backend.
 
     Args:
         problem_id (str): The ID of the programming problem.
         program (str): The student's program code as a string.
+        should_cancel (callable, optional): Checked while waiting for the result; when it returns True,
+            the execution is cancelled and ProgramExecutionCancelledError is raised.
+        notebook (dict, optional): The student's notebook (nbformat JSON) the program comes from. It is
+            sent instead of the program, for the problem handler to run its cells one by one; the program
+            is sent if the problem does not accept notebooks.
 
     Returns:
         tuple: A tuple containing:
@@ -25,6 +55,53 @@ def run_program_on_test_cases(problem_id: str, program: str) -> tuple[bool, str,
             - buggy_output (str): The output or error message from the last test case run.
             - elapsed_time (float): The total time taken to run all test cases in seconds.
     """
+    data = _execute_remotely(problem_id, program, should_cancel, mode="test", notebook=notebook)
+    return _parse_test_result(problem_id, data)
+
+
+def benchmark_program_on_test_cases(
+    problem_id: str,
+    program: str,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    notebook: Optional[Union[dict, str]] = None,
+) -> tuple[bool, str, float, Optional[BenchmarkStats]]:
+    """
+    Like `run_program_on_test_cases`, in the problem handler's benchmark mode: a correct program is
+    also rerun several times after warm-up, timing the test cases alone.
+
+    Returns:
+        tuple: correctness, buggy_output and elapsed_time as `run_program_on_test_cases`, and the
+            benchmark figures (None if the program is not correct or could not be benchmarked).
+    """
+    data = _execute_remotely(problem_id, program, should_cancel, mode="benchmark", notebook=notebook)
+    correctness, buggy_output, elapsed_time = _parse_test_result(problem_id, data)
+
+    stats = None
+    benchmark = data.get("benchmark")
+    if correctness and isinstance(benchmark, dict):
+        try:
+            stats = BenchmarkStats(
+                cpu_time_median=float(benchmark["cpu_time_median"]),
+                cpu_time_mad=float(benchmark["cpu_time_mad"]),
+                peak_memory_kb=int(benchmark["peak_traced_kb"]) if benchmark.get("peak_traced_kb") is not None else None,
+                top_allocations=[site for site in benchmark.get("top_allocations") or [] if isinstance(site, dict)],
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Ignoring malformed benchmark figures for problem_id={problem_id}: {benchmark} ({e})")
+    return correctness, buggy_output, elapsed_time, stats
+
+
+def _execute_remotely(
+    problem_id: str,
+    program: str,
+    should_cancel: Optional[Callable[[], bool]],
+    mode: str,
+    notebook: Optional[Union[dict, str]] = None,
+) -> dict:
+    """
+    Post an execution to the problem handler (through the orchestration backend) and poll for its result.
+    Returns the result data of the finished execution.
+    """
     if not problem_id or not isinstance(problem_id, str):
         raise ValueError("problem_id must be a non-empty string")
     if not isinstance(program, str):
@@ -41,20 +118,27 @@ def run_program_on_test_cases(problem_id: str, program: str) -> tuple[bool, str,
             "BACKEND_ORCHESTRATION_GET_EXECUTION_RESULT_URL not configured"
         )
 
-    payload = {
-        "problem_id": problem_id,
-        "student_program": program,
-    }
+    payloads = []
+    if notebook is not None:
+        payloads.append({"problem_id": problem_id, "student_notebook": notebook, "mode": mode})
+    payloads.append({"problem_id": problem_id, "student_program": program, "mode": mode})
 
-    # Post the execution request
-    try:
-        resp = requests.post(post_exec_task_url, json=payload)
-    except requests.RequestException as e:
-        logger.error(f"Network error executing program_id={problem_id}: {e}")
-        raise ProgramExecutionError(f"Network error: {e}") from e
-    except Exception as e:
-        logger.error(f"Unexpected error executing program_id={problem_id}: {e}")
-        raise ProgramExecutionError(f"Unexpected error: {e}") from e
+    # Post the execution request: the notebook if any, the program if the notebook is rejected
+    for payload in payloads:
+        try:
+            resp = get_http_session().post(post_exec_task_url, json=payload)
+        except requests.RequestException as e:
+            logger.error(f"Network error executing program_id={problem_id}: {e}")
+            raise ProgramExecutionError(f"Network error: {e}") from e
+        except Exception as e:
+            logger.error(f"Unexpected error executing program_id={problem_id}: {e}")
+            raise ProgramExecutionError(f"Unexpected error: {e}") from e
+        if resp.status_code == 400 and "student_notebook" in payload:
+            logger.warning(
+                f"Notebook not accepted for problem_id={problem_id}, executing the program instead: {resp.text[:500]}"
+            )
+            continue
+        break
 
     if resp.status_code != 200:
         # Attempt to extract backend error detail
@@ -80,15 +164,19 @@ def run_program_on_test_cases(problem_id: str, program: str) -> tuple[bool, str,
     # Now fetch the execution result
     try:
         while True:
-            resp = requests.get(get_exec_result_url, params={"execution_id": execution_id})
+            resp = get_http_session().get(get_exec_result_url, params={"execution_id": execution_id})
             if resp.status_code != 200:
                 raise ProgramExecutionError(f"Failed to get execution result, status code: {resp.status_code}")
             data = resp.json()
             job_finished = data.get("job_finished", False)
             if job_finished:
                 break
-            else:
-                time.sleep(3)  # Wait before polling again
+            if should_cancel is not None and should_cancel():
+                _cancel_execution(execution_id)
+                raise ProgramExecutionCancelledError(f"Execution {execution_id} cancelled")
+            time.sleep(3)  # Wait before polling again
+    except ProgramExecutionCancelledError:
+        raise
     except requests.RequestException as e:
         logger.error(f"Network error fetching execution result for execution_id={execution_id}: {e}")
         raise ProgramExecutionError(f"Network error: {e}") from e
@@ -101,6 +189,10 @@ def run_program_on_test_cases(problem_id: str, program: str) -> tuple[bool, str,
         logger.error(f"Backend error for executing a problem for problem_id={problem_id}: {data['error']}")
         raise ProgramExecutionError(f"Execution error: {data['error']}")
 
+    return data
+
+
+def _parse_test_result(problem_id: str, data: dict) -> tuple[bool, str, float]:
     # Expected keys: correctness (bool), buggy_output (str), elapsed_time (float)
     if "correctness" not in data or "elapsed_time" not in data or "buggy_output" not in data:
         raise ProgramExecutionError(f"Missing expected fields in response: {data}")
@@ -116,4 +208,19 @@ def run_program_on_test_cases(problem_id: str, program: str) -> tuple[bool, str,
         f"Remote execution result problem_id={problem_id} correctness={correctness} elapsed={elapsed_time:.4f}",
     )
 
-    return correctness, buggy_output, elapsed_time
\ No newline at end of file
+    return correctness, buggy_output, elapsed_time
+
+
+def _cancel_execution(execution_id: int) -> None:
+    """
+    Ask the problem handler (through the orchestration backend) to drop a pending execution. Best effort.
+    """
+    cancel_url = os.getenv("BACKEND_ORCHESTRATION_CANCEL_EXECUTION_URL")
+    if not cancel_url:
+        return
+    try:
+        resp = get_http_session().post(cancel_url, json={"execution_id": execution_id}, timeout=10)
+        resp.raise_for_status()
+        logger.info(f"Cancelled execution_id={execution_id}")
+    except Exception as e:
+        logger.warning(f"Failed to cancel execution_id={execution_id}: {e}")
@@ -0,0 +1,61 @@
+import logging
+from functools import lru_cache
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # rough estimate, good enough for budgeting
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    return len(text or "") // CHARS_PER_TOKEN
+
+
+@lru_cache(maxsize=256)
+def build_problem_prefix(task_description: str, template_code: Optional[str] = None) -> str:
+    """
+    Build the problem part that starts the user message of every prompt for a problem.
+    It depends only on the problem, so prompts for the same problem share a byte-identical
+    prefix (system message + this) that the provider can serve from its prompt cache.
+    """
+    prefix = f"Problem description:\n{task_description}\n\n"
+    if template_code:
+        prefix += f"Starter template code:\n```\n{template_code}\n```\n\n"
+    return prefix
+
+
+def fit_to_token_budget(text: Optional[str], max_tokens: int, head_share: float = 0.5, label: str = "text") -> Optional[str]:
+    """
+    Truncate `text` to about `max_tokens` tokens, keeping whole lines from its start and end
+    (`head_share` of the budget for the start) and marking the omitted middle part.
+    """
+    if text is None or estimate_tokens(text) <= max_tokens:
+        return text
+
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    lines = text.splitlines(keepends=True)
+    head, tail = [], []
+    head_chars = tail_chars = 0
+    for line in lines:
+        if head_chars + len(line) > max_chars * head_share:
+            break
+        head.append(line)
+        head_chars += len(line)
+    for line in reversed(lines[len(head):]):
+        if tail_chars + len(line) > max_chars - head_chars:
+            break
+        tail.insert(0, line)
+        tail_chars += len(line)
+
+    n_omitted = len(lines) - len(head) - len(tail)
+    if not head and not tail:
+        # A single oversized line: cut by characters instead
+        head_length = int(max_chars * head_share)
+        tail_length = max_chars - head_length
+        omitted_chars = len(text) - head_length - tail_length
+        logger.info(f"Truncated {label} from {len(text)} to {max_chars} characters for the prompt")
+        return f"{text[:head_length]}\n... [{omitted_chars} characters omitted] ...\n{text[len(text) - tail_length:]}"
+
+    logger.info(f"Truncated {label} from {len(lines)} to {len(head) + len(tail)} lines for the prompt")
+    separator = "" if not head or head[-1].endswith("\n") else "\n"
+    return f"{''.join(head)}{separator}... [{n_omitted} lines omitted] ...\n{''.join(tail)}"
@@ -20,28 +20,41 @@ def get_connection():
         return pika.BlockingConnection(pika.ConnectionParameters(host, port, credentials=credentials))
 
 
-def get_rabbitmq_channel():
-    # Connect to a local broker
-    connection = get_connection()
-    channel = connection.channel()
+def lane_queue_name(task_queue: str, type: str) -> str:
+    """
+    Name of the queue ("lane") holding the tasks of one type.
+    """
+    return f"{task_queue}.{type}"
+
+
+def declare_task_queue(channel, queue: str, max_priority: int):
     # Declare a queue (if not exists)
     channel.queue_declare(
-        queue=os.environ["TASK_QUEUE"],
-        arguments={"x-max-priority": int(os.environ["QUEUE_MAX_PRIORITY"])},
+        queue=queue,
+        arguments={"x-max-priority": max_priority},
         durable=True,
     )
+
+
+def get_rabbitmq_channel(queue: str):
+    # Connect to a local broker
+    connection = get_connection()
+    channel = connection.channel()
+    declare_task_queue(channel, queue, int(os.environ["QUEUE_MAX_PRIORITY"]))
     return connection, channel
 
 
 def publish_task(type: str, tries: int, data: dict, priority: int):
     """
-    Publish a task to the queue.
+    Publish a task to the lane of its type (see `ai_hint/workers/scheduler.py`).
     """
+    connection = None
+    queue = lane_queue_name(os.environ["TASK_QUEUE"], type)
     try:
-        connection, channel = get_rabbitmq_channel()
+        connection, channel = get_rabbitmq_channel(queue)
         channel.basic_publish(
             exchange="",
-            routing_key=os.environ["TASK_QUEUE"],
+            routing_key=queue,
             body=json.dumps({
                 "type": type,
                 "tries": tries,
@@ -62,3 +75,15 @@ def publish_task(type: str, tries: int, data: dict, priority: int):
                 connection.close()
             except Exception:
                 pass
+
+
+def follow_up_data(arguments: dict, **data) -> dict:
+    """
+    Data for a task published while processing the task `arguments`.
+    Request-wide fields (the request deadline and the student, used for fair scheduling) are carried over.
+    """
+    for field in ("deadline", "student_id"):
+        value = arguments.get("data", {}).get(field)
+        if value is not None:
+            data[field] = value
+    return data
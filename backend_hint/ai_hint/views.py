@@ -1,13 +1,16 @@
 import json
 import logging
 import os
+import time
+from datetime import datetime, timezone
 import requests
 
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 
-from ai_hint.utils.db_utils import add_request as add_request_db
+from ai_hint.utils.db_utils import add_request as add_request_db, cancel_request as cancel_request_db, extend_request_deadline, get_request_student_id
 from ai_hint.utils.queue_utils import publish_task
+from user_customizable_configs.ai_config.loader import get_ai_config
 
 logger = logging.getLogger(__name__)
 
@@ -17,8 +20,8 @@ def add_request(request):
     Receive a new hint request.
     1. Validate request method is POST.
     2. Extract request data.
-    3. Add request data to the database.
-    4. Publish task to the queue.
+    3. Add request data to the database, with the request's deadline.
+    4. Publish tasks to the queue, carrying the deadline.
     5. Return response.
     """
     # Validate request method
@@ -36,6 +39,10 @@ def add_request(request):
         hint_type = args['hint_type']
         student_program = args['student_program']
         student_notebook = args.get('student_notebook', None)
+        # Used to schedule the request's tasks fairly across students
+        student_id = args.get('student_id', None)
+        # Epoch seconds after which the request is abandoned; defaults to the configured hint budget
+        deadline = float(args.get('deadline') or time.time() + get_ai_config().deadlines.hint_budget_seconds)
     except Exception as e:
         logger.error(f"Error extracting data for add_request: {e}")
         return JsonResponse(f"Error extracting data for add_request: {e}", status=400)
@@ -48,17 +55,19 @@ def add_request(request):
             hint_type=hint_type,
             student_program=student_program,
             student_notebook=student_notebook,
+            deadline=datetime.fromtimestamp(deadline, tz=timezone.utc),
+            student_id=student_id,
         )
     except Exception as e:
         logger.error(f"Error adding data for add_request: {e}")
         return JsonResponse(f"Error adding data for add_request: {e}", status=500)
 
-    # Publish 2 tasks to queue: run student program and query for enhanced programs
+    # Publish 2 tasks to queue: run student program and query for enhanced programs (processed in parallel, sharing the deadline)
     try:
         publish_task(
             type="run_student_buggy_program",
             tries=1,
-            data={"request_id": request_id},
+            data={"request_id": request_id, "deadline": deadline, "student_id": student_id},
             priority=int(os.environ["RUN_STUDENT_PROGRAM_PRIORITY"]),
         )
     except Exception as e:
@@ -69,7 +78,7 @@ def add_request(request):
         publish_task(
             type="query_for_enhanced_programs",
             tries=1,
-            data={"request_id": request_id},
+            data={"request_id": request_id, "deadline": deadline, "student_id": student_id},
             priority=int(os.environ["QUERY_FOR_ENHANCED_PROGRAMS_PRIORITY"]),
         )
     except Exception as e:
@@ -87,7 +96,8 @@ def add_reflection(request):
     Receive student's reflection to add to a hint request.
     1. Validate request method is POST.
     2. Extract request data.
-    3. Publish task to the queue
+    3. Restart the request's time budget: the hint is only generated once the reflection arrives.
+    4. Publish task to the queue, with the request's student for fair scheduling.
     5. Return response.
     """
     # Validate request method
@@ -103,15 +113,23 @@ def add_reflection(request):
         args = payload['data']
         reflection_question = args['reflection_question']
         reflection_answer = args['reflection_answer']
+        deadline = float(args.get('deadline') or time.time() + get_ai_config().deadlines.hint_budget_seconds)
     except Exception as e:
         logger.error(f"Error extracting reflection data: {e}")
         return JsonResponse(f"Error extracting reflection data: {e}", status=400)
 
     try:
+        extend_request_deadline(request_id, datetime.fromtimestamp(deadline, tz=timezone.utc))
         publish_task(
             type="add_reflection",
             tries=1,
-            data={"request_id": request_id, "reflection_question": reflection_question, "reflection_answer": reflection_answer},
+            data={
+                "request_id": request_id,
+                "reflection_question": reflection_question,
+                "reflection_answer": reflection_answer,
+                "deadline": deadline,
+                "student_id": get_request_student_id(request_id),
+            },
             priority=int(os.environ["ADD_REFLECTION_PRIORITY"]),
         )
     except Exception as e:
@@ -123,3 +141,31 @@ def add_reflection(request):
     return HttpResponse(status=200)
 
 
+@csrf_exempt
+def cancel_request(request):
+    """
+    Cancel a hint request (the student stopped waiting).
+    Pending and future tasks of the request are dropped, so it stops consuming LLM calls and executions.
+    Request: POST { request_id: int }
+    Response: 204 on success
+    """
+    if request.method != "POST":
+        return HttpResponse(status=405)
+
+    try:
+        payload = json.loads(request.body)
+        request_id = int(payload["request_id"])
+    except Exception as e:
+        logger.error(f"Error extracting data for cancel_request: {e}")
+        return JsonResponse(f"Error extracting data for cancel_request: {e}", status=400)
+
+    try:
+        found = cancel_request_db(request_id)
+    except Exception as e:
+        logger.error(f"Error cancelling request {request_id}: {e}")
+        return JsonResponse(f"Error cancelling request: {e}", status=500)
+    if not found:
+        return HttpResponse(status=404)
+
+    logger.info(f" [*] Cancelled request {request_id}")
+    return HttpResponse(status=204)
@@ -4,7 +4,7 @@ import os
 from django.http import JsonResponse
 
 from ai_hint.utils.db_utils import add_reflection as add_reflection_db
-from ai_hint.utils.queue_utils import publish_task
+from ai_hint.utils.queue_utils import follow_up_data, publish_task
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +33,6 @@ def execute_add_reflection(arguments):
         publish_task(
             type="generate_hint",
             tries=1,
-            data={"request_id": request_id},
+            data=follow_up_data(arguments, request_id=request_id),
             priority=int(os.environ["GENERATE_HINT_PRIORITY"]),
         )
\ No newline at end of file
@@ -1,24 +1,18 @@
 import logging
 from typing import Optional
-from copy import deepcopy
+
+from ai_hint.utils.prompt_utils import build_problem_prefix, fit_to_token_budget
+from user_customizable_configs.ai_config.loader import get_ai_config
 
 logger = logging.getLogger(__name__)
 
 
-prompt_template = [
-    {
-        "role": "system", 
-        "content": None,
-    },
-    {
-        "role": "user", 
-        "content": """
-{problem_description}
-{template_code}
+# The problem prefix comes first so that the start of the prompt is byte-stable per problem (prompt caching)
+user_message_template = """
+{problem_prefix}
 {buggy_program}
 {command_tail}
-        """.strip()}
-]
+""".strip()
 
 prompt_components = {
     "system": {
@@ -40,26 +34,27 @@ def create_prompt_for_enhanced_programs(
 ):
     """
     Create a prompt for generating enhanced programs.
+    The student's program is truncated to the configured token budget.
     """
-    prompt = deepcopy(prompt_template)
+    budget = get_ai_config().prompt_budget
+    program_code = fit_to_token_budget(program_code, budget.max_program_tokens, label="student program")
 
-    # Format system message
-    prompt[0]["content"] = prompt_components["system"][modification_type]
-
-    # Format user message
-    problem_description_component = f"Problem description:\n{task_description}\n\n"
-    if template_code:
-        template_code_component = f"Starter template code:\n```\n{template_code}\n```\n\n"
-    else:
-        template_code_component = ""
     buggy_program_component = f"Student's program:\n```\n{program_code}\n```\n\n"
-    prompt[1]["content"] = prompt[1]["content"].format(
-        problem_description=problem_description_component,
-        template_code=template_code_component,
-        buggy_program=buggy_program_component,
-        command_tail=prompt_components["command_tail"][modification_type],
-    )
-    
+    prompt = [
+        {
+            "role": "system",
+            "content": prompt_components["system"][modification_type],
+        },
+        {
+            "role": "user",
+            "content": user_message_template.format(
+                problem_prefix=build_problem_prefix(task_description, template_code),
+                buggy_program=buggy_program_component,
+                command_tail=prompt_components["command_tail"][modification_type],
+            ),
+        },
+    ]
+
     logger.debug(f"Prompt for program repair:")
     logger.debug(f"System: {prompt[0]['content']}")
     logger.debug(f"User: {prompt[1]['content']}")
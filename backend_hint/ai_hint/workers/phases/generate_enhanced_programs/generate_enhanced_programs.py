@@ -6,14 +6,15 @@ from ai_hint.models import Request
 from ai_hint.utils.db_utils import (
     add_enhanced_program,
     add_program_enhancement_phase,
+    get_request_deadline,
     load_request,
 )
 from user_customizable_configs.ai_config.loader import get_ai_config
 from ai_hint.workers.phases.generate_enhanced_programs.create_prompt import (
     create_prompt_for_enhanced_programs,
 )
-from ai_hint.utils.queue_utils import publish_task
-from ai_hint.utils.openai_utils import ask_chatgpt
+from ai_hint.utils.queue_utils import follow_up_data, publish_task
+from ai_hint.utils.openai_utils import PRIORITY_LOW, ask_chatgpt
 from ai_hint.workers.phases.generate_enhanced_programs.query_for_task_description import (
     query_task_details,
 )
@@ -29,7 +30,7 @@ def execute_generate_enhanced_programs(arguments):
     For optimization hints, enhanced programs focus on optimizing for better performance and readability.
     1. Load program and query problem description
     2. Prepare a prompt
-    3. Load AI config
+    3. Load AI config and the model of the cascade tier (the only tier when the cascade is disabled)
     4. Generate enhanced programs
     5. Save the results to the database
     6. Publish tasks, each for running an enhanced program
@@ -62,18 +63,24 @@ def execute_generate_enhanced_programs(arguments):
     # Load AI config
     try:
         ai_config = get_ai_config()
+        tiers = ai_config.program_generation_tiers()
+        cascade_tier = min(int(arguments["data"].get("cascade_tier", 0)), len(tiers) - 1)
+        model_config = tiers[cascade_tier]
     except Exception as e:
         logger.error(f"Error loading AI config: {e}")
         raise
 
     # Generate enhanced programs
     enhanced_programs = []
-    query_output, waiting_seconds = ask_chatgpt(
+    query_output, waiting_seconds, attempts = ask_chatgpt(
         messages=prompt,
-        model=ai_config.program_generation_model.name,
-        temperature=ai_config.program_generation_model.temperature,
-        n=ai_config.program_generation_model.n_programs,
+        model=model_config.name,
+        temperature=model_config.temperature,
+        n=model_config.n_programs,
         response_format="json_object",
+        priority=PRIORITY_LOW,
+        deadline=get_request_deadline(hint_request),
+        hedge_model=model_config.hedge_model,
     )
 
     for choice in query_output.choices:
@@ -93,9 +100,9 @@ def execute_generate_enhanced_programs(arguments):
         else:
             enhanced_programs.append("")
 
-    if len(enhanced_programs) != ai_config.program_generation_model.n_programs:
+    if len(enhanced_programs) != model_config.n_programs:
         logger.error(
-            f"Expected {ai_config.program_generation_model.n_programs} enhanced programs, but got {len(enhanced_programs)} from LLM's answer"
+            f"Expected {model_config.n_programs} enhanced programs, but got {len(enhanced_programs)} from LLM's answer"
         )
         raise ValueError("Mismatch in number of enhanced programs generated")
 
@@ -107,11 +114,14 @@ def execute_generate_enhanced_programs(arguments):
     phase = add_program_enhancement_phase(
         request_id=request_id,
         prompt=str(prompt),
-        model_id=ai_config.program_generation_model.name,
-        model_temperature=ai_config.program_generation_model.temperature,
-        model_n=ai_config.program_generation_model.n_programs,
+        model_id=model_config.name,
+        model_temperature=model_config.temperature,
+        model_n=model_config.n_programs,
         whole_llm_response=str(query_output),
         llm_waiting_seconds=waiting_seconds,
+        llm_attempts=attempts,
+        cascade_tier=cascade_tier,
+        is_final_tier=cascade_tier == len(tiers) - 1,
     )
 
     enhanced_program_ids = []
@@ -127,6 +137,6 @@ def execute_generate_enhanced_programs(arguments):
         publish_task(
             type="run_enhanced_program",
             tries=1,
-            data={"request_id": request_id, "enhanced_program_id": enhanced_program_id},
+            data=follow_up_data(arguments, request_id=request_id, enhanced_program_id=enhanced_program_id),
             priority=int(os.environ["RUN_ENHANCED_PROGRAM_PRIORITY"]),
         )
@@ -1,10 +1,21 @@
 import os
 import logging
-from typing import Optional, Tuple
+import threading
+import time
+from typing import Dict, Optional, Tuple
 import requests
 
+from ai_hint.utils.http_utils import get_http_session
+
 logger = logging.getLogger(__name__)
 
+# Cached task details are used without asking for this long, then revalidated with their ETag
+PROBLEM_METADATA_MAX_AGE_SECONDS = float(os.getenv("PROBLEM_METADATA_MAX_AGE_SECONDS", "30"))
+
+# problem_id -> (etag, validated at (monotonic), task_description, template_code)
+_task_details_cache: Dict[str, Tuple[str, float, str, Optional[str]]] = {}
+_task_details_cache_lock = threading.Lock()
+
 
 class TaskDescriptionQueryError(RuntimeError):
     """Raised when fetching a task description fails."""
@@ -14,6 +25,8 @@ def query_task_details(problem_id: str) -> Tuple[str, Optional[str]]:
     """
     Fetch the task description and template code for the given problem_id
     from the problem handler backend (via orchestration).
+    Answers are cached per worker process and revalidated with If-None-Match
+    after PROBLEM_METADATA_MAX_AGE_SECONDS, so they are downloaded once per change.
 
     Returns:
         A tuple of (task_description, template_code). template_code can be None if not available.
@@ -25,12 +38,18 @@ def query_task_details(problem_id: str) -> Tuple[str, Optional[str]]:
     if not problem_id or not isinstance(problem_id, str):
         raise ValueError("problem_id must be a non-empty string")
 
+    with _task_details_cache_lock:
+        cached = _task_details_cache.get(problem_id)
+    if cached is not None and time.monotonic() - cached[1] < PROBLEM_METADATA_MAX_AGE_SECONDS:
+        return cached[2], cached[3]
+
     url = os.getenv("BACKEND_ORCHESTRATION_GET_PROBLEMS_URL")
 
     params = {"problem_id": problem_id}
+    headers = {"If-None-Match": cached[0]} if cached is not None else {}
 
     try:
-        resp = requests.get(url, params=params)
+        resp = get_http_session().get(url, params=params, headers=headers)
     except requests.RequestException as e:
         logger.error(f"Network error querying problem_id={problem_id}: {e}")
         raise TaskDescriptionQueryError(f"Network error: {e}") from e
@@ -38,6 +57,11 @@ def query_task_details(problem_id: str) -> Tuple[str, Optional[str]]:
         logger.error(f"Unexpected error querying problem_id={problem_id}: {e}")
         raise TaskDescriptionQueryError(f"Unexpected error: {e}") from e
 
+    if resp.status_code == 304 and cached is not None:
+        with _task_details_cache_lock:
+            _task_details_cache[problem_id] = (cached[0], time.monotonic(), cached[2], cached[3])
+        return cached[2], cached[3]
+
     if resp.status_code == 404:
         raise TaskDescriptionQueryError(f"Problem not found: {problem_id}")
 
@@ -69,4 +93,9 @@ def query_task_details(problem_id: str) -> Tuple[str, Optional[str]]:
     if not isinstance(template_code, str):
         template_code = None
 
+    etag = resp.headers.get("ETag")
+    if etag:
+        with _task_details_cache_lock:
+            _task_details_cache[problem_id] = (etag, time.monotonic(), desc, template_code)
+
     return desc, template_code
@@ -1,25 +1,21 @@
-from typing import Optional
-from copy import deepcopy
+from typing import List, Optional
 
+from ai_hint.utils.prompt_utils import build_problem_prefix, fit_to_token_budget
+from user_customizable_configs.ai_config.loader import get_ai_config
 
-prompt_template = [
-    {
-        "role": "system",
-        "content": "You are a helpful teaching assistant. You are helping students learn to solve programming problems in a Python course. Below you are provided a student's current program for a Python programming problem.{mention_reflection_in_system} Your goal is to help the student by providing a pedagogical hint. Write a hint that can be directly presented to the student, and be socratic and friendly.",
-    },
-    {
-        "role": "user",
-        "content": """
-{problem_description}
-{template_code}
+
+# The system message is static and the problem prefix comes first, so that the start of the prompt
+# is byte-stable per problem (prompt caching); everything specific to the request follows.
+system_message = "You are a helpful teaching assistant. You are helping students learn to solve programming problems in a Python course. Below you are provided a student's current program for a Python programming problem. Your goal is to help the student by providing a pedagogical hint. Write a hint that can be directly presented to the student, and be socratic and friendly."
+
+user_message_template = """
+{problem_prefix}
 {program_code}
 {reflection}
-{output}
+{output}{memory_profile}
 {reference_program}
 {command_tail}
-        """.strip()
-    }
-]
+""".strip()
 
 prompt_components = {
     "command_tail": {
@@ -28,7 +24,6 @@ prompt_components = {
         "optimize": "(1) Detailed Explanation: Can you explain any issues in the student's program in terms of speed, readability, and memory usage along with possible ways to optimize in a step by step manner?{mention_reflection_in_explanation}\n\n(2) Pedagogical Hint: Can you provide a hint about optimizing the student's program in terms of speed, readability, and memory usage? The hint should focus on helping the student with optimizing the student's program, instead of helping in debugging. Do not give away the solution or write any code in the hint. Write a hint that can be directly presented to the student, and be socratic and friendly. Keep your hint concise.{mention_reflection_in_hint}\n\nOutput only the explanation for (1) and the hint for (2) in JSON format with the field names \"explanation\" and \"hint\", respectively.",
     },
     "mention_reflection": {
-        "in_system": " Additionally, the student has shared their reflection about possible issues.",
         "in_explanation": " In your explanation, you should consider the student's reflection if you think it is relevant.",
         "in_hint": " In your hint, you should consider the student's reflection if you think it is relevant.",
         "in_debugging_hint": " In your hint, you should consider the student's reflection if you think it is relevant; in particular, when a student mentions a specific bug or issue, prioritize your hint based on that issue."
@@ -48,26 +43,24 @@ def create_prompt_for_hint_generation(
     hint_type: str,
     reflection: Optional[str],
     template_code: Optional[str] = None,
+    peak_memory_kb: Optional[int] = None,
+    top_allocations: Optional[List[dict]] = None,
 ):
-    prompt = deepcopy(prompt_template)
+    """
+    Create a prompt for generating a hint.
+    The student's program, its output, the reflection and the reference program are truncated to the configured token budget.
+    For optimize hints, the memory profile of the student's program (peak memory allocated by the test cases and
+    the lines allocating the most) is included when known.
+    """
+    budget = get_ai_config().prompt_budget
+    program_code = fit_to_token_budget(program_code, budget.max_program_tokens, label="student program")
+    enhanced_program = fit_to_token_budget(enhanced_program, budget.max_program_tokens, label="reference program")
+    # Errors are usually at the end of the output: keep more of it
+    program_output = fit_to_token_budget(program_output, budget.max_output_tokens, head_share=0.25, label="program output")
+    reflection = fit_to_token_budget(reflection, budget.max_reflection_tokens, label="reflection")
 
-    # Format system message
     reflection_is_substantial = assess_reflection_substantial(reflection)
-    if reflection_is_substantial:
-        prompt[0]["content"] = prompt[0]["content"].format(
-            mention_reflection_in_system=prompt_components["mention_reflection"]["in_system"],
-        )
-    else:
-        prompt[0]["content"] = prompt[0]["content"].format(
-            mention_reflection_in_system="",
-        )
-    
-    # Format user message
-    problem_description_component = f"Problem description:\n{task_description}\n\n"
-    if template_code:
-        template_code_component = f"Starter template code:\n```\n{template_code}\n```\n\n"
-    else:
-        template_code_component = ""
+
     program_code_component = f"Student's program:\n```\n{program_code}\n```\n\n"
     if reflection_is_substantial:
         reflection_component = f"Student's reflection about possible issues:\n{reflection}\n\n"
@@ -77,6 +70,10 @@ def create_prompt_for_hint_generation(
         output_component = f"Current output of the student program:\n{program_output}\n\n"
     else:  # Don't include output information for planning and optimization hints
         output_component = ""
+    if hint_type == "optimize" and peak_memory_kb is not None:
+        memory_profile_component = format_memory_profile(peak_memory_kb, top_allocations or [])
+    else:
+        memory_profile_component = ""
     if enhanced_program:
         reference_program_component = prompt_components["reference_program"][hint_type].format(
             reference_program=enhanced_program
@@ -95,19 +92,37 @@ def create_prompt_for_hint_generation(
             mention_reflection_in_hint="",
             mention_reflection_in_debugging_hint="",
         )
-    prompt[1]["content"] = prompt[1]["content"].format(
-        problem_description=problem_description_component,
-        template_code=template_code_component,
-        program_code=program_code_component,
-        reflection=reflection_component,
-        output=output_component,
-        reference_program=reference_program_component,
-        command_tail=command_tail_component,
-    )
+    prompt = [
+        {
+            "role": "system",
+            "content": system_message,
+        },
+        {
+            "role": "user",
+            "content": user_message_template.format(
+                problem_prefix=build_problem_prefix(task_description, template_code),
+                program_code=program_code_component,
+                reflection=reflection_component,
+                output=output_component,
+                memory_profile=memory_profile_component,
+                reference_program=reference_program_component,
+                command_tail=command_tail_component,
+            ),
+        },
+    ]
 
     return prompt
 
 
+def format_memory_profile(peak_memory_kb: int, top_allocations: List[dict]) -> str:
+    lines = [f"Memory profile of the student program on the test cases: at most {peak_memory_kb} KiB allocated."]
+    if top_allocations:
+        lines.append("Lines of the student program holding the most memory at that point:")
+        for site in top_allocations:
+            lines.append(f"- line {site.get('line')} `{site.get('code', '')}`: {site.get('size_kb')} KiB in {site.get('count')} blocks")
+    return "\n".join(lines) + "\n\n"
+
+
 def assess_reflection_substantial(reflection_answer: str) -> bool:
     """
     Apply simple rules to estimate the usefulness of student's reflection for hint generation
@@ -1,9 +1,11 @@
 import logging
 import os
+import time
 
 from ai_hint.utils.db_utils import (
     add_generated_hint,
     add_hint_generation_phase,
+    get_request_deadline,
     load_correct_enhanced_programs,
     load_program_enhancement_phase,
     load_reflection,
@@ -11,8 +13,8 @@ from ai_hint.utils.db_utils import (
     update_program_enhancement_phase,
 )
 from user_customizable_configs.ai_config.loader import get_ai_config
-from ai_hint.utils.openai_utils import ask_chatgpt
-from ai_hint.workers.phases.generate_hint.parse_response import parse_hint_response
+from ai_hint.utils.openai_utils import PRIORITY_HIGH, ask_chatgpt
+from ai_hint.workers.phases.generate_hint.parse_response import PartialHintParser, parse_hint_response
 from ai_hint.workers.phases.generate_hint.create_prompt import (
     create_prompt_for_hint_generation,
 )
@@ -20,7 +22,8 @@ from ai_hint.workers.phases.generate_hint.select_best_enhancement import (
     select_enhanced_program_by_edit_distance,
     select_enhanced_program_by_run_time,
 )
-from ai_hint.utils.queue_utils import publish_task
+from ai_hint.utils.queue_utils import follow_up_data, publish_task
+from ai_hint.workers.phases.return_hint.return_hint import push_partial_hint
 from ai_hint.workers.phases.generate_enhanced_programs.query_for_task_description import query_task_details
 
 logger = logging.getLogger(__name__)
@@ -72,6 +75,8 @@ def execute_generate_hint(arguments):
         hint_type=hint_type,
         reflection=reflection_obj.reflection_answer,
         template_code=template_code,
+        peak_memory_kb=request.peak_memory_kb,
+        top_allocations=request.top_allocations,
     )
     logger.info(f"Created hint-generation prompt for request {request_id}:\n{prompt}")
 
@@ -83,11 +88,19 @@ def execute_generate_hint(arguments):
         raise
 
     # Generate a hint
-    query_output, waiting_seconds = ask_chatgpt(
+    query_output, waiting_seconds, attempts = ask_chatgpt(
         messages=prompt,
         model=ai_config.hint_generation_model.name,
         temperature=ai_config.hint_generation_model.temperature,
         response_format="json_object",
+        priority=PRIORITY_HIGH,
+        deadline=get_request_deadline(request),
+        hedge_model=ai_config.hint_generation_model.hedge_model,
+        on_delta=(
+            _make_partial_hint_pusher(request_id, ai_config.hint_generation_model.partial_hint_interval_seconds)
+            if ai_config.hint_generation_model.stream
+            else None
+        ),
     )
 
     # Save the hint to the database
@@ -102,6 +115,7 @@ def execute_generate_hint(arguments):
         model_temperature=ai_config.hint_generation_model.temperature,
         whole_llm_response=text_output,
         llm_waiting_seconds=waiting_seconds,
+        llm_attempts=attempts,
     )
     add_generated_hint(
         request_id=request_id,
@@ -114,6 +128,27 @@ def execute_generate_hint(arguments):
     publish_task(
         type="return_hint",
         tries=1,
-        data={"request_id": request_id},
+        data=follow_up_data(arguments, request_id=request_id),
         priority=int(os.environ["RETURN_HINT_PRIORITY"]),
-    )
\ No newline at end of file
+    )
+
+
+def _make_partial_hint_pusher(request_id: int, interval_seconds: float):
+    """
+    Build a streaming callback that parses the "hint" field of the answer received so far
+    and pushes it to the orchestration backend at most once every `interval_seconds`.
+    """
+    parser = PartialHintParser()
+    last_push = {"time": 0.0, "hint": ""}
+
+    def on_delta(text: str) -> None:
+        partial_hint = parser.feed(text)
+        if not partial_hint or partial_hint == last_push["hint"]:
+            return
+        if not parser.finished and time.time() - last_push["time"] < interval_seconds:
+            return
+        push_partial_hint(request_id, partial_hint)
+        last_push["time"] = time.time()
+        last_push["hint"] = partial_hint
+
+    return on_delta
@@ -1,5 +1,6 @@
 import json
-from typing import Tuple
+import re
+from typing import Optional, Tuple
 
 
 def parse_hint_response(text_response) -> Tuple[str, str]:
@@ -19,3 +20,67 @@ def parse_hint_response(text_response) -> Tuple[str, str]:
         hint = hint[3:].lstrip()
 
     return explanation, hint
+
+
+_HINT_KEY_PATTERN = re.compile(r'[{,]\s*"hint"\s*:\s*"')
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class PartialHintParser:
+    """
+    Incrementally extract the value of the "hint" field from a JSON answer that is still being streamed.
+    Feed it the text received so far; only the newly received part is scanned.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._text_length = 0
+        self._value_start = None  # index right after the opening quote of the hint value
+        self._position = 0  # next index of the text to decode
+        self._decoded = []
+        self.finished = False
+
+    def feed(self, text: str) -> Optional[str]:
+        """
+        Return the (partial) hint decoded so far, or None if the hint field has not started yet.
+        """
+        if len(text) < self._text_length:
+            # The answer restarted (e.g., the call was retried)
+            self.reset()
+        self._text_length = len(text)
+
+        if self._value_start is None:
+            # Keys are never inside string values unescaped, so the first match is the "hint" key
+            match = _HINT_KEY_PATTERN.search(text)
+            if match is None:
+                return None
+            self._value_start = self._position = match.end()
+
+        while not self.finished and self._position < len(text):
+            char = text[self._position]
+            if char == '"':
+                self.finished = True
+            elif char == "\\":
+                if self._position + 1 >= len(text):
+                    break  # incomplete escape sequence
+                escaped = text[self._position + 1]
+                if escaped == "u":
+                    code = text[self._position + 2:self._position + 6]
+                    if len(code) < 4:
+                        break
+                    self._decoded.append(chr(int(code, 16)))
+                    self._position += 6
+                    continue
+                self._decoded.append(_JSON_ESCAPES.get(escaped, escaped))
+                self._position += 2
+                continue
+            else:
+                self._decoded.append(char)
+            self._position += 1
+
+        hint = "".join(self._decoded)
+        if hint.startswith("(2)"):
+            hint = hint[3:].lstrip()
+        return hint
@@ -1,9 +1,12 @@
+import math
 from pathlib import Path
 from typing import Optional, Sequence
 
 from ai_hint.models import EnhancedProgram
 from ai_hint.utils.edit_distance_utils import compute_edit_distance, program_to_essential_tokens
 
+# Run time differences within this many median absolute deviations are benchmark noise
+RUN_TIME_NOISE_MADS = 3
 
 
 def select_enhanced_program_by_edit_distance(
@@ -35,12 +38,29 @@ def select_enhanced_program_by_run_time(
     """
     Input a list of enhanced programs.
     Select the best solution program: The correct program with the shortest running time.
+
+    Benchmarked programs (with a `run_time_mad`) are ranked by their median CPU time, and preferred
+    to the others, whose run time also counts the interpreter startup. The programs whose median is
+    within RUN_TIME_NOISE_MADS median absolute deviations of the fastest one are as fast as it:
+    among them, the one allocating the least memory is selected.
     """
     if len(correct_candidate_programs) == 0:
         return None
 
-    # Sort the correct solutions by their running time
-    correct_candidate_programs = sorted(correct_candidate_programs, key=lambda x: x.run_time)
-    best_solution = correct_candidate_programs[0]
+    benchmarked = [program for program in correct_candidate_programs if program.run_time_mad is not None]
+    if not benchmarked:
+        # Sort the correct solutions by their running time
+        correct_candidate_programs = sorted(correct_candidate_programs, key=lambda x: x.run_time)
+        return correct_candidate_programs[0].enhanced_program
+
+    fastest = min(benchmarked, key=lambda x: x.run_time)
+    as_fast = [
+        program for program in benchmarked
+        if program.run_time - fastest.run_time <= RUN_TIME_NOISE_MADS * max(program.run_time_mad, fastest.run_time_mad)
+    ]
+    best_solution = min(
+        as_fast,
+        key=lambda x: (x.peak_memory_kb if x.peak_memory_kb is not None else math.inf, x.run_time),
+    )
 
     return best_solution.enhanced_program
@@ -1,9 +1,8 @@
 import logging
 import os
 
-import requests
-
 from ai_hint.utils.db_utils import load_hint, load_other_hint_data
+from ai_hint.utils.http_utils import get_http_session
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +17,7 @@ def execute_return_hint(arguments):
 
     # Return the hint (post a request to the orchestration backend)
     try:
-        response = requests.post(
+        response = get_http_session().post(
             f"{os.environ['BACKEND_ORCHESTRATION_SAVE_AI_HINT_URL']}",
             json={
                 "request_id": request_id,
@@ -32,3 +31,22 @@ def execute_return_hint(arguments):
     except Exception as e:
         logger.error(f"Failed to return hint for request {request_id}: {e}")
         raise
+
+
+def push_partial_hint(request_id: int, partial_hint: str) -> None:
+    """
+    Push the part of a hint generated so far to the orchestration backend.
+    Best effort: the final hint is returned by `execute_return_hint` anyway.
+    """
+    url = os.getenv("BACKEND_ORCHESTRATION_SAVE_PARTIAL_AI_HINT_URL")
+    if not url:
+        return
+    try:
+        response = get_http_session().post(
+            url,
+            json={"request_id": request_id, "partial_hint": partial_hint},
+            timeout=5,
+        )
+        response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Failed to push partial hint for request {request_id}: {e}")
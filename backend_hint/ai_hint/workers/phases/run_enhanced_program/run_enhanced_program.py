@@ -2,9 +2,9 @@ import logging
 import os
 
 from ai_hint.models import Request
-from ai_hint.utils.db_utils import load_enhanced_program, update_enhanced_program
-from ai_hint.utils.queue_utils import publish_task
-from ai_hint.utils.program_execution_utils import run_program_on_test_cases
+from ai_hint.utils.db_utils import escalate_program_enhancement_phase, is_request_cancelled, load_enhanced_program, update_enhanced_program
+from ai_hint.utils.queue_utils import follow_up_data, publish_task
+from ai_hint.utils.program_execution_utils import benchmark_program_on_test_cases, run_program_on_test_cases
 
 logger = logging.getLogger(__name__)
 
@@ -18,15 +18,30 @@ def execute_run_enhanced_program(arguments):
         enhanced_program_obj = load_enhanced_program(enhanced_program_id)
         enhanced_program = enhanced_program_obj.enhanced_program
         problem_id = enhanced_program_obj.phase.request.problem_id
+        request_id = enhanced_program_obj.phase.request.request_id
+        hint_type = enhanced_program_obj.phase.request.hint_type
     except Exception as e:
         logger.error(f"Error loading data for running enhanced program {enhanced_program_id}: {e}")
         raise
 
-    # Run enhanced program
-    program_verdict, program_output, run_time = run_program_on_test_cases(
-        problem_id=problem_id,
-        program=enhanced_program,
-    )
+    # Run enhanced program; optimize hints pick the fastest program, so benchmark it
+    run_time_mad, peak_memory_kb = None, None
+    if hint_type == "optimize":
+        program_verdict, program_output, run_time, benchmark = benchmark_program_on_test_cases(
+            problem_id=problem_id,
+            program=enhanced_program,
+            should_cancel=lambda: is_request_cancelled(request_id),
+        )
+        if benchmark is not None:
+            run_time = benchmark.cpu_time_median
+            run_time_mad = benchmark.cpu_time_mad
+            peak_memory_kb = benchmark.peak_memory_kb
+    else:
+        program_verdict, program_output, run_time = run_program_on_test_cases(
+            problem_id=problem_id,
+            program=enhanced_program,
+            should_cancel=lambda: is_request_cancelled(request_id),
+        )
 
     # Update results to the database
     try:
@@ -35,6 +50,8 @@ def execute_run_enhanced_program(arguments):
             is_correct=program_verdict,
             program_output=program_output,
             run_time=run_time,
+            run_time_mad=run_time_mad,
+            peak_memory_kb=peak_memory_kb,
         )
     except Exception as e:
         logger.error(f"Error updating results for enhanced program {enhanced_program_id}: {e}")
@@ -47,6 +64,16 @@ def execute_run_enhanced_program(arguments):
         publish_task(
             type="generate_hint",
             tries=1,
-            data={"request_id": enhanced_program_obj.phase.request.request_id},
+            data=follow_up_data(arguments, request_id=enhanced_program_obj.phase.request.request_id),
             priority=int(os.environ["GENERATE_HINT_PRIORITY"]),
-        )
\ No newline at end of file
+        )
+    else:
+        # If this was the last program of a cascade tier without enough correct programs, ask the next tier
+        next_tier = escalate_program_enhancement_phase(enhanced_program_obj.phase.id)
+        if next_tier is not None:
+            publish_task(
+                type="query_for_enhanced_programs",
+                tries=1,
+                data=follow_up_data(arguments, request_id=enhanced_program_obj.phase.request.request_id, cascade_tier=next_tier),
+                priority=int(os.environ["QUERY_FOR_ENHANCED_PROGRAMS_PRIORITY"]),
+            )
\ No newline at end of file
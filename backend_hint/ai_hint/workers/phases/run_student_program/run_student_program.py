@@ -2,9 +2,9 @@ import logging
 import os
 
 from ai_hint.models import Request
-from ai_hint.utils.db_utils import add_generated_hint, load_request, update_request_with_test_results
-from ai_hint.utils.queue_utils import publish_task
-from ai_hint.utils.program_execution_utils import run_program_on_test_cases
+from ai_hint.utils.db_utils import add_generated_hint, is_request_cancelled, load_request, update_request_with_test_results
+from ai_hint.utils.queue_utils import follow_up_data, publish_task
+from ai_hint.utils.program_execution_utils import benchmark_program_on_test_cases, run_program_on_test_cases
 
 
 logger = logging.getLogger(__name__)
@@ -25,10 +25,23 @@ def execute_run_student_buggy_program(arguments):
     problem_id = hint_request.problem_id
 
     # Run student buggy program and save the results to the database
-    program_verdict, buggy_output, run_time = run_program_on_test_cases(
-        problem_id=problem_id,
-        program=student_program,
-    )
+    # A notebook submission runs cell by cell in the problem handler, like in the student's kernel
+    # For optimize hints, benchmark it too: its memory profile goes into the prompt
+    benchmark = None
+    if hint_request.hint_type == "optimize":
+        program_verdict, buggy_output, run_time, benchmark = benchmark_program_on_test_cases(
+            problem_id=problem_id,
+            program=student_program,
+            should_cancel=lambda: is_request_cancelled(request_id),
+            notebook=hint_request.student_notebook,
+        )
+    else:
+        program_verdict, buggy_output, run_time = run_program_on_test_cases(
+            problem_id=problem_id,
+            program=student_program,
+            should_cancel=lambda: is_request_cancelled(request_id),
+            notebook=hint_request.student_notebook,
+        )
 
     # Check if student program is already correct and if so, return early for hint_type in {"plan", "debug"}
     if program_verdict:
@@ -43,7 +56,7 @@ def execute_run_student_buggy_program(arguments):
             publish_task(
                 type="return_hint",
                 tries=1,
-                data={"request_id": request_id},
+                data=follow_up_data(arguments, request_id=request_id),
                 priority=int(os.environ["RETURN_HINT_PRIORITY"]),
             )
             return  # Early return
@@ -55,7 +68,9 @@ def execute_run_student_buggy_program(arguments):
     _, ready_for_hint_generation = update_request_with_test_results(
         request_id=request_id,
         student_program_output=buggy_output,
-        run_time=run_time
+        run_time=run_time,
+        peak_memory_kb=benchmark.peak_memory_kb if benchmark is not None else None,
+        top_allocations=benchmark.top_allocations if benchmark is not None else None,
     )
 
     # Check if all information is ready for hint generation and if so, generate a hint
@@ -65,6 +80,6 @@ def execute_run_student_buggy_program(arguments):
         publish_task(
             type="generate_hint",
             tries=1,
-            data={"request_id": request_id},
+            data=follow_up_data(arguments, request_id=request_id),
             priority=int(os.environ["GENERATE_HINT_PRIORITY"]),
         )
\ No newline at end of file
@@ -0,0 +1,137 @@
+import json
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+from ai_hint.utils.queue_utils import declare_task_queue, lane_queue_name
+from user_customizable_configs.scheduler.loader import SchedulerConfig
+
+logger = logging.getLogger(__name__)
+
+TASK_TYPES = [
+    "return_hint",
+    "generate_hint",
+    "add_reflection",
+    "run_enhanced_program",
+    "run_student_buggy_program",
+    "query_for_enhanced_programs",
+]
+
+MAX_TRACKED_STUDENTS = 10000
+UNSERVED_THRESHOLD = 0.01
+
+
+@dataclass
+class ScheduledTask:
+    delivery_tag: int
+    arguments: dict
+    lane: str
+
+
+def student_key(arguments: dict) -> str:
+    """
+    The party whose share of the workers a task counts against: its student, or its request
+    for tasks published without a student.
+    """
+    data = arguments.get("data", {})
+    if data.get("student_id") is not None:
+        return f"student:{data['student_id']}"
+    return f"request:{data.get('request_id')}"
+
+
+class FairScheduler:
+    """
+    Picks the next task to process from the per-type lanes.
+
+    Lanes with waiting tasks are served by smooth weighted round-robin, with more weight for the
+    phases closer to a finished hint. Within a lane (still ordered by task priority), the first
+    `fairness_window` tasks are fetched (fewer if a student without recent service comes up) and the
+    one of the student with the least recent service is processed; the others are put back, so a burst from one student does not hold up the others.
+    The base task queue is served as the lowest-weight lane, to drain tasks published before lanes existed.
+    """
+
+    def __init__(self, channel, task_queue: str, max_priority: int, config: SchedulerConfig):
+        self.channel = channel
+        self.config = config
+        self.lanes: Dict[str, int] = {lane_queue_name(task_queue, type): config.lane_weight(type) for type in TASK_TYPES}
+        self.lanes[task_queue] = config.default_weight
+        for lane in self.lanes:
+            declare_task_queue(channel, lane, max_priority)
+        self._current_weights: Dict[str, float] = {lane: 0.0 for lane in self.lanes}
+        # Lanes found empty since they last had a task: they do not share the workers
+        self._empty_lanes: Set[str] = set()
+        # Recent service of each student: (decayed count of processed tasks, time of last update)
+        self._service: Dict[str, tuple] = {}
+
+    def next_task(self) -> Optional[ScheduledTask]:
+        """
+        Fetch the next task to process, or None if all lanes are empty.
+        The caller acks it with `done` once processed.
+        """
+        for lane in self._lane_order():
+            task = self._take_from_lane(lane)
+            if task is not None:
+                self._empty_lanes.discard(lane)
+                self._charge_lane(lane)
+                return task
+            # An empty lane does not bank credit to monopolise the workers once tasks arrive
+            self._empty_lanes.add(lane)
+            self._current_weights[lane] = min(self._current_weights[lane], 0.0)
+        return None
+
+    def done(self, task: ScheduledTask):
+        self.channel.basic_ack(delivery_tag=task.delivery_tag)
+        key = student_key(task.arguments)
+        self._service[key] = (self._recent_service(key) + 1, time.monotonic())
+        if len(self._service) > MAX_TRACKED_STUDENTS:
+            # Forget students whose service has decayed away
+            self._service = {
+                student: service for student, service in self._service.items() if self._recent_service(student) >= UNSERVED_THRESHOLD
+            }
+
+    def _lane_order(self) -> List[str]:
+        """
+        Smooth weighted round-robin: lanes by current weight, after adding each lane's weight.
+        The lane actually served is charged the total weight of the lanes with waiting tasks in `_charge_lane`.
+        """
+        for lane, weight in self.lanes.items():
+            self._current_weights[lane] += weight
+        return sorted(self.lanes, key=lambda lane: self._current_weights[lane], reverse=True)
+
+    def _charge_lane(self, lane: str):
+        self._current_weights[lane] -= sum(weight for other, weight in self.lanes.items() if other not in self._empty_lanes)
+
+    def _take_from_lane(self, lane: str) -> Optional[ScheduledTask]:
+        candidates = []
+        for _ in range(self.config.fairness_window):
+            method, _properties, body = self.channel.basic_get(queue=lane, auto_ack=False)
+            if method is None:
+                break
+            try:
+                arguments = json.loads(body)
+            except ValueError:
+                logger.error(f"Dropping malformed task from {lane}: {str(body)[:120]}")
+                self.channel.basic_ack(delivery_tag=method.delivery_tag)
+                continue
+            candidates.append(ScheduledTask(delivery_tag=method.delivery_tag, arguments=arguments, lane=lane))
+            if self._recent_service(student_key(arguments)) < UNSERVED_THRESHOLD:
+                # No task can beat a student without recent service: stop looking
+                break
+        if not candidates:
+            return None
+
+        # min() keeps the first (highest priority, oldest) task among equally served students
+        chosen = min(candidates, key=lambda task: self._recent_service(student_key(task.arguments)))
+        for task in candidates:
+            if task is not chosen:
+                self.channel.basic_nack(delivery_tag=task.delivery_tag, requeue=True)
+        return chosen
+
+    def _recent_service(self, key: str) -> float:
+        if key not in self._service:
+            return 0.0
+        count, updated_at = self._service[key]
+        elapsed = time.monotonic() - updated_at
+        return count * math.pow(0.5, elapsed / self.config.service_half_life_seconds)
@@ -3,7 +3,9 @@ import time
 import logging
 
 from ai_hint.utils.queue_utils import publish_task
-from ai_hint.utils.db_utils import add_generated_hint
+from ai_hint.utils.db_utils import add_generated_hint, get_request_deadline, has_hint, load_request
+from ai_hint.utils.openai_utils import LLMDeadlineExceededError
+from ai_hint.utils.program_execution_utils import ProgramExecutionCancelledError
 from ai_hint.workers.phases.run_enhanced_program.run_enhanced_program import execute_run_enhanced_program
 from ai_hint.workers.phases.run_student_program.run_student_program import (
     execute_run_student_buggy_program,
@@ -19,9 +21,40 @@ from ai_hint.workers.phases.return_hint.return_hint import execute_return_hint
 logger = logging.getLogger(__name__)
 
 
+class RequestCancelledError(RuntimeError):
+    """Raised when a task belongs to a request that the student cancelled."""
+
+
+class RequestDeadlineExceededError(RuntimeError):
+    """Raised when a task is processed after the deadline of its request."""
+
+
+def check_request_alive(arguments):
+    """
+    Abort a task early if its request was cancelled or its deadline has passed.
+    The later of the deadline carried in the task data and the one stored with the request applies,
+    since the stored deadline is extended when the reflection arrives; before that, the budget has not started.
+    Returning a finished hint is never aborted because of the deadline.
+    """
+    request_id = arguments["data"]["request_id"]
+    request = load_request(request_id)
+    if request.is_cancelled:
+        raise RequestCancelledError(f"Request {request_id} was cancelled")
+    if arguments["type"] == "return_hint":
+        return
+    deadline = max(arguments["data"].get("deadline") or 0, get_request_deadline(request))
+    if time.time() >= deadline:
+        raise RequestDeadlineExceededError(f"Request {request_id} passed its deadline before {arguments['type']}")
+
+
 def set_request_unsuccessful(arguments, e):
     try:
         request_id = arguments["data"]["request_id"]
+        # Only one (final) hint per request, e.g. when several parallel tasks of the request fail
+        if has_hint(request_id):
+            logger.info(f"Request {request_id} already has a hint; not marking it unsuccessful again")
+            return
+
         # Extract meaningful messages from the exception 'e'
         generation_error_message = f"Exception type: {type(e).__name__}; Message: {str(e)}"
         # If the exception has additional attributes, include them
@@ -48,6 +81,7 @@ def set_request_unsuccessful(arguments, e):
 
 def process_task(arguments):
     try:
+        check_request_alive(arguments)
         if arguments["type"] == "run_student_buggy_program":
             execute_run_student_buggy_program(arguments)
         elif arguments["type"] == "query_for_enhanced_programs":
@@ -62,12 +96,15 @@ def process_task(arguments):
             execute_return_hint(arguments)
         else:
             raise ValueError(f"Unknown task type: {arguments['type']}")
+    except (RequestCancelledError, ProgramExecutionCancelledError) as e:
+        logger.info(f" [x] Dropping task {arguments['type']}: {e}")
     except Exception as e:
         logger.error(f"Error processing request {arguments}. Error: {e}")
         # If the number of tries is less than the maximum allowed, re-enqueue the task
+        # (unless the request's deadline has passed, in which case retrying cannot help)
         if ("tries" in arguments) and (
             arguments["tries"] < int(os.environ["MAX_TRIES"])
-        ):
+        ) and not isinstance(e, (LLMDeadlineExceededError, RequestDeadlineExceededError)):
             arguments["tries"] += 1
             logger.info(
                 f" [x] Re-enqueuing request {arguments} with tries {arguments['tries']}"
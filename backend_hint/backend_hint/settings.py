@@ -248,3 +248,6 @@ LOGGING = {
 AI_MODEL_CONFIGS_BASE = BASE_DIR / "user_customizable_configs/ai_config"
 AI_MODEL_CONFIGS = AI_MODEL_CONFIGS_BASE / "ai_config.yaml"
 
+
+# Task scheduling configs
+SCHEDULER_CONFIGS = BASE_DIR / "user_customizable_configs/scheduler/scheduler.yaml"
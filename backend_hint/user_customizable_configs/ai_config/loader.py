@@ -1,4 +1,6 @@
 from functools import lru_cache
+from typing import List, Literal, Optional
+
 import yaml
 from pydantic import BaseModel, Field, PositiveInt, field_validator
 
@@ -9,6 +11,8 @@ class ProgramGenerationModel(BaseModel):
     name: str = Field(default="gpt-5")
     temperature: float = Field(ge=0.0, le=2.0, default=0.5)
     n_programs: PositiveInt = Field(default=5)
+    # Optional secondary model that a slow call is hedged to (see `deadlines`)
+    hedge_model: Optional[str] = Field(default=None)
 
     @field_validator("n_programs")
     @classmethod
@@ -18,14 +22,100 @@ class ProgramGenerationModel(BaseModel):
         return v
 
 
+class ProgramGenerationCascade(BaseModel):
+    # When enabled, enhanced programs are generated tier by tier (cheapest first) instead of
+    # with `program_generation_model` alone; the next tier is only asked if the current one
+    # produced fewer than `min_correct_programs` correct programs
+    enabled: bool = Field(default=False)
+    tiers: List[ProgramGenerationModel] = Field(default_factory=list)
+    min_correct_programs: PositiveInt = Field(default=1)
+
+
 class HintGenerationModel(BaseModel):
     name: str = Field(default="gpt-5")
     temperature: float = Field(ge=0.0, le=2.0, default=0.0)
+    # Optional secondary model that a slow call is hedged to (see `deadlines`)
+    hedge_model: Optional[str] = Field(default=None)
+    # Stream the completion and push the partial hint to the orchestration backend while it is generated
+    stream: bool = Field(default=False)
+    # Minimum time between two partial-hint pushes
+    partial_hint_interval_seconds: float = Field(gt=0.0, default=1.0)
+
+
+class RateLimitConfig(BaseModel):
+    # Initial per-model limits; corrected at runtime from the provider's `x-ratelimit-*` response headers
+    requests_per_minute: PositiveInt = Field(default=500)
+    tokens_per_minute: PositiveInt = Field(default=30000)
+    # Maximum number of LLM calls in flight at once within one worker process
+    max_concurrent_requests: PositiveInt = Field(default=8)
+    # Fraction of each bucket that only high-priority calls (hint generation) may use
+    high_priority_reserve: float = Field(ge=0.0, lt=1.0, default=0.2)
+    # Completion tokens assumed per choice when estimating the cost of a call before it is made
+    completion_tokens_estimate: PositiveInt = Field(default=1000)
+    # Optional file used to share bucket state between worker processes on the same host
+    shared_state_file: Optional[str] = Field(default=None)
+
+
+class DeadlineConfig(BaseModel):
+    # Total time budget of a hint request, counted from its creation and restarted when the reflection arrives; LLM calls never outlive it
+    hint_budget_seconds: PositiveInt = Field(default=240)
+    # Upper bound for a single LLM call (client timeout)
+    request_timeout_seconds: PositiveInt = Field(default=60)
+    # A call still running after this latency percentile of the model is hedged to `hedge_model`
+    hedge_after_percentile: float = Field(gt=0.0, lt=100.0, default=95.0)
+    # Number of observed latencies required before hedging starts
+    hedge_min_samples: PositiveInt = Field(default=20)
+
+
+class PromptBudgetConfig(BaseModel):
+    # Approximate token limits (~4 characters per token) of the variable parts of a prompt;
+    # longer parts are truncated, keeping their beginning and end
+    max_program_tokens: PositiveInt = Field(default=4000)  # student's program and reference program
+    max_output_tokens: PositiveInt = Field(default=1000)  # program output shown in debugging prompts
+    max_reflection_tokens: PositiveInt = Field(default=500)
+
+
+class StubProviderConfig(BaseModel):
+    # Seed of the latency draws; the same seed and prompts replay the same latencies
+    seed: int = Field(default=0)
+    latency_distribution: Literal["fixed", "uniform", "lognormal"] = Field(default="lognormal")
+    latency_median_seconds: float = Field(ge=0.0, default=2.0)
+    # Shape of the lognormal distribution (larger = longer tail)
+    latency_sigma: float = Field(ge=0.0, default=0.5)
+    latency_max_seconds: float = Field(ge=0.0, default=60.0)
+    # Share of the latency spent before the first streamed chunk
+    first_token_share: float = Field(ge=0.0, le=1.0, default=0.3)
+    stream_chunk_chars: PositiveInt = Field(default=20)
+    # Probability of answering with a simulated 429 rate-limit error
+    rate_limit_error_rate: float = Field(ge=0.0, le=1.0, default=0.0)
+    # Canned answers; `program` None echoes the student's program
+    program: Optional[str] = Field(default=None)
+    explanation: str = Field(default="(1) This is a canned explanation from the stub LLM provider.")
+    hint: str = Field(default="(2) This is a canned hint from the stub LLM provider.")
+
+
+class LLMProviderConfig(BaseModel):
+    # `openai` or `stub` (local stand-in for load tests, no network needed)
+    name: Literal["openai", "stub"] = Field(default="openai")
+    stub: StubProviderConfig = StubProviderConfig()
 
 
 class AIConfig(BaseModel):
     program_generation_model: ProgramGenerationModel = ProgramGenerationModel()
+    program_generation_cascade: ProgramGenerationCascade = ProgramGenerationCascade()
     hint_generation_model: HintGenerationModel = HintGenerationModel()
+    rate_limits: RateLimitConfig = RateLimitConfig()
+    deadlines: DeadlineConfig = DeadlineConfig()
+    prompt_budget: PromptBudgetConfig = PromptBudgetConfig()
+    llm_provider: LLMProviderConfig = LLMProviderConfig()
+
+    def program_generation_tiers(self) -> List[ProgramGenerationModel]:
+        """
+        Models used to generate enhanced programs, in escalation order.
+        """
+        if self.program_generation_cascade.enabled and self.program_generation_cascade.tiers:
+            return self.program_generation_cascade.tiers
+        return [self.program_generation_model]
 
 
 @lru_cache(maxsize=1)
@@ -38,4 +128,3 @@ def load_ai_config() -> AIConfig:
 
 def get_ai_config() -> AIConfig:
     return load_ai_config()
-
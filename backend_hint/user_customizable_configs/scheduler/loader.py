@@ -0,0 +1,37 @@
+from functools import lru_cache
+from typing import Dict
+
+import yaml
+from pydantic import BaseModel, Field, PositiveFloat, PositiveInt
+
+from backend_hint.settings import SCHEDULER_CONFIGS
+
+
+class SchedulerConfig(BaseModel):
+    lane_weights: Dict[str, PositiveInt] = Field(default_factory=lambda: {
+        "return_hint": 8,
+        "generate_hint": 6,
+        "add_reflection": 4,
+        "run_enhanced_program": 3,
+        "run_student_buggy_program": 3,
+        "query_for_enhanced_programs": 2,
+    })
+    default_weight: PositiveInt = Field(default=1)
+    fairness_window: PositiveInt = Field(default=32)
+    service_half_life_seconds: PositiveFloat = Field(default=60.0)
+    idle_sleep_seconds: PositiveFloat = Field(default=0.2)
+
+    def lane_weight(self, task_type: str) -> int:
+        return self.lane_weights.get(task_type, self.default_weight)
+
+
+@lru_cache(maxsize=1)
+def load_scheduler_config() -> SchedulerConfig:
+    path = SCHEDULER_CONFIGS
+    with open(path, "r", encoding="utf-8") as f:
+        raw = yaml.safe_load(f) or {}
+    return SchedulerConfig(**raw)
+
+
+def get_scheduler_config() -> SchedulerConfig:
+    return load_scheduler_config()
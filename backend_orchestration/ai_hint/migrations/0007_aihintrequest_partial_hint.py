@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_hint', '0006_aihintrequest_is_cancelled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aihintrequest',
+            name='partial_hint',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
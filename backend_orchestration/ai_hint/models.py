@@ -19,6 +19,7 @@ class AIHintRequest(models.Model):
     job_finished_successfully = models.BooleanField(null=True)
     generation_error_message = models.TextField(null=True, blank=True)
     returned_hint = models.TextField(null=True, blank=True)
+    partial_hint = models.TextField(null=True, blank=True)  # hint text streamed so far, while generating
     returned_time = models.DateTimeField(null=True, blank=True)
     other_hint_data = models.JSONField(null=True, blank=True, default=dict)
 
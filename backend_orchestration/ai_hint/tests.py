@@ -1,3 +1,48 @@
+import json
+
 from django.test import TestCase
 
-# Create your tests here.
+from ai_hint.models import AIHintRequest
+
+
+class SavePartialHintTests(TestCase):
+    def setUp(self):
+        self.hint_request = AIHintRequest.objects.create(
+            student_id="student", problem_id="factorial", student_program="def f(n): pass", hint_type="debug",
+        )
+
+    def post_partial_hint(self, partial_hint):
+        return self.client.post(
+            "/ai_hint/save_partial/",
+            data=json.dumps({"request_id": self.hint_request.id, "partial_hint": partial_hint}),
+            content_type="application/json",
+        )
+
+    def query_hint(self):
+        response = self.client.get("/ai_hint/query_hint/", {"request_id": self.hint_request.id})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_partial_hint_is_served_while_generating(self):
+        self.assertEqual(self.post_partial_hint("Check the base").status_code, 204)
+        self.assertEqual(self.post_partial_hint("Check the base case").status_code, 204)
+
+        data = self.query_hint()
+        self.assertFalse(data["job_finished"])
+        self.assertIsNone(data["hint"])
+        self.assertEqual(data["partial_hint"], "Check the base case")
+
+    def test_partial_hint_is_ignored_once_the_hint_is_saved(self):
+        AIHintRequest.objects.filter(id=self.hint_request.id).update(
+            job_finished_successfully=True, returned_hint="Check the base case of the recursion.",
+        )
+        self.assertEqual(self.post_partial_hint("Check").status_code, 204)
+
+        data = self.query_hint()
+        self.assertTrue(data["job_finished"])
+        self.assertEqual(data["hint"], "Check the base case of the recursion.")
+        self.assertIsNone(data["partial_hint"])
+
+    def test_invalid_body_is_rejected(self):
+        response = self.client.post("/ai_hint/save_partial/", data="{}", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
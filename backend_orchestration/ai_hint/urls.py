@@ -9,6 +9,7 @@ urlpatterns = [
     path("query_hint/", views.query_hint, name="query_ai_hint"),  # Student frontend queries AI hint
     path("query_all_hint/", views.query_all_hint, name="query_all_ai_hints"),  # Student frontend queries all AI hints for a specific student and problem
     path("save/", views.save_hint, name="save_ai_hint"),  # Hint backend saves generated hint
+    path("save_partial/", views.save_partial_hint, name="save_partial_ai_hint"),  # Hint backend saves partially generated hint
     path("save_hint_rating/", views.save_hint_rating, name="save_ai_hint_rating"),  # Student rates hint
     path("quota_left/", views.quota_left, name="quota_left"),  # Remaining quota endpoint
     path("has_ever_requested/", views.has_ever_requested, name="has_ever_requested"),  # Check if student ever requested any hint
@@ -0,0 +1,132 @@
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+
+from django.utils import timezone
+
+from ai_hint.models import AIHintRequest
+from user_customizable_configs.admission.loader import Admission, get_admission
+
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a new hint request is rejected because the hint pipeline is overloaded."""
+
+    def __init__(self, message: str, retry_after_seconds: int, estimated_wait_seconds: Optional[float]):
+        super().__init__(message)
+        self.retry_after_seconds = retry_after_seconds
+        self.estimated_wait_seconds = estimated_wait_seconds
+
+
+@dataclass
+class LoadStats:
+    in_flight: int
+    n_samples: int
+    p95_completion_seconds: Optional[float]
+    completions_per_second: float
+
+    def estimated_wait_seconds(self) -> Optional[float]:
+        """Time for the pipeline to work off the requests in flight at its recent pace."""
+        if self.completions_per_second <= 0:
+            return None
+        return self.in_flight / self.completions_per_second
+
+
+_stats_lock = threading.Lock()
+_cached_stats: Optional[tuple[float, LoadStats]] = None
+
+
+def query_load_stats(admission: Admission) -> LoadStats:
+    """Load figures of the hint pipeline from the recent AIHintRequest rows.
+
+    The completion time of a request runs from its reflection (when the client starts waiting
+    for the hint), or from its creation without one, to the return of its result.
+    """
+    now = timezone.now()
+    in_flight = AIHintRequest.objects.filter(
+        job_finished_successfully__isnull=True,
+        is_cancelled=False,
+        created_at__gte=now - timedelta(seconds=admission.in_flight_max_age_seconds),
+    ).count()
+
+    finished = list(
+        AIHintRequest.objects.filter(returned_time__gte=now - timedelta(seconds=admission.window_seconds))
+        .order_by("-returned_time")
+        .values_list("created_at", "reflection_time", "returned_time")[:admission.max_samples]
+    )
+    durations = sorted(
+        (returned_time - (reflection_time or created_at)).total_seconds()
+        for created_at, reflection_time, returned_time in finished
+    )
+
+    p95 = None
+    completions_per_second = 0.0
+    if durations:
+        p95 = durations[math.ceil(0.95 * len(durations)) - 1]
+        # With a full sample, the observed span is shorter than the window
+        span = admission.window_seconds
+        if len(finished) == admission.max_samples:
+            span = max((now - finished[-1][2]).total_seconds(), 1.0)
+        completions_per_second = len(finished) / span
+
+    return LoadStats(
+        in_flight=in_flight,
+        n_samples=len(durations),
+        p95_completion_seconds=p95,
+        completions_per_second=completions_per_second,
+    )
+
+
+def get_load_stats(admission: Admission) -> LoadStats:
+    """Load figures, recomputed at most every `stats_cache_seconds` per process."""
+    global _cached_stats
+    with _stats_lock:
+        if _cached_stats is not None and time.monotonic() - _cached_stats[0] < admission.stats_cache_seconds:
+            return _cached_stats[1]
+    stats = query_load_stats(admission)
+    with _stats_lock:
+        _cached_stats = (time.monotonic(), stats)
+    return stats
+
+
+def _note_admitted():
+    # Count the admitted request until the figures are recomputed, so a burst cannot slip in
+    with _stats_lock:
+        if _cached_stats is not None:
+            _cached_stats[1].in_flight += 1
+
+
+def enforce_admission() -> bool:
+    """Admit a new hint request if the hint pipeline can finish it in time.
+
+    Returns True if the request is admitted, raises AdmissionRejectedError otherwise.
+    """
+    admission = get_admission()
+    if not admission.enabled:
+        return True
+
+    stats = get_load_stats(admission)
+    p95_limit = admission.max_p95_share_of_time_limit * admission.completion_time_limit_seconds
+
+    reason = None
+    if stats.in_flight >= admission.max_in_flight_requests:
+        reason = f"{stats.in_flight} hint requests in flight (max {admission.max_in_flight_requests})"
+    elif stats.n_samples >= admission.min_samples and stats.p95_completion_seconds > p95_limit:
+        reason = f"p95 completion time {stats.p95_completion_seconds:.0f}s exceeds {p95_limit:.0f}s"
+
+    if reason is None:
+        _note_admitted()
+        return True
+
+    estimated_wait = stats.estimated_wait_seconds()
+    retry_after = admission.max_retry_after_seconds if estimated_wait is None else math.ceil(estimated_wait)
+    retry_after = min(max(retry_after, admission.min_retry_after_seconds), admission.max_retry_after_seconds)
+    msg = f"Hint service is busy: {reason}"
+    logger.warning(f"{msg}; rejecting new request (retry after {retry_after}s)")
+    raise AdmissionRejectedError(msg, retry_after_seconds=retry_after, estimated_wait_seconds=estimated_wait)
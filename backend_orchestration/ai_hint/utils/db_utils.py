@@ -121,6 +121,17 @@ def save_hint_results(
     return req
 
 
+def save_partial_hint(request_id: int, partial_hint: str) -> bool:
+    """
+    Save the hint text generated so far. Ignored once the final result has been saved.
+    Returns whether the partial hint was saved.
+    """
+    updated = AIHintRequest.objects.filter(
+        id=request_id, job_finished_successfully__isnull=True
+    ).update(partial_hint=partial_hint)
+    return bool(updated)
+
+
 def load_all_ai_hints(student_id: int, problem_id: int) -> list[dict]:
     """
     Load all AIHintRequests for a specific student and problem.
@@ -2,16 +2,16 @@ import json
 import logging
 import os
 
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
-import requests
 from django.db import transaction
 
+from backend_orchestration.http_utils import get_http_session
 
-
-from ai_hint.utils.db_utils import add_back_ai_hint_request, create_ai_hint_request, add_reflection_to_ai_request, load_ai_hint_request, load_all_ai_hints, save_hint_results
+from ai_hint.utils.db_utils import add_back_ai_hint_request, create_ai_hint_request, add_reflection_to_ai_request, load_ai_hint_request, load_all_ai_hints, save_hint_results, save_partial_hint as save_partial_hint_db
 from ai_hint.utils.request_utils import extract_request
+from ai_hint.utils.admission_utils import AdmissionRejectedError, enforce_admission
 from ai_hint.utils.quota_utils import QuotaExceededError, compute_quota_left, enforce_hint_quota, query_used_hints
 from ai_hint.models import AIHintRequest
 from user_customizable_configs.quota.loader import get_hint_quota
@@ -26,9 +26,10 @@ def add_request(request):
     Receive request for AI hint.
     1. Verify request method is POST.
     2. Validate and extract request data.
-    3. Enforce quota before adding a new request.
-    4. Add request to the database.
-    5. Post the request to backend_hint.
+    3. Admit the request only if the hint pipeline can finish it in time (503 with Retry-After otherwise).
+    4. Enforce quota before adding a new request.
+    5. Add request to the database.
+    6. Post the request to backend_hint.
     """
     # Verify request method
     if request.method != "POST":
@@ -50,6 +51,24 @@ def add_request(request):
 
     logger.info(f"Received add_request:\n- student_id: {student_id}\n- problem_id: {problem_id}\n- hint_type: {hint_type}\n- program:\n{student_program}")
 
+    # Admission control: fail fast instead of accepting work that cannot finish in time
+    try:
+        enforce_admission()
+    except AdmissionRejectedError as e:
+        response = JsonResponse(
+            {
+                "detail": f"{e}. Please try again in {e.retry_after_seconds} seconds.",
+                "retry_after_seconds": e.retry_after_seconds,
+                "estimated_wait_seconds": e.estimated_wait_seconds,
+            },
+            status=503,
+        )
+        response["Retry-After"] = str(e.retry_after_seconds)
+        return response
+    except Exception as e:
+        # Never block hints because the load figures could not be computed
+        logger.error(f"Error in admission control, admitting the request: {e}")
+
     # Enforce quota and add request within a single transaction to avoid races
     try:
         with transaction.atomic():
@@ -73,7 +92,7 @@ def add_request(request):
 
     # Post the request to backend_hint
     try:
-        response = requests.post(
+        response = get_http_session().post(
             # headers={"Host": "backend-hint", "Content-Type": "application/json"},
             url=os.environ["BACKEND_HINT_ADD_REQUEST_URL"],  #TODO
             json={
@@ -83,6 +102,7 @@ def add_request(request):
                     "problem_id": problem_id,
                     "student_program": student_program,
                     "hint_type": hint_type,
+                    "student_id": student_id,
                 },
             },
         )
@@ -132,7 +152,7 @@ def add_reflection(request):
 
     # Post reflection to the backend_hint
     try:
-        response = requests.post(
+        response = get_http_session().post(
             url=os.environ["BACKEND_HINT_ADD_REFLECTION_URL"],
             json={
                 "request_id": request_id,
@@ -180,16 +200,18 @@ def query_hint(request):
         logger.error(f"Request {request_id} not found: {e}")
         return HttpResponse(f"Request {request_id} not found: {e}", status=404)
 
+    partial_hint = None
     if hint_request.job_finished_successfully:
         # job is finished successfully, return the hint
         job_finished = True
         successful = True
         returned_hint = hint_request.returned_hint
     elif hint_request.job_finished_successfully is None:
-        # job is not finished yet
+        # job is not finished yet, return the part of the hint streamed so far (if any)
         job_finished = False
         successful = True
         returned_hint = None
+        partial_hint = hint_request.partial_hint
     else:  # job_finished_successfully is False
         job_finished = True
         successful = False
@@ -211,6 +233,7 @@ def query_hint(request):
             "request_id": request_id,
             "job_finished": job_finished,
             "hint": returned_hint,
+            "partial_hint": partial_hint,
         })
         logger.info(f"[x] Return hint {json_str_return}")
         return HttpResponse(json_str_return)
@@ -290,6 +313,40 @@ def save_hint(request):
     return HttpResponse(status=204)
 
 
+@csrf_exempt
+def save_partial_hint(request):
+    """
+    Receive and save the part of a hint generated so far (streamed by the hint backend).
+    1. Validate request method is POST.
+    2. Extract request parameters.
+    3. Save the partial hint unless the final hint has already been saved.
+    4. Return a success response.
+    """
+    # Validate request method
+    if request.method != "POST":
+        return HttpResponse(status=405)
+
+    # Extract request parameters
+    try:
+        data = json.loads(request.body)
+        request_id = int(data["request_id"])
+        partial_hint = data["partial_hint"]
+    except Exception as e:
+        logger.error(f"Error extracting data for save_partial_hint: {e}")
+        return HttpResponse(f"Error extracting data for save_partial_hint: {e}", status=400)
+
+    # Save the partial hint to the database
+    try:
+        saved = save_partial_hint_db(request_id=request_id, partial_hint=partial_hint)
+    except Exception as e:
+        logger.error(f"Error saving partial hint to database: {e}")
+        return HttpResponse(f"Error saving partial hint to database: {e}", status=500)
+
+    # Return a success response
+    logger.debug(f"[x] Partial hint for request_id {request_id} saved: {saved}")
+    return HttpResponse(status=204)
+
+
 @csrf_exempt
 def save_hint_rating(request):
     """
@@ -412,7 +469,7 @@ def has_ever_requested(request):
 @csrf_exempt
 def cancel_request(request):
     """
-    Mark an AI hint request as cancelled by the student.
+    Mark an AI hint request as cancelled by the student, and forward the cancellation to backend_hint.
     Request: POST { request_id: int }
     Response: 204 on success
     """
@@ -439,10 +496,19 @@ def cancel_request(request):
             logger.info(f"[x] cancel_request: marked request {request_id} as cancelled")
         else:
             logger.info(f"[x] cancel_request: request {request_id} already cancelled (idempotent)")
-        return HttpResponse(status=204)
     except Exception as e:
         logger.error(f"cancel_request: failed to update {request_id}: {e}")
         return HttpResponse("Failed to cancel request", status=500)
 
+    # Propagate to backend_hint so that the request stops consuming LLM calls and executions (best effort)
+    cancel_url = os.getenv("BACKEND_HINT_CANCEL_REQUEST_URL")
+    if cancel_url:
+        try:
+            response = get_http_session().post(url=cancel_url, json={"request_id": request_id}, timeout=5)
+            response.raise_for_status()
+        except Exception as e:
+            logger.error(f"cancel_request: failed to propagate cancellation of {request_id} to backend_hint: {e}")
+    return HttpResponse(status=204)
+
 
     
\ No newline at end of file
@@ -0,0 +1,49 @@
+import logging
+import os
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Timeouts and pool sizes of the calls to the other services
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "3.05"))
+HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "30"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+
+
+class _DefaultTimeoutSession(requests.Session):
+    """
+    Session applying the default (connect, read) timeouts to calls that do not set one.
+    """
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS))
+        return super().request(method, url, **kwargs)
+
+
+@lru_cache(maxsize=1)
+def get_http_session() -> requests.Session:
+    """
+    The HTTP session shared by all calls of this process to the hint and problem handler backends.
+
+    Connections are kept alive and pooled per host. Failed connections are retried with
+    exponential backoff for every method (nothing was sent yet); read errors and 502/503/504
+    answers only for idempotent methods (GET, HEAD, PUT, DELETE, OPTIONS), never for POST.
+    """
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        respect_retry_after_header=False,
+        raise_on_status=False,  # return the last answer, callers check its status
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+    session = _DefaultTimeoutSession()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    logger.info(f"Created HTTP session (pool size {HTTP_POOL_MAXSIZE}, retries {HTTP_MAX_RETRIES})")
+    return session
@@ -271,4 +271,7 @@ INSTRUCTOR_FEEDBACK_CONFIGS = INSTRUCTOR_FEEDBACK_CONFIGS_BASE / "config.yaml"
 
 # Quota config
 QUOTA_CONFIGS_BASE = BASE_DIR / "user_customizable_configs/quota"
-QUOTA_CONFIGS = QUOTA_CONFIGS_BASE / "config.yaml"
\ No newline at end of file
+QUOTA_CONFIGS = QUOTA_CONFIGS_BASE / "config.yaml"
+# Admission control config
+ADMISSION_CONFIGS_BASE = BASE_DIR / "user_customizable_configs/admission"
+ADMISSION_CONFIGS = ADMISSION_CONFIGS_BASE / "config.yaml"
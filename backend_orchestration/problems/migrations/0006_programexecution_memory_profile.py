@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0005_programexecution_is_cancelled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programexecution',
+            name='peak_rss_kb',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='programexecution',
+            name='peak_traced_kb',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='programexecution',
+            name='top_allocations',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0006_programexecution_memory_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programexecution',
+            name='student_notebook',
+            field=models.JSONField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='programexecution',
+            name='cell_times',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -5,15 +5,25 @@ class ProgramExecution(models.Model):
 	student_id = models.CharField(max_length=255, null=True, blank=True, db_index=True)
 	problem_id = models.CharField(max_length=255, db_index=True)
 	program = models.TextField()
+	# Notebook submitted instead of a program (its program cells are extracted by the problem handler)
+	student_notebook = models.JSONField(null=True, blank=True, default=None)
 	
 	execution_id = models.IntegerField(unique=True)
 
 	correctness = models.BooleanField(null=True, blank=True)
 	output = models.TextField(null=True, blank=True)
 	elapsed_time = models.FloatField(null=True, blank=True)
+	# Memory use: peak RSS of the test run, and in benchmark mode the peak allocated by the test cases
+	# (tracemalloc) and the lines of the program allocating the most
+	peak_rss_kb = models.PositiveIntegerField(null=True, blank=True)
+	peak_traced_kb = models.PositiveIntegerField(null=True, blank=True)
+	top_allocations = models.JSONField(null=True, blank=True)
+	# CPU time of each cell of a notebook submission
+	cell_times = models.JSONField(null=True, blank=True)
 	# Execution status
 	is_success = models.BooleanField(null=True, blank=True)
 	error_message = models.TextField(null=True, blank=True)
+	is_cancelled = models.BooleanField(default=False)
 	
 	created_at = models.DateTimeField(auto_now_add=True)
 	updated_at = models.DateTimeField(auto_now=True)
@@ -7,4 +7,5 @@ urlpatterns = [
     path("programming_problems/", views.query_programming_problems, name="query_programming_problems"),  # Query all or single programming problem
     path("execute_program/", views.execute_program, name="execute_program"),  # Execute student program against test cases
     path("get_execution_result/", views.get_execution_result, name="get_execution_result"),  # Handle polling for execution result
+    path("cancel_execution/", views.cancel_execution, name="cancel_execution"),  # Cancel a pending execution
 ]
\ No newline at end of file
@@ -1,28 +1,81 @@
 import os
 import logging
-from typing import Dict
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
 from django.http import JsonResponse
 import requests
 
+from backend_orchestration.http_utils import get_http_session
+
 
 logger = logging.getLogger(__name__)
 
+# Cached problems are served without asking the problem handler for this long, then revalidated with their ETag
+PROBLEM_METADATA_MAX_AGE_SECONDS = float(os.getenv("PROBLEM_METADATA_MAX_AGE_SECONDS", "30"))
+MAX_CACHED_PROBLEM_QUERIES = 256
 
-def request_problems(params) -> tuple[Dict, int]:
-    base_url = os.getenv("BACKEND_PROBLEM_HANDLER_GET_PROBLEMS_URL")
 
+@dataclass
+class _CachedProblems:
+    data: Any
+    etag: str
+    validated_at: float
+
+
+_problems_cache: Dict[tuple, _CachedProblems] = {}
+_problems_cache_lock = threading.Lock()
+
+
+def fetch_problems(params) -> tuple[Any, int, Optional[str]]:
+    """
+    Query the problem handler, through a local cache of its answers.
+    Returns the data, the status code and the ETag of the data (None if not cacheable).
+
+    Cached answers are served as is for PROBLEM_METADATA_MAX_AGE_SECONDS, then revalidated
+    with If-None-Match: an unchanged problem costs a body-less 304, not a new download.
+    """
+    key = tuple(sorted(params.items()))
+    with _problems_cache_lock:
+        cached = _problems_cache.get(key)
+    if cached is not None and time.monotonic() - cached.validated_at < PROBLEM_METADATA_MAX_AGE_SECONDS:
+        return cached.data, 200, cached.etag
+
+    base_url = os.getenv("BACKEND_PROBLEM_HANDLER_GET_PROBLEMS_URL")
+    headers = {"If-None-Match": cached.etag} if cached is not None else {}
     try:
-        resp = requests.get(base_url, params=params)
+        resp = get_http_session().get(base_url, params=params, headers=headers)
     except requests.RequestException as e:
         logger.error("Network error proxying programming problems: %s", e)
-        return {"error": "Upstream network error", "detail": str(e)}, 502
+        return {"error": "Upstream network error", "detail": str(e)}, 502, None
+
+    if resp.status_code == 304 and cached is not None:
+        cached.validated_at = time.monotonic()
+        return cached.data, 200, cached.etag
 
     try:
         data = resp.json()
-        return data, resp.status_code
     except ValueError:
         return {
             "error": "Upstream returned non-JSON",
             "status_code": resp.status_code,
             "body": resp.text[:500],
-        }, 502 if resp.status_code == 200 else resp.status_code
\ No newline at end of file
+        }, 502 if resp.status_code == 200 else resp.status_code, None
+
+    etag = resp.headers.get("ETag")
+    with _problems_cache_lock:
+        if resp.status_code == 200 and etag:
+            if key not in _problems_cache and len(_problems_cache) >= MAX_CACHED_PROBLEM_QUERIES:
+                oldest = min(_problems_cache, key=lambda k: _problems_cache[k].validated_at)
+                del _problems_cache[oldest]
+            _problems_cache[key] = _CachedProblems(data=data, etag=etag, validated_at=time.monotonic())
+        else:
+            _problems_cache.pop(key, None)
+            etag = None
+    return data, resp.status_code, etag
+
+
+def request_problems(params) -> tuple[Dict, int]:
+    data, status_code, _etag = fetch_problems(params)
+    return data, status_code
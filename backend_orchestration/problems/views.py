@@ -1,14 +1,15 @@
 import os
 import json
 import logging
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
-import requests
 from django.http import JsonResponse, HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
 from django.views.decorators.csrf import csrf_exempt
 from django.db import transaction
 
-from problems.utils import request_problems
+from backend_orchestration.http_utils import get_http_session
+from problems.utils import fetch_problems
 
 from .models import ProgramExecution
 
@@ -22,10 +23,18 @@ def _get_required_url(var_name: str) -> str:
     return url
 
 
+def _optional_int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
 def query_programming_problems(request: HttpRequest) -> HttpResponse:
     """
-    Proxy GET to problem handler:
+    Proxy GET to problem handler (through the local problem cache):
       /programming_problems/?problem_id=<id>
+    The problem handler's ETag is passed on; If-None-Match with it gets 304 if unchanged.
     """
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -34,19 +43,28 @@ def query_programming_problems(request: HttpRequest) -> HttpResponse:
     params = request.GET.dict()
     logger.info(f"query_programming_problems with params: {params}")
 
-    json_response, status_code = request_problems(params)
-    return JsonResponse(
+    json_response, status_code, etag = fetch_problems(params)
+    if etag is not None:
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response["ETag"] = etag
+            return response
+    response = JsonResponse(
         json_response,
         safe=not isinstance(json_response, list),
         status=status_code
     )
+    if etag is not None:
+        response["ETag"] = etag
+    return response
 
 
 @csrf_exempt
 def execute_program(request: HttpRequest) -> HttpResponse:
     """
     Proxy POST to problem handler:
-      Body: { "problem_id": "...", "student_program": "..." }
+      Body: { "problem_id": "...", "student_program": "...", "mode": "test" | "benchmark" (optional) }
+      or, for a notebook submission, "student_notebook": {<nbformat JSON>} instead of "student_program"
     """
     if request.method != "POST":
         return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -66,18 +84,26 @@ def execute_program(request: HttpRequest) -> HttpResponse:
 
     problem_id = payload.get("problem_id")
     student_program = payload.get("student_program")
+    student_notebook = payload.get("student_notebook")
     student_id = payload.get("student_id") or None
+    mode = payload.get("mode")
 
     if not problem_id:
         logger.error(f"Missing field: problem_id")
         return JsonResponse({"error": "Missing field: problem_id"}, status=400)
-    if not isinstance(student_program, str):
+    if not isinstance(student_program, str) and student_notebook is None:
         logger.error(f"Missing or empty field: student_program")
-        return JsonResponse({"error": "Missing field: student_program"}, status=400)
+        return JsonResponse({"error": "Missing field: student_program or student_notebook"}, status=400)
 
     # Call execution backend
     try:
-        resp = requests.post(base_url, json={"problem_id": problem_id, "student_program": student_program})
+        if isinstance(student_program, str):
+            upstream_payload = {"problem_id": problem_id, "student_program": student_program}
+        else:
+            upstream_payload = {"problem_id": problem_id, "student_notebook": student_notebook}
+        if mode is not None:
+            upstream_payload["mode"] = mode
+        resp = get_http_session().post(base_url, json=upstream_payload)
     except Exception as e:
         logger.error(f"Upstream network error for problem_id={problem_id}: {e}")
         return JsonResponse({"error": "Upstream network error", "detail": str(e)}, status=502)
@@ -119,7 +145,8 @@ def execute_program(request: HttpRequest) -> HttpResponse:
         ProgramExecution.objects.create(
             student_id=student_id,
             problem_id=problem_id,
-            program=student_program,
+            program=student_program if isinstance(student_program, str) else "",
+            student_notebook=student_notebook if not isinstance(student_program, str) else None,
             execution_id=execution_id,
         )
 
@@ -148,7 +175,7 @@ def get_execution_result(request: HttpRequest) -> HttpResponse:
         return JsonResponse({"error": "Missing query parameter: execution_id"}, status=400)
 
     try:
-        resp = requests.get(base_url, params={"execution_id": execution_id})
+        resp = get_http_session().get(base_url, params={"execution_id": execution_id})
     except Exception as e:
         logger.error(f"Upstream network error for execution_id={execution_id}: {e}")
         # Update record with failure info (no correctness) and return error
@@ -205,10 +232,53 @@ def get_execution_result(request: HttpRequest) -> HttpResponse:
                     exec_rec.elapsed_time = float(elapsed) if elapsed is not None else None
                 except (TypeError, ValueError):
                     exec_rec.elapsed_time = None
-                exec_rec.save(update_fields=["correctness", "output", "elapsed_time", "is_success"])
+                exec_rec.peak_rss_kb = _optional_int(data.get("peak_rss_kb"))
+                benchmark = data.get("benchmark") if isinstance(data.get("benchmark"), dict) else {}
+                exec_rec.peak_traced_kb = _optional_int(benchmark.get("peak_traced_kb"))
+                exec_rec.top_allocations = benchmark.get("top_allocations")
+                exec_rec.cell_times = data.get("cell_times") if isinstance(data.get("cell_times"), list) else None
+                exec_rec.save(update_fields=[
+                    "correctness", "output", "elapsed_time", "is_success", "peak_rss_kb", "peak_traced_kb", "top_allocations",
+                    "cell_times",
+                ])
                 logger.info(f"ProgramExecution updated with results id={exec_rec.id} execution_id={execution_id} success={exec_rec.is_success}")
         except Exception:
             logger.exception("Failed to update ProgramExecution with results execution_id=%s", execution_id)
 
     logger.info(f"get_execution_result completed execution_id={execution_id} status={resp.status_code}")
-    return JsonResponse(data, status=resp.status_code)
\ No newline at end of file
+    return JsonResponse(data, status=resp.status_code)
+
+
+@csrf_exempt
+def cancel_execution(request: HttpRequest) -> HttpResponse:
+    """
+    Proxy POST to problem handler:
+      Body: { "execution_id": <id> }
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        base_url = _get_required_url("BACKEND_PROBLEM_HANDLER_CANCEL_EXECUTION_URL")
+    except RuntimeError as e:
+        logger.error(f"cancel_execution configuration error: {e}")
+        return JsonResponse({"error": str(e)}, status=500)
+
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+        execution_id = int(payload["execution_id"])
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        logger.error("Invalid body in cancel_execution")
+        return JsonResponse({"error": "Invalid body: execution_id required"}, status=400)
+
+    try:
+        resp = get_http_session().post(base_url, json={"execution_id": execution_id}, timeout=10)
+    except Exception as e:
+        logger.error(f"Upstream network error cancelling execution_id={execution_id}: {e}")
+        return JsonResponse({"error": "Upstream network error", "detail": str(e)}, status=502)
+
+    if resp.status_code == 204:
+        ProgramExecution.objects.filter(execution_id=execution_id, is_success__isnull=True).update(is_cancelled=True)
+
+    logger.info(f"cancel_execution completed execution_id={execution_id} status={resp.status_code}")
+    return HttpResponse(resp.content, status=resp.status_code, content_type=resp.headers.get("Content-Type"))
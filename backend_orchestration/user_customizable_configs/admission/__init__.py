@@ -0,0 +1 @@
+# Package marker for admission control configs
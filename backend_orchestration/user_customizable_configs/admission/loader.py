@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from functools import lru_cache
+
+import yaml
+from pydantic import BaseModel, Field, model_validator
+
+from backend_orchestration.settings import ADMISSION_CONFIGS
+
+
+class AdmissionLoadError(RuntimeError):
+	"""Raised when the admission configuration cannot be loaded or validated."""
+
+
+class Admission(BaseModel):
+	"""Admission control of new hint requests.
+
+	A request is rejected when too many requests are in flight, or when recently finished
+	requests took too long compared with the time a client waits for its hint.
+	"""
+	enabled: bool = Field(default=True)
+	completion_time_limit_seconds: float = Field(default=240.0, gt=0)
+	max_in_flight_requests: int = Field(default=100, gt=0)
+	max_p95_share_of_time_limit: float = Field(default=0.8, gt=0)
+	window_seconds: float = Field(default=600.0, gt=0)
+	max_samples: int = Field(default=200, gt=0)
+	min_samples: int = Field(default=20, ge=1)
+	in_flight_max_age_seconds: float = Field(default=600.0, gt=0)
+	min_retry_after_seconds: int = Field(default=5, ge=1)
+	max_retry_after_seconds: int = Field(default=120, ge=1)
+	stats_cache_seconds: float = Field(default=2.0, ge=0)
+
+	@model_validator(mode="after")
+	def _check_bounds(self):
+		if self.min_retry_after_seconds > self.max_retry_after_seconds:
+			raise ValueError("min_retry_after_seconds must not exceed max_retry_after_seconds")
+		if self.min_samples > self.max_samples:
+			raise ValueError("min_samples must not exceed max_samples")
+		return self
+
+
+class AdmissionConfig(BaseModel):
+	admission: Admission = Field(default_factory=Admission)
+
+
+@lru_cache(maxsize=1)
+def load_admission_config() -> AdmissionConfig:
+	"""Load and validate the admission configuration from YAML (cached)."""
+	path = ADMISSION_CONFIGS
+	if not path.is_file():
+		raise AdmissionLoadError(f"Admission config file not found: {path}")
+	try:
+		with path.open("r", encoding="utf-8") as f:
+			data = yaml.safe_load(f) or {}
+	except Exception as e:
+		raise AdmissionLoadError(f"Failed to read admission config: {e}") from e
+
+	try:
+		return AdmissionConfig(**data)
+	except Exception as e:
+		raise AdmissionLoadError(f"Invalid admission config: {e}") from e
+
+
+def get_admission() -> Admission:
+	"""Convenience accessor for the admission section."""
+	return load_admission_config().admission
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 from datetime import datetime
 import os
 from pathlib import Path
+import tempfile
 import importlib.util as _importlib_util
 import importlib as _importlib
 import dj_database_url
@@ -252,4 +253,26 @@ PROGRAMMING_TASK_CONFIGS_TASK_DESCRIPTIONS = PROGRAMMING_TASK_CONFIGS_BASE / "ta
 PROGRAMMING_TASK_CONFIGS_TEMPLATE_CODE = PROGRAMMING_TASK_CONFIGS_BASE / "template_code"
 PROGRAMMING_TASK_CONFIGS_TEST_TEMPLATES = PROGRAMMING_TASK_CONFIGS_BASE / "test_templates"
 PROGRAMMING_TASK_CONFIGS_TEST_CASES = PROGRAMMING_TASK_CONFIGS_BASE / "test_cases"
-PROGRAMMING_TASK_CONFIGS_EXECUTION_BOXES = PROGRAMMING_TASK_CONFIGS_BASE / "execution_boxes"
\ No newline at end of file
+PROGRAMMING_TASK_CONFIGS_EXECUTION_BOXES = PROGRAMMING_TASK_CONFIGS_BASE / "execution_boxes"
+PROGRAMMING_TASK_CONFIGS_REFERENCE_SOLUTIONS = PROGRAMMING_TASK_CONFIGS_BASE / "reference_solutions"
+# The task registry checks the task files for changes at most this often (0: only reload on request)
+PROGRAMMING_TASK_REGISTRY_WATCH_INTERVAL_SECONDS = float(os.getenv("TASK_REGISTRY_WATCH_INTERVAL_SECONDS", "2"))
+# Precompiled test harnesses (marshaled code objects) are cached in this directory
+PROGRAMMING_TASK_HARNESS_CACHE_DIR = Path(os.getenv("HARNESS_CACHE_DIR") or Path(tempfile.gettempdir()) / "problem_handler_harness")
+# Preloaded task assets are copied once into this directory, preferably in memory (tmpfs)
+PROGRAMMING_TASK_ASSET_CACHE_DIR = Path(
+    os.getenv("ASSET_CACHE_DIR")
+    or (Path("/dev/shm") if os.path.isdir("/dev/shm") else Path(tempfile.gettempdir())) / "problem_handler_assets"
+)
+# Delegated cgroup v2 directory under which each execution gets its own cgroup (unset: rlimits only)
+EXECUTION_CGROUP_ROOT = os.getenv("EXECUTION_CGROUP_ROOT")
+# Benchmark mode: timed runs of the test cases of a correct program, after warm-up runs
+EXECUTION_BENCHMARK_RUNS = int(os.getenv("BENCHMARK_RUNS", "7"))
+EXECUTION_BENCHMARK_WARMUP_RUNS = int(os.getenv("BENCHMARK_WARMUP_RUNS", "2"))
+# Keep a started interpreter ready in each worker slot for the next notebook execution
+EXECUTION_WARM_NOTEBOOK_INTERPRETERS = os.getenv("EXECUTION_WARM_NOTEBOOK_INTERPRETERS", "1") == "1"
+# Workers hold a lease on the executions they run, renewed by heartbeats; expired leases are reaped
+EXECUTION_LEASE_SECONDS = float(os.getenv("EXECUTION_LEASE_SECONDS", "30"))
+EXECUTION_HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("EXECUTION_HEARTBEAT_INTERVAL_SECONDS", "10"))
+# Identical executions requested while one is in flight share its run and result
+EXECUTION_COALESCE_IN_FLIGHT = os.getenv("EXECUTION_COALESCE_IN_FLIGHT", "1") == "1"
@@ -0,0 +1,201 @@
+import json
+import os
+import platform
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from execution.models import ProgramExecution
+from execution.utils.bench_utils import CATEGORIES, BenchProgram, BenchSample, build_corpus, outcome, summarize
+from execution.utils.execution_utils import run_program_on_test_cases
+from execution.utils.queue_utils import publish_task
+from user_customizable_configs.programming_tasks.task_loader import get_all_task_assets, get_task_assets
+
+# How often the queued path polls for finished executions
+POLL_INTERVAL_SECONDS = 0.02
+
+
+def run_direct(jobs, concurrency):
+    """Run the jobs with `run_program_on_test_cases` in this process, `concurrency` at a time."""
+    def run(job: BenchProgram) -> BenchSample:
+        started = time.perf_counter()
+        try:
+            result = run_program_on_test_cases(program=job.program, assets=get_task_assets(job.problem_id))
+        except Exception:
+            return BenchSample(job.problem_id, job.category, latency=time.perf_counter() - started, outcome="failed")
+        return BenchSample(
+            job.problem_id,
+            job.category,
+            latency=time.perf_counter() - started,
+            run_seconds=result.wall_time,
+            outcome=outcome(job.category, result.correctness, result.buggy_output),
+        )
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(run, jobs))
+
+
+def run_queued(jobs, concurrency, timeout, keep):
+    """
+    Queue the jobs for the execution workers, like the execute_program view does, keeping at most
+    `concurrency` of them in flight, and poll the database for their results.
+    """
+    pending = list(reversed(jobs))
+    in_flight = {}  # execution id -> (job, monotonic time queued)
+    execution_ids = []
+    samples = []
+    try:
+        while pending or in_flight:
+            while pending and len(in_flight) < concurrency:
+                job = pending.pop()
+                queued_at = time.monotonic()
+                exec_rec = ProgramExecution.objects.create(problem_id=job.problem_id, mode="test", program=job.program)
+                execution_ids.append(exec_rec.pk)
+                publish_task(
+                    type="execute_program",
+                    tries=1,
+                    data={
+                        "problem_id": job.problem_id,
+                        "student_program": job.program,
+                        "cells": None,
+                        "execution_id": exec_rec.pk,
+                        "mode": "test",
+                    },
+                    priority=int(os.getenv("EXECUTE_PROGRAM_PRIORITY", "1")),
+                )
+                in_flight[exec_rec.pk] = (job, queued_at)
+
+            time.sleep(POLL_INTERVAL_SECONDS)
+            finished = ProgramExecution.objects.filter(pk__in=list(in_flight), is_success__isnull=False).values(
+                "pk", "is_success", "correctness", "output", "created_at", "claimed_at", "updated_at",
+            )
+            now = time.monotonic()
+            for row in finished:
+                job, queued_at = in_flight.pop(row["pk"])
+                queue_wait = run_seconds = None
+                if row["claimed_at"] is not None:
+                    queue_wait = (row["claimed_at"] - row["created_at"]).total_seconds()
+                    run_seconds = (row["updated_at"] - row["claimed_at"]).total_seconds()
+                samples.append(BenchSample(
+                    job.problem_id,
+                    job.category,
+                    latency=now - queued_at,
+                    run_seconds=run_seconds,
+                    queue_wait_seconds=queue_wait,
+                    outcome=outcome(job.category, row["correctness"], row["output"]) if row["is_success"] else "failed",
+                ))
+            for execution_id, (job, queued_at) in list(in_flight.items()):
+                if now - queued_at > timeout:
+                    del in_flight[execution_id]
+                    ProgramExecution.objects.filter(pk=execution_id, is_success__isnull=True).update(
+                        is_cancelled=True, is_success=False, error="Execution cancelled", updated_at=timezone.now(),
+                    )
+                    samples.append(BenchSample(job.problem_id, job.category, latency=now - queued_at, outcome="timeout"))
+    finally:
+        if not keep:
+            ProgramExecution.objects.filter(pk__in=execution_ids).delete()
+    return samples
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the execution throughput and latency with a corpus of correct, buggy, exception, infinite-loop "
+        "and heavy-output programs for each task, run directly and/or through the queue and the workers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", choices=("direct", "queued", "both"), default="direct",
+                            help="direct: run_program_on_test_cases in this process; queued: through the queue and running workers")
+        parser.add_argument("--tasks", default="", help="Comma-separated problem ids (default: all tasks)")
+        parser.add_argument("--categories", default=",".join(CATEGORIES), help=f"Comma-separated, among: {', '.join(CATEGORIES)}")
+        parser.add_argument("--repeat", type=int, default=3, help="Runs of each program of the corpus")
+        parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 1, help="Executions in flight at a time")
+        parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for a queued execution")
+        parser.add_argument("--output", default=None, help="Write the figures as JSON to this file ('-': stdout)")
+        parser.add_argument("--keep", action="store_true", help="Keep the execution records of the queued path")
+
+    def handle(self, *args, **options):
+        categories = [c for c in options["categories"].split(",") if c]
+        unknown = set(categories) - set(CATEGORIES)
+        if unknown:
+            raise CommandError(f"Unknown categories: {', '.join(sorted(unknown))}")
+        tasks = get_all_task_assets()
+        if options["tasks"]:
+            problem_ids = set(options["tasks"].split(","))
+            tasks = [a for a in tasks if a.task.problem_id in problem_ids]
+            if len(tasks) != len(problem_ids):
+                raise CommandError(f"Unknown tasks: {', '.join(sorted(problem_ids - {a.task.problem_id for a in tasks}))}")
+
+        corpus, skipped = build_corpus(tasks, categories)
+        if not corpus:
+            raise CommandError("Empty corpus: " + "; ".join(skipped))
+        jobs = corpus * max(options["repeat"], 1)
+        concurrency = max(options["concurrency"], 1)
+        json_to_stdout = options["output"] == "-"
+        if not json_to_stdout:
+            for reason in skipped:
+                self.stderr.write(f"Skipped {reason}")
+
+        paths = ("direct", "queued") if options["path"] == "both" else (options["path"],)
+        results = {}
+        for path in paths:
+            started = time.perf_counter()
+            if path == "direct":
+                samples = run_direct(jobs, concurrency)
+            else:
+                try:
+                    samples = run_queued(jobs, concurrency, options["timeout"], options["keep"])
+                finally:
+                    close_old_connections()
+            results[path] = summarize(samples, time.perf_counter() - started)
+            if not json_to_stdout:
+                self._write_summary(path, results[path])
+
+        report = {
+            "version": 1,
+            "generated_at": timezone.now().isoformat(),
+            "host": {
+                "hostname": socket.gethostname(),
+                "cpus": os.cpu_count(),
+                "python": platform.python_version(),
+            },
+            "config": {
+                "tasks": [a.task.problem_id for a in tasks],
+                "categories": categories,
+                "repeat": options["repeat"],
+                "concurrency": concurrency,
+            },
+            "corpus": {"programs": len(corpus), "skipped": skipped},
+            "results": results,
+        }
+        if json_to_stdout:
+            self.stdout.write(json.dumps(report, indent=2))
+        elif options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+                f.write("\n")
+            self.stdout.write(f"Wrote {options['output']}")
+
+    def _write_summary(self, path, summary):
+        def seconds(distribution):
+            if distribution is None:
+                return "n/a"
+            return f"p50 {distribution['p50']:.3f}s p95 {distribution['p95']:.3f}s p99 {distribution['p99']:.3f}s"
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{path}: {summary['executions']} executions in {summary['elapsed_seconds']:.1f}s "
+            f"({summary['throughput_per_second']}/s), outcomes {summary['outcomes']}"
+        ))
+        self.stdout.write(f"  latency     {seconds(summary['latency_seconds'])}")
+        if summary["queue_wait_seconds"] is not None:
+            self.stdout.write(f"  queue wait  {seconds(summary['queue_wait_seconds'])}")
+        self.stdout.write(f"  run         {seconds(summary['run_seconds'])}")
+        for category, figures in summary["by_category"].items():
+            self.stdout.write(
+                f"  {category:<14} {figures['executions']:>4} runs, latency {seconds(figures['latency_seconds'])}"
+                + (f", {figures['not_expected']} not as expected" if figures["not_expected"] else "")
+            )
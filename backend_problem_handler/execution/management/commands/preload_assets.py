@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from execution.utils.asset_utils import STALE_RUN_DIR_SECONDS, preload_stats, remove_stale_run_dirs, run_dir
+from user_customizable_configs.programming_tasks.task_loader import get_all_task_assets
+
+
+class Command(BaseCommand):
+    help = (
+        "Preload the declared assets of every task into the asset cache, and print their size and read times; "
+        "remove the stale mirrors of older versions of the assets"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stale-after", type=float, default=STALE_RUN_DIR_SECONDS,
+                            help="Remove the mirrors of older versions of the assets not modified for this many seconds")
+
+    def handle(self, *args, **options):
+        tasks = get_all_task_assets()
+        for name in remove_stale_run_dirs(tasks, max_age_seconds=options["stale_after"]):
+            self.stdout.write(f"Removed stale mirror {name}")
+        for assets in tasks:
+            if not assets.preloaded_files:
+                continue
+            path = run_dir(assets)
+            size_bytes = sum(size for _path, size, _mtime in assets.preloaded_files)
+
+            # What each execution pays reading all of them
+            started = time.perf_counter()
+            for relative_path, _size, _mtime in assets.preloaded_files:
+                (path / relative_path).read_bytes()
+            read_seconds = time.perf_counter() - started
+
+            stats = {s.problem_id: s for s in preload_stats()}.get(assets.task.problem_id)
+            if stats is not None and stats.load_seconds is not None:
+                load_time = f"loaded in {stats.load_seconds * 1000:.1f} ms"
+            else:
+                load_time = "already loaded"
+            self.stdout.write(
+                f"{assets.task.problem_id}: {len(assets.preloaded_files)} files, {size_bytes / 1024:.0f} KiB, "
+                f"{load_time}, read in {read_seconds * 1000:.2f} ms, at {path}"
+            )
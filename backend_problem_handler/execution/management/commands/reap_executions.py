@@ -0,0 +1,47 @@
+import logging
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from execution.utils.lease_utils import reap_expired_leases
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Re-dispatch or fail the executions whose worker lease expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=float(os.getenv("EXECUTION_REAPER_INTERVAL_SECONDS", "10")))
+        parser.add_argument("--once", action="store_true", help="Reap once and exit")
+        parser.add_argument("--max-tries", type=int, default=int(os.getenv("MAX_TRIES", "3")))
+        parser.add_argument("--retry-priority", type=int, default=int(os.getenv("RETRY_PRIORITY", "2")))
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        self.stdout.write(self.style.SUCCESS(f"Execution reaper starting (interval={interval}s)"))
+
+        while True:
+            try:
+                redispatched, failed = reap_expired_leases(
+                    max_tries=options["max_tries"],
+                    retry_priority=options["retry_priority"],
+                )
+                if redispatched or failed:
+                    logger.info(f"Reaped expired leases: {redispatched} re-dispatched, {failed} failed")
+            except KeyboardInterrupt:
+                logger.info("Reaper interrupted. Exiting.")
+                break
+            except Exception:
+                logger.exception("Failed reaping expired leases")
+            finally:
+                close_old_connections()
+            if options["once"]:
+                break
+            try:
+                time.sleep(interval)
+            except KeyboardInterrupt:
+                logger.info("Reaper interrupted. Exiting.")
+                break
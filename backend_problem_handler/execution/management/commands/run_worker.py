@@ -1,24 +1,48 @@
+import functools
+import itertools
 import json
 import os
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
 import pika
 from django.core.management.base import BaseCommand
+from django.db import close_old_connections
 
 from execution.workers.task_processors import process_task
+from execution.utils.asset_utils import remove_stale_run_dirs, run_dir
 from execution.utils.queue_utils import get_connection
+from execution.utils.sandbox_utils import SlotPlacement, set_slot_placement
+from user_customizable_configs.programming_tasks.task_loader import get_all_task_assets
 
 logger = logging.getLogger(__name__)
 
 
-def callback(ch, method, properties, body):
-    logger.info(f" [x] Worker callback received `{str(body)[:120]}`")
-    args = json.loads(body)
+def available_cpus():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
 
-    process_task(args)
 
-    ch.basic_ack(delivery_tag=method.delivery_tag)
-    logger.info(f" [x] Worker has done processing request {str(args)[:120]}")
+def run_task(connection, channel, delivery_tag, body):
+    """Process a task in a slot thread, then ack it from the connection's thread."""
+    try:
+        logger.info(f" [x] Worker slot received `{str(body)[:120]}`")
+        close_old_connections()
+        args = json.loads(body)
+        process_task(args)
+        logger.info(f" [x] Worker has done processing request {str(args)[:120]}")
+    except Exception:
+        logger.exception(f"Dropping unprocessable task `{str(body)[:120]}`")
+    finally:
+        close_old_connections()
+        try:
+            connection.add_callback_threadsafe(functools.partial(channel.basic_ack, delivery_tag=delivery_tag))
+        except Exception as e:
+            # The connection was lost: the broker redelivers the task
+            logger.warning(f"Could not ack task {delivery_tag}: {e}")
 
 
 class Command(BaseCommand):
@@ -27,21 +51,59 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("--queue", default=os.getenv("TASK_QUEUE", "exec_task_queue"))
         parser.add_argument("--max-priority", type=int, default=int(os.getenv("QUEUE_MAX_PRIORITY", "2")))
-        parser.add_argument("--prefetch", type=int, default=1)
+        parser.add_argument(
+            "--slots", type=int, default=int(os.getenv("EXECUTION_WORKER_SLOTS") or len(available_cpus())),
+            help="Executions run concurrently (default: EXECUTION_WORKER_SLOTS, or the number of available CPUs)",
+        )
+        parser.add_argument("--prefetch", type=int, default=None, help="Unacked messages (default: the number of slots)")
+        parser.add_argument(
+            "--pin-cpus", action="store_true", default=os.getenv("EXECUTION_PIN_CPUS", "0") == "1",
+            help="Pin the executions of each slot to one of the available CPUs",
+        )
+        parser.add_argument(
+            "--nice", type=int, default=int(os.getenv("EXECUTION_NICENESS", "0")),
+            help="Niceness increment of the executed programs",
+        )
         parser.add_argument("--reconnect-delay", type=int, default=3)
 
 
     def handle(self, *args, **options):
         queue = options["queue"]
         max_priority = options["max_priority"]
-        prefetch = options["prefetch"]
+        slots = max(options["slots"], 1)
+        prefetch = options["prefetch"] or slots
         reconnect_delay = options["reconnect_delay"]
 
         self.stdout.write(self.style.SUCCESS(
-            f"Worker starting (queue={queue}, max_priority={max_priority})"
+            f"Worker starting (queue={queue}, max_priority={max_priority}, slots={slots})"
         ))
 
+        # Build the task registry and preload the task assets before the first execution
+        try:
+            tasks = get_all_task_assets()
+            for assets in tasks:
+                run_dir(assets)
+            remove_stale_run_dirs(tasks)
+        except Exception:
+            logger.exception("Failed building the task registry; retrying on the first execution")
+
+        # One thread per slot; each places the executions it starts
+        cpus = available_cpus()
+        slot_ids = itertools.count()
+
+        def init_slot():
+            slot_id = next(slot_ids)
+            cpu = cpus[slot_id % len(cpus)] if options["pin_cpus"] else None
+            set_slot_placement(SlotPlacement(
+                cpus=frozenset([cpu]) if cpu is not None else None,
+                niceness=options["nice"],
+            ))
+            logger.info(f"Worker slot {slot_id} started (cpu={cpu}, nice={options['nice']})")
+
+        executor = ThreadPoolExecutor(max_workers=slots, thread_name_prefix="slot", initializer=init_slot)
+
         while True:
+            connection = None
             try:
                 # Connect to a local broker
                 connection = get_connection()
@@ -54,22 +116,28 @@ class Command(BaseCommand):
                     arguments={"x-max-priority": max_priority},
                 )
 
-                # Set QoS and consume messages
+                # Hand each message to a slot; the broker sends no more than `prefetch` unacked messages
+                def callback(ch, method, properties, body):
+                    executor.submit(run_task, connection, ch, method.delivery_tag, body)
+
                 channel.basic_qos(prefetch_count=prefetch)
                 channel.basic_consume(queue=queue, on_message_callback=callback)
-                logger.info(f"Worker consuming on '{queue}'...")
+                logger.info(f"Worker consuming on '{queue}' with {slots} slots (prefetch {prefetch})...")
                 channel.start_consuming()
             
             except (pika.exceptions.AMQPConnectionError, OSError):
                 logger.warning(f"RabbitMQ not reachable. Retry in {reconnect_delay}s")
                 time.sleep(reconnect_delay)
             except KeyboardInterrupt:
-                logger.info("Worker interrupted. Exiting.")
+                logger.info("Worker interrupted. Waiting for the running executions, then exiting.")
+                executor.shutdown(wait=True, cancel_futures=True)
                 try:
+                    # Send the acks of the executions that just finished
+                    connection.process_data_events(time_limit=0)
                     connection.close()
                 except Exception:
                     pass
                 break
             except Exception:
                 logger.exception("Unexpected worker error. Restarting in %ss", reconnect_delay)
-                time.sleep(reconnect_delay)
\ No newline at end of file
+                time.sleep(reconnect_delay)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execution', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programexecution',
+            name='is_cancelled',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execution', '0002_programexecution_is_cancelled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programexecution',
+            name='wall_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='programexecution',
+            name='peak_rss_kb',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execution', '0003_programexecution_wall_time_peak_rss_kb'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programexecution',
+            name='mode',
+            field=models.CharField(default='test', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='programexecution',
+            name='benchmark',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execution', '0004_programexecution_mode_benchmark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programexecution',
+            name='program',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='programexecution',
+            name='worker_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='programexecution',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='programexecution',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='programexecution',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
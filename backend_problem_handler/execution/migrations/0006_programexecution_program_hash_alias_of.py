@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execution', '0005_programexecution_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programexecution',
+            name='program_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='programexecution',
+            name='alias_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='execution.programexecution'),
+        ),
+    ]
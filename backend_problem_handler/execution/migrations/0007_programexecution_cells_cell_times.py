@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execution', '0006_programexecution_program_hash_alias_of'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programexecution',
+            name='cells',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='programexecution',
+            name='cell_times',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execution', '0007_programexecution_cells_cell_times'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programexecution',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -3,12 +3,39 @@ from django.db import models
 
 class ProgramExecution(models.Model):
     problem_id = models.CharField(max_length=255, db_index=True)
+    # "test": run the test cases once; "benchmark": then, if correct, benchmark the program
+    mode = models.CharField(max_length=16, default="test")
+    # Kept to re-dispatch the execution if its worker is lost
+    program = models.TextField(null=True, blank=True)
+    # Code cells of a notebook submission, run one by one (the program is them joined)
+    cells = models.JSONField(null=True, blank=True)
+    # Hash of (problem_id, program), to find an identical execution in flight
+    program_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    # In-flight execution this one was coalesced with: it is not run itself and reports that one's result
+    alias_of = models.ForeignKey("self", null=True, blank=True, on_delete=models.CASCADE, related_name="aliases")
 
     output = models.TextField(null=True, blank=True)
     correctness = models.BooleanField(null=True, blank=True)
+    # CPU time of the testing program (seconds)
     elapsed_time = models.FloatField(null=True, blank=True)
+    wall_time = models.FloatField(null=True, blank=True)
+    peak_rss_kb = models.PositiveIntegerField(null=True, blank=True)
+    # CPU time of each notebook cell run (seconds), for notebook submissions
+    cell_times = models.JSONField(null=True, blank=True)
+    # Benchmark figures (see BenchmarkStats), in benchmark mode
+    benchmark = models.JSONField(null=True, blank=True)
     is_success = models.BooleanField(null=True, blank=True)
     error = models.TextField(null=True, blank=True)
+    # Set when the requester no longer needs the result; a cancelled execution is not (or no longer) run
+    is_cancelled = models.BooleanField(default=False)
+
+    # Lease of the worker running the execution, renewed by its heartbeats; expired leases are reaped
+    worker_id = models.CharField(max_length=255, null=True, blank=True)
+    # When the lease was last claimed, i.e. when the execution left the queue
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
\ No newline at end of file
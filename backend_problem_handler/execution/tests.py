@@ -1,3 +1,409 @@
-from django.test import TestCase
+import dataclasses
+import json
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from execution.models import ProgramExecution
+from execution.utils.execution_utils import SCRIPT_LAUNCHER, run_program_on_test_cases
+from execution.utils.notebook_utils import NotebookError, extract_program_cells, run_notebook_on_test_cases
+from execution.utils.sandbox_utils import (
+    CPU_LIMIT_EXCEEDED, MEMORY_LIMIT_EXCEEDED, OUTPUT_LIMIT_EXCEEDED, PROCESS_LIMIT_EXCEEDED, STDERR_TAIL_BYTES, STDOUT_HEAD_BYTES,
+    TIME_LIMIT_EXCEEDED, SlotPlacement, run_sandboxed, set_slot_placement,
+)
+from execution.utils.lease_utils import WORKER_ID, WORKER_LOST_ERROR, claim_lease, leased, reap_expired_leases
+from user_customizable_configs.programming_tasks.task_loader import NotebookCells, ResourceLimits, get_task_assets
+
+
+def with_limits(assets, **limits):
+    """The assets of a task with some of its resource limits replaced."""
+    resource_limits = assets.task.resource_limits.model_copy(update=limits)
+    return dataclasses.replace(assets, task=assets.task.model_copy(update={"resource_limits": resource_limits}))
+
+
+def is_running(pid: int) -> bool:
+    """Whether a process exists and is not a zombie."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+class LeaseTests(TestCase):
+    def setUp(self):
+        self.execution = ProgramExecution.objects.create(problem_id="sum_two_numbers", program="print(1)")
+
+    def expire_lease(self):
+        ProgramExecution.objects.filter(pk=self.execution.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_claim_records_the_lease(self):
+        self.assertTrue(claim_lease(self.execution.pk))
+        self.execution.refresh_from_db()
+        self.assertEqual(self.execution.worker_id, WORKER_ID)
+        self.assertEqual(self.execution.attempts, 1)
+        self.assertIsNotNone(self.execution.claimed_at)
+        self.assertGreater(self.execution.lease_expires_at, timezone.now())
+
+    def test_live_lease_cannot_be_claimed_again(self):
+        self.assertTrue(claim_lease(self.execution.pk))
+        self.assertFalse(claim_lease(self.execution.pk))
+        self.expire_lease()
+        self.assertTrue(claim_lease(self.execution.pk))
+        self.execution.refresh_from_db()
+        self.assertEqual(self.execution.attempts, 2)
+
+    def test_finished_or_cancelled_execution_is_not_claimed(self):
+        ProgramExecution.objects.filter(pk=self.execution.pk).update(is_cancelled=True)
+        self.assertFalse(claim_lease(self.execution.pk))
+        ProgramExecution.objects.filter(pk=self.execution.pk).update(is_cancelled=False, is_success=True)
+        self.assertFalse(claim_lease(self.execution.pk))
+
+    def test_lease_is_released_after_the_run(self):
+        claim_lease(self.execution.pk)
+        with leased(self.execution.pk, max_seconds=5):
+            pass
+        self.execution.refresh_from_db()
+        self.assertIsNone(self.execution.lease_expires_at)
+
+    def test_expired_lease_is_redispatched(self):
+        claim_lease(self.execution.pk)
+        self.expire_lease()
+        with mock.patch("execution.utils.lease_utils.publish_task") as publish_task:
+            self.assertEqual(reap_expired_leases(max_tries=3, retry_priority=1), (1, 0))
+            # Taken over once: a second reaper finds nothing
+            self.assertEqual(reap_expired_leases(max_tries=3, retry_priority=1), (0, 0))
+        self.assertEqual(publish_task.call_count, 1)
+        self.assertEqual(publish_task.call_args.kwargs["data"]["execution_id"], self.execution.pk)
+        self.execution.refresh_from_db()
+        self.assertIsNone(self.execution.worker_id)
+        self.assertIsNone(self.execution.is_success)
+
+    def test_expired_lease_fails_without_tries_left(self):
+        claim_lease(self.execution.pk)
+        self.expire_lease()
+        with mock.patch("execution.utils.lease_utils.publish_task") as publish_task:
+            self.assertEqual(reap_expired_leases(max_tries=1, retry_priority=1), (0, 1))
+        publish_task.assert_not_called()
+        self.execution.refresh_from_db()
+        self.assertFalse(self.execution.is_success)
+        self.assertIn(WORKER_LOST_ERROR, self.execution.error)
+
+
+class CoalescingTests(TestCase):
+    def execute(self, program="print(1)", mode="test"):
+        with mock.patch("execution.views.publish_task") as publish_task, \
+                mock.patch.dict("os.environ", {"EXECUTE_PROGRAM_PRIORITY": "1"}):
+            response = self.client.post(
+                "/execution/execute_program/",
+                json.dumps({"problem_id": "sum_two_numbers", "student_program": program, "mode": mode}),
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.json(), publish_task.call_count
+
+    def cancel(self, execution_id):
+        return self.client.post("/execution/cancel_execution/", json.dumps({"execution_id": execution_id}), content_type="application/json")
+
+    def result(self, execution_id):
+        return self.client.get("/execution/get_execution_result/", {"execution_id": execution_id}).json()
+
+    def test_identical_program_in_flight_is_coalesced(self):
+        first, published = self.execute()
+        self.assertEqual(published, 1)
+        second, published = self.execute()
+        self.assertEqual(published, 0)
+        self.assertEqual(second["alias_of"], first["execution_id"])
+        _, published = self.execute(program="print(2)")
+        self.assertEqual(published, 1)
+
+        ProgramExecution.objects.filter(pk=first["execution_id"]).update(is_success=True, correctness=True, output="ok")
+        self.assertEqual(self.result(second["execution_id"])["buggy_output"], "ok")
+
+    def test_benchmark_request_is_not_coalesced_with_a_test_run(self):
+        self.execute()
+        benchmark, published = self.execute(mode="benchmark")
+        self.assertEqual(published, 1)
+        self.assertNotIn("alias_of", benchmark)
+        test, _ = self.execute()
+        self.assertIn("alias_of", test)
+
+    def test_cancel_is_refused_while_aliases_wait(self):
+        first, _ = self.execute()
+        second, _ = self.execute()
+        response = self.cancel(first["execution_id"])
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(ProgramExecution.objects.get(pk=first["execution_id"]).is_cancelled)
+
+        # Cancelling the alias only cancels it; then nobody waits for the original any more
+        self.assertEqual(self.cancel(second["execution_id"]).status_code, 204)
+        self.assertIn("cancelled", self.result(second["execution_id"])["error"])
+        self.assertEqual(self.result(first["execution_id"])["job_finished"], False)
+        self.assertEqual(self.cancel(first["execution_id"]).status_code, 204)
+        self.assertTrue(ProgramExecution.objects.get(pk=first["execution_id"]).is_cancelled)
+
+        # A cancelled execution is not coalesced with
+        third, published = self.execute()
+        self.assertEqual(published, 1)
+        self.assertNotIn("alias_of", third)
+
+    def test_cancel_of_finished_or_unknown_execution(self):
+        first, _ = self.execute()
+        ProgramExecution.objects.filter(pk=first["execution_id"]).update(is_success=True)
+        self.assertEqual(self.cancel(first["execution_id"]).status_code, 204)
+        self.assertFalse(ProgramExecution.objects.get(pk=first["execution_id"]).is_cancelled)
+        self.assertEqual(self.cancel(first["execution_id"] + 100).status_code, 404)
+
+
+class SandboxVerdictTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.assets = get_task_assets("sum_two_numbers")
+
+    def run_program(self, program, assets=None):
+        return run_program_on_test_cases(program, assets or self.assets)
+
+    def test_correct_program(self):
+        result = self.run_program(self.assets.task.reference_solution_path.read_text())
+        self.assertTrue(result.correctness)
+        self.assertEqual(result.buggy_output, "")
+        self.assertIsNotNone(result.peak_rss_kb)
+
+    def test_syntax_error(self):
+        result = self.run_program("def foo(a, b:\n    return a + b")
+        self.assertFalse(result.correctness)
+        self.assertEqual(result.buggy_output, "SyntaxError")
+
+    def test_exception(self):
+        result = self.run_program("raise ValueError('boom')")
+        self.assertFalse(result.correctness)
+        self.assertEqual(result.buggy_output, "ValueError")
+
+    def test_time_limit(self):
+        result = self.run_program("while True:\n    pass")
+        self.assertFalse(result.correctness)
+        self.assertEqual(result.buggy_output, TIME_LIMIT_EXCEEDED)
+
+    def test_cpu_limit(self):
+        assets = with_limits(self.assets, cpu_seconds=1)
+        assets = dataclasses.replace(assets, task=assets.task.model_copy(update={"timeout": 10}))
+        result = self.run_program("while True:\n    pass", assets)
+        self.assertFalse(result.correctness)
+        self.assertEqual(result.buggy_output, CPU_LIMIT_EXCEEDED)
+
+    def test_memory_limit(self):
+        result = self.run_program("x = [0] * 10 ** 9")
+        self.assertFalse(result.correctness)
+        self.assertEqual(result.buggy_output, MEMORY_LIMIT_EXCEEDED)
+
+    def test_killed_by_signal(self):
+        result = self.run_program("import os, signal\nos.kill(os.getpid(), signal.SIGKILL)")
+        self.assertFalse(result.correctness)
+        self.assertEqual(result.buggy_output, "Killed by SIGKILL")
+
+    def test_fork_bomb(self):
+        # RLIMIT_NPROC does not apply to root: then the fork bomb runs until its time limit
+        result = self.run_program("import os\nwhile True:\n    os.fork()", with_limits(self.assets, max_processes=64))
+        self.assertFalse(result.correctness)
+        self.assertIn(result.buggy_output, (PROCESS_LIMIT_EXCEEDED, TIME_LIMIT_EXCEEDED))
+
+    def test_forked_processes_are_killed(self):
+        program = (
+            "import os, time\n"
+            "for _ in range(8):\n"
+            "    pid = os.fork()\n"
+            "    if pid == 0:\n"
+            "        time.sleep(60)\n"
+            "        os._exit(0)\n"
+            "    print(pid, flush=True)\n"
+            "time.sleep(60)\n"
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            (Path(tmp_dir) / "program.py").write_text(program)
+            run = run_sandboxed(SCRIPT_LAUNCHER, ["program.py"], cwd=Path(tmp_dir), limits=ResourceLimits(), timeout=1)
+        pids = [int(pid) for pid in run.output.stdout_head.split()]
+        self.assertEqual(run.limit_verdict, TIME_LIMIT_EXCEEDED)
+        self.assertEqual(len(pids), 8)
+        # SIGKILL is delivered asynchronously
+        deadline = time.monotonic() + 5
+        while any(is_running(pid) for pid in pids) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertFalse([pid for pid in pids if is_running(pid)])
+
+
+class OutputCaptureTests(SimpleTestCase):
+    def run_script(self, program, limits=None, timeout=5):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            (Path(tmp_dir) / "program.py").write_text(program)
+            return run_sandboxed(SCRIPT_LAUNCHER, ["program.py"], cwd=Path(tmp_dir), limits=limits or ResourceLimits(), timeout=timeout)
+
+    def test_output_limit(self):
+        result = run_program_on_test_cases("while True:\n    print('x' * 1000)", get_task_assets("sum_two_numbers"))
+        self.assertFalse(result.correctness)
+        self.assertEqual(result.buggy_output, OUTPUT_LIMIT_EXCEEDED)
+
+    def test_output_limit_stops_the_run_early(self):
+        run = self.run_script("while True:\n    print('x' * 1000)", ResourceLimits(max_output_kb=64), timeout=30)
+        self.assertEqual(run.limit_verdict, OUTPUT_LIMIT_EXCEEDED)
+        self.assertLess(run.wall_time, 10)
+        self.assertTrue(run.output.output_limit_exceeded)
+
+    def test_keeps_the_head_of_stdout_and_the_tail_of_stderr(self):
+        run = self.run_script(
+            "import sys\n"
+            "sys.stdout.write('o' * (1 << 20))\n"
+            "sys.stderr.write('e' * (1 << 20) + 'Traceback end\\nValueError: last')\n"
+        )
+        self.assertIsNone(run.limit_verdict)
+        self.assertEqual(run.output.stdout_head, b"o" * STDOUT_HEAD_BYTES)
+        self.assertEqual(len(run.output.stderr_tail), STDERR_TAIL_BYTES)
+        self.assertTrue(run.stderr.endswith("ValueError: last"))
+        self.assertEqual(run.output.output_bytes, 2 * (1 << 20) + len("Traceback end\nValueError: last"))
+
+
+class WorkerSlotTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.worker_memory_limit = resource.getrlimit(resource.RLIMIT_AS)
+
+    def run_script(self, program, limits=None, placement=None):
+        def run():
+            if placement is not None:
+                set_slot_placement(placement)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                (Path(tmp_dir) / "program.py").write_text(program)
+                return run_sandboxed(SCRIPT_LAUNCHER, ["program.py"], cwd=Path(tmp_dir), limits=limits or ResourceLimits(), timeout=10)
+
+        # Each slot is a thread of the worker, placing the executions it starts
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(run).result()
+
+    def test_child_applies_its_placement_and_limits(self):
+        cpu = max(os.sched_getaffinity(0))
+        run = self.run_script(
+            "import json, os, resource\n"
+            "print(json.dumps([sorted(os.sched_getaffinity(0)), os.nice(0),"
+            " resource.getrlimit(resource.RLIMIT_AS), resource.getrlimit(resource.RLIMIT_CPU)]))\n",
+            limits=ResourceLimits(memory_mb=256, cpu_seconds=2),
+            placement=SlotPlacement(cpus=frozenset([cpu]), niceness=3),
+        )
+        self.assertEqual(run.stderr, "")
+        cpus, niceness, memory_limit, cpu_limit = json.loads(run.output.stdout_head)
+        self.assertEqual(cpus, [cpu])
+        self.assertEqual(niceness, os.nice(0) + 3)
+        self.assertEqual(memory_limit, [256 * 1024 * 1024] * 2)
+        self.assertEqual(cpu_limit, [2, 3])
+
+    def test_limits_do_not_leak_into_the_worker(self):
+        before = os.nice(0)
+        self.run_script("pass", limits=ResourceLimits(memory_mb=256), placement=SlotPlacement(niceness=3))
+        self.assertEqual(os.nice(0), before)
+        self.assertEqual(resource.getrlimit(resource.RLIMIT_AS), self.worker_memory_limit)
+
+    def test_concurrent_runs_are_accounted_separately(self):
+        busy = "import time\nend = time.process_time() + 0.5\nwhile time.process_time() < end:\n    pass\n"
+        idle = "import time\ntime.sleep(0.5)\n"
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            busy_run, idle_run = executor.map(self.run_script, [busy, idle])
+        self.assertGreaterEqual(busy_run.cpu_time, 0.5)
+        self.assertLess(idle_run.cpu_time, 0.4)
+        self.assertGreaterEqual(idle_run.wall_time, 0.5)
+
+
+def notebook(*cells):
+    """An nbformat notebook with the given (cell_type, source, grade_id) cells."""
+    return {
+        "cells": [
+            {
+                "cell_type": cell_type,
+                "source": source,
+                "metadata": {"nbgrader": {"grade_id": grade_id}} if grade_id else {},
+            }
+            for cell_type, source, grade_id in cells
+        ],
+    }
+
+
+class NotebookTests(SimpleTestCase):
+    cells = NotebookCells(start_grade_id="start", end_grade_id="end")
+
+    def test_extracts_the_code_cells_between_the_grade_ids(self):
+        extracted = extract_program_cells(notebook(
+            ("code", "before = 1", None),
+            ("markdown", "Question", "start"),
+            ("code", ["def f(x):\n", "    return x\n"], None),
+            ("markdown", "Some notes", None),
+            ("code", "y = f(1)", None),
+            ("code", "assert y == 1", "end"),
+            ("code", "after = 1", None),
+        ), self.cells)
+        self.assertEqual(extracted, ["def f(x):\n    return x\n", "y = f(1)"])
+
+    def test_extracts_up_to_the_end_without_end_grade_id(self):
+        extracted = extract_program_cells(notebook(("markdown", "Question", "start"), ("code", "x = 1", None)), self.cells)
+        self.assertEqual(extracted, ["x = 1"])
+
+    def test_replaces_magics_keeping_lines(self):
+        extracted = extract_program_cells(notebook(
+            ("markdown", "Question", "start"),
+            ("code", "%time x = 1\nif x:\n    !ls\ny = x", None),
+            ("code", "z = 5 % 2", None),
+        ), self.cells)
+        self.assertEqual(extracted, ["pass  # %time x = 1\nif x:\n    pass  # !ls\ny = x", "z = 5 % 2"])
+
+    def test_invalid_notebooks(self):
+        with self.assertRaises(NotebookError):
+            extract_program_cells({"nbformat": 4}, self.cells)
+        with self.assertRaises(NotebookError):
+            extract_program_cells(notebook(("code", "x = 1", None)), self.cells)
+
+    def test_runs_the_cells_one_by_one(self):
+        assets = get_task_assets("count_vowels")
+        solution = assets.task.reference_solution_path.read_text()
+        result = run_notebook_on_test_cases(["import string", solution], assets)
+        self.assertTrue(result.correctness)
+        self.assertEqual(len(result.cell_times), 2)
+
+        result = run_notebook_on_test_cases(["def count_vowels(text):\n    return 0"], assets)
+        self.assertFalse(result.correctness)
+
+
+class NotebookSubmissionTests(TestCase):
+    def execute(self, problem_id, student_notebook):
+        with mock.patch("execution.views.publish_task") as publish_task, \
+                mock.patch.dict("os.environ", {"EXECUTE_PROGRAM_PRIORITY": "1"}):
+            response = self.client.post(
+                "/execution/execute_program/",
+                json.dumps({"problem_id": problem_id, "student_notebook": student_notebook}),
+                content_type="application/json",
+            )
+        return response, publish_task
+
+    def test_notebook_is_queued_as_its_cells(self):
+        cells = get_task_assets("count_vowels").task.notebook
+        response, publish_task = self.execute("count_vowels", notebook(
+            ("markdown", "Question", cells.start_grade_id),
+            ("code", "def count_vowels(text):\n    return 0", None),
+            ("code", "assert count_vowels('a') == 1", cells.end_grade_id),
+        ))
+        self.assertEqual(response.status_code, 200)
+        execution = ProgramExecution.objects.get(pk=response.json()["execution_id"])
+        self.assertEqual(execution.cells, ["def count_vowels(text):\n    return 0"])
+        self.assertEqual(publish_task.call_args.kwargs["data"]["cells"], execution.cells)
+
+    def test_invalid_notebook_submissions(self):
+        response, _ = self.execute("sum_two_numbers", notebook(("code", "x = 1", None)))
+        self.assertEqual(response.status_code, 400)
+        response, publish_task = self.execute("count_vowels", notebook(("code", "x = 1", None)))
+        self.assertEqual(response.status_code, 400)
+        publish_task.assert_not_called()
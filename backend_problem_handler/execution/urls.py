@@ -1,9 +1,10 @@
 from django.urls import path
-from .views import execute_program, get_execution_result
+from .views import cancel_execution, execute_program, get_execution_result
 
 app_name = "execution"
 
 urlpatterns = [
     path("execute_program/", execute_program, name="execute_program"),
     path("get_execution_result/", get_execution_result, name="get_execution_result"),
+    path("cancel_execution/", cancel_execution, name="cancel_execution"),
 ]
\ No newline at end of file
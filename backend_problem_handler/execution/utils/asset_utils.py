@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from backend_problem_handler.settings import PROGRAMMING_TASK_ASSET_CACHE_DIR
+from user_customizable_configs.programming_tasks.task_loader import TaskAssets
+
+
+logger = logging.getLogger(__name__)
+
+# A mirror not modified for this long is no longer used by any worker: each execution writes its
+# temporary program into the mirror it runs in, and workers switch to a new mirror when the files
+# change within TASK_REGISTRY_WATCH_INTERVAL_SECONDS
+STALE_RUN_DIR_SECONDS = 3600
+
+# Mirrors (<problem_id>-<digest>) and those left half-built by a crash (<mirror>.<uuid>.tmp)
+RUN_DIR_NAME = re.compile(r".+-[0-9a-f]{16}(\.[0-9a-f]{32}\.tmp)?")
+
+
+@dataclass
+class PreloadStats:
+    problem_id: str
+    files: int
+    size_bytes: int
+    # Time taken reading the files into the cache (None if another process did it)
+    load_seconds: Optional[float]
+    run_dir: str
+
+
+_lock = threading.Lock()
+_stats: Dict[str, PreloadStats] = {}
+
+
+def _run_dir_path(assets: TaskAssets) -> Path:
+    """Directory mirroring the task's execution dir with its preloaded files, named after their (path, size, mtime)."""
+    key = repr((str(assets.task.execution_dir_path), assets.preloaded_files))
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    return Path(PROGRAMMING_TASK_ASSET_CACHE_DIR) / f"{assets.task.problem_id}-{digest}"
+
+
+def _build_run_dir(assets: TaskAssets, path: Path) -> PreloadStats:
+    """
+    Mirror the execution dir into `path`: the preloaded files are copied (read-only), the rest are
+    symlinks to the originals. Built under a temporary name and renamed into place, so that
+    concurrent workers never use a partial mirror.
+    """
+    execution_dir = assets.task.execution_dir_path
+    preloaded = {relative_path for relative_path, _size, _mtime in assets.preloaded_files}
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.mkdir(parents=True)
+    size_bytes = 0
+    started = time.perf_counter()
+    try:
+        for root, dirs, files in os.walk(execution_dir):
+            relative_root = Path(root).relative_to(execution_dir)
+            for name in list(dirs):
+                source = Path(root) / name
+                if source.is_symlink():
+                    dirs.remove(name)
+                    os.symlink(source.resolve(), tmp_path / relative_root / name)
+                else:
+                    (tmp_path / relative_root / name).mkdir()
+            for name in files:
+                source, target = Path(root) / name, tmp_path / relative_root / name
+                if str(relative_root / name) in preloaded:
+                    shutil.copyfile(source, target)
+                    os.chmod(target, 0o444)
+                    size_bytes += target.stat().st_size
+                else:
+                    os.symlink(source.resolve(), target)
+        load_seconds = time.perf_counter() - started
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Built by another worker in the meantime
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            load_seconds = None
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    return PreloadStats(
+        problem_id=assets.task.problem_id,
+        files=len(preloaded),
+        size_bytes=size_bytes if load_seconds is not None else sum(size for _path, size, _mtime in assets.preloaded_files),
+        load_seconds=load_seconds,
+        run_dir=str(path),
+    )
+
+
+def run_dir(assets: TaskAssets) -> Path:
+    """
+    The directory the executions of a task run in: its execution dir, or for a task with preloaded
+    assets a mirror of it where these are copied once into ASSET_CACHE_DIR (tmpfs by default), so
+    that every run reads them from memory shared by all runs instead of from disk.
+    Falls back to the execution dir if the mirror cannot be built.
+    """
+    if not assets.preloaded_files:
+        return assets.task.execution_dir_path
+    path = _run_dir_path(assets)
+    with _lock:
+        if path.is_dir():
+            return path
+        try:
+            stats = _build_run_dir(assets, path)
+        except OSError as e:
+            logger.warning(f"Failed preloading the assets of {assets.task.problem_id}, running from disk: {e}")
+            return assets.task.execution_dir_path
+        _stats[assets.task.problem_id] = stats
+    logger.info(
+        f"Preloaded {stats.files} assets of {stats.problem_id} ({stats.size_bytes / 1024:.0f} KiB"
+        + (f" in {stats.load_seconds * 1000:.1f} ms" if stats.load_seconds is not None else "") + f") into {path}"
+    )
+    return path
+
+
+def remove_stale_run_dirs(tasks: Iterable[TaskAssets], max_age_seconds: float = STALE_RUN_DIR_SECONDS) -> List[str]:
+    """
+    Remove the mirrors in ASSET_CACHE_DIR, other than the current ones of `tasks`, that were not
+    modified for `max_age_seconds`: mirrors of older versions of the files, which other worker
+    processes of the host may still be using until their registry is rebuilt.
+    Returns the names of the removed mirrors.
+    """
+    cache_dir = Path(PROGRAMMING_TASK_ASSET_CACHE_DIR)
+    current = {_run_dir_path(assets).name for assets in tasks if assets.preloaded_files}
+    now = time.time()
+    removed = []
+    try:
+        entries = list(cache_dir.iterdir())
+    except FileNotFoundError:
+        return removed
+    for entry in entries:
+        if entry.name in current or not RUN_DIR_NAME.fullmatch(entry.name):
+            continue
+        try:
+            if entry.is_symlink() or not entry.is_dir() or now - entry.stat().st_mtime < max_age_seconds:
+                continue
+        except FileNotFoundError:
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        removed.append(entry.name)
+    if removed:
+        logger.info(f"Removed {len(removed)} stale asset mirrors from {cache_dir}: {', '.join(sorted(removed))}")
+    return removed
+
+
+def preload_stats() -> List[PreloadStats]:
+    """Statistics of the assets preloaded by this process, by task."""
+    with _lock:
+        return [_stats[problem_id] for problem_id in sorted(_stats)]
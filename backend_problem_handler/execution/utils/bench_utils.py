@@ -0,0 +1,156 @@
+import math
+import statistics
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from execution.utils.sandbox_utils import (
+    CPU_LIMIT_EXCEEDED,
+    OUTPUT_LIMIT_EXCEEDED,
+    TIME_LIMIT_EXCEEDED,
+)
+from user_customizable_configs.programming_tasks.task_loader import TaskAssets
+
+
+# Line of a task's template code where the student's code goes
+CODE_MARKER = "# YOUR CODE HERE"
+
+# Bodies put in place of the template's marker, by category of the benchmark corpus
+TEMPLATE_BODIES = {
+    "buggy": "return None",
+    "exception": "return 1 / 0",
+    "infinite_loop": "while True:\n    pass",
+    "heavy_output": "while True:\n    print('x' * 1023)",
+}
+CATEGORIES = ("correct",) + tuple(TEMPLATE_BODIES)
+
+# Verdicts expected of the programs of a category (correct ones are expected to pass)
+EXPECTED_OUTPUTS = {
+    "exception": {"ZeroDivisionError"},
+    "infinite_loop": {TIME_LIMIT_EXCEEDED, CPU_LIMIT_EXCEEDED},
+    "heavy_output": {OUTPUT_LIMIT_EXCEEDED, TIME_LIMIT_EXCEEDED, CPU_LIMIT_EXCEEDED},
+}
+
+
+@dataclass
+class BenchProgram:
+    problem_id: str
+    category: str
+    program: str
+
+
+@dataclass
+class BenchSample:
+    problem_id: str
+    category: str
+    # From submitting the program to getting its result, in seconds
+    latency: float
+    # Running the execution, in seconds (the testing program alone on the direct path)
+    run_seconds: Optional[float] = None
+    # From queuing the execution to a worker claiming it, in seconds (queued path)
+    queue_wait_seconds: Optional[float] = None
+    # "expected", "unexpected" (wrong verdict for the category), "failed" or "timeout"
+    outcome: str = "expected"
+
+
+def _fill_template(template: str, body: str) -> Optional[str]:
+    """The template code with `body` in place of its code marker (and placeholder raise), None without a marker."""
+    lines = template.split("\n")
+    for i, line in enumerate(lines):
+        if line.strip() == CODE_MARKER:
+            indent = line[:len(line) - len(line.lstrip())]
+            rest = lines[i + 1:]
+            if rest and rest[0].strip() == "raise NotImplementedError()":
+                rest = rest[1:]
+            return "\n".join(lines[:i] + [indent + body_line for body_line in body.split("\n")] + rest)
+    return None
+
+
+def build_corpus(tasks: Iterable[TaskAssets], categories: Iterable[str] = CATEGORIES) -> Tuple[List[BenchProgram], List[str]]:
+    """
+    Programs of each category for each task: its reference solution (correct), and its template
+    code completed with each of TEMPLATE_BODIES.
+    Returns the programs, and why programs were left out.
+    """
+    programs, skipped = [], []
+    for assets in tasks:
+        problem_id = assets.task.problem_id
+        if assets.harness_error:
+            skipped.append(f"{problem_id}: cannot be executed ({assets.harness_error})")
+            continue
+        for category in categories:
+            if category == "correct":
+                try:
+                    program = assets.task.reference_solution_path.read_text(encoding="utf-8")
+                except OSError:
+                    skipped.append(f"{problem_id}/correct: no reference solution at {assets.task.reference_solution_path}")
+                    continue
+            else:
+                program = _fill_template(assets.template_code or "", TEMPLATE_BODIES[category])
+                if program is None:
+                    skipped.append(f"{problem_id}/{category}: no '{CODE_MARKER}' line in the template code")
+                    continue
+            programs.append(BenchProgram(problem_id=problem_id, category=category, program=program))
+    return programs, skipped
+
+
+def outcome(category: str, correctness: Optional[bool], buggy_output: Optional[str]) -> str:
+    """Whether an execution result is the one expected of a program of the category."""
+    if category == "correct":
+        expected = correctness is True
+    elif category in EXPECTED_OUTPUTS:
+        expected = correctness is False and buggy_output in EXPECTED_OUTPUTS[category]
+    else:
+        expected = correctness is False
+    return "expected" if expected else "unexpected"
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    # Nearest rank
+    return sorted_values[max(math.ceil(q * len(sorted_values)) - 1, 0)]
+
+
+def distribution(values: Iterable[Optional[float]]) -> Optional[Dict[str, float]]:
+    """Mean, p50, p95, p99 and max of the values (None ones left out), None if there are none."""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 6),
+        "p50": round(_percentile(values, 0.50), 6),
+        "p95": round(_percentile(values, 0.95), 6),
+        "p99": round(_percentile(values, 0.99), 6),
+        "max": round(values[-1], 6),
+    }
+
+
+def summarize(samples: List[BenchSample], elapsed_seconds: float) -> dict:
+    """Throughput and latency figures of a benchmark run, overall, by category and by task."""
+    def group(key) -> Dict[str, dict]:
+        groups: Dict[str, List[BenchSample]] = {}
+        for sample in samples:
+            groups.setdefault(getattr(sample, key), []).append(sample)
+        return {
+            name: {
+                "executions": len(group_samples),
+                "latency_seconds": distribution(s.latency for s in group_samples),
+                "run_seconds": distribution(s.run_seconds for s in group_samples),
+                "not_expected": sum(s.outcome != "expected" for s in group_samples),
+            }
+            for name, group_samples in sorted(groups.items())
+        }
+
+    outcomes = {}
+    for sample in samples:
+        outcomes[sample.outcome] = outcomes.get(sample.outcome, 0) + 1
+    return {
+        "executions": len(samples),
+        "elapsed_seconds": round(elapsed_seconds, 3),
+        "throughput_per_second": round(len(samples) / elapsed_seconds, 3) if elapsed_seconds > 0 else None,
+        "latency_seconds": distribution(s.latency for s in samples),
+        "queue_wait_seconds": distribution(s.queue_wait_seconds for s in samples),
+        "run_seconds": distribution(s.run_seconds for s in samples),
+        "outcomes": dict(sorted(outcomes.items())),
+        "by_category": group("category"),
+        "by_task": group("problem_id"),
+    }
@@ -0,0 +1,58 @@
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from typing import List, Optional
+
+from django.db.models import Q
+from django.utils import timezone
+
+from execution.models import ProgramExecution
+from user_customizable_configs.programming_tasks.task_loader import get_task
+
+
+logger = logging.getLogger(__name__)
+
+# A pending execution not leased by a worker is presumed lost after this many times its task's time limit
+PENDING_TIMEOUT_FACTOR = 10
+
+# Modes whose result answers a request in a given mode: a benchmark run also tests the program
+COMPATIBLE_MODES = {
+    "test": ("test", "benchmark"),
+    "benchmark": ("benchmark",),
+}
+
+
+def program_hash(problem_id: str, program: str, cells: Optional[List[str]] = None) -> str:
+    # A notebook is not coalesced with the same program submitted as text: its result has cell times
+    key = f"{problem_id}\0{program}" if cells is None else f"{problem_id}\0{json.dumps(cells)}\0notebook"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def find_in_flight_execution(problem_id: str, hash_: str, mode: str) -> Optional[ProgramExecution]:
+    """
+    The oldest execution of the same program for the same problem that is still in flight (queued,
+    or running on a worker holding its lease) and whose result answers `mode`, None if there is none.
+    """
+    now = timezone.now()
+    max_pending_seconds = PENDING_TIMEOUT_FACTOR * get_task(problem_id).timeout
+    return (
+        ProgramExecution.objects.filter(
+            Q(lease_expires_at__gte=now) | Q(created_at__gte=now - timedelta(seconds=max_pending_seconds)),
+            program_hash=hash_,
+            problem_id=problem_id,
+            mode__in=COMPATIBLE_MODES[mode],
+            alias_of__isnull=True,
+            is_success__isnull=True,
+            is_cancelled=False,
+        )
+        .order_by("created_at")
+        .first()
+    )
+
+
+def resolve_alias(exec_rec: ProgramExecution) -> ProgramExecution:
+    """The execution whose result answers `exec_rec`: itself, or the one it was coalesced with."""
+    if exec_rec.alias_of_id is None or exec_rec.is_success is not None:
+        return exec_rec
+    return exec_rec.alias_of
@@ -1,69 +1,367 @@
-from pathlib import Path
+import json
 import logging
+import os
 import re
-import resource
-import subprocess
-from typing import List
+import signal
+import statistics
 import uuid
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+from backend_problem_handler.settings import EXECUTION_BENCHMARK_RUNS, EXECUTION_BENCHMARK_WARMUP_RUNS
+from execution.utils.asset_utils import run_dir
+from execution.utils.sandbox_utils import SandboxedRun, run_sandboxed
+from user_customizable_configs.programming_tasks.task_loader import TaskAssets
 
 
 logger = logging.getLogger(__name__)
 
+# Allocation sites reported by the memory profile of a benchmark
+MEMORY_PROFILE_TOP_SITES = 5
+
+
+# Runs a student's program within a precompiled harness, with the same semantics as the harness
+# and program in one file: the program is compiled first (a syntax error runs nothing), then the
+# template prologue, the program and the test cases run in the namespace of `__main__`.
+HARNESS_LAUNCHER = """
+def _main():
+    import marshal
+    import sys
+    program_path, harness_path = sys.argv[1], sys.argv[2]
+    with open(harness_path, "rb") as f:
+        prologue, tests = marshal.load(f)
+    with open(program_path, "rb") as f:
+        program = compile(f.read(), program_path, "exec", dont_inherit=True)
+    sys.argv = [program_path]
+    namespace = globals()
+    namespace["__file__"] = program_path
+    del namespace["_main"]
+    for code in (prologue, program, tests):
+        exec(code, namespace)
+_main()
+"""
+
+
+# Runs a testing program (the harness and program in one file) as `python <file>` would.
+SCRIPT_LAUNCHER = """
+def _main():
+    import sys
+    program_path = sys.argv[1]
+    with open(program_path, "rb") as f:
+        program = compile(f.read(), program_path, "exec", dont_inherit=True)
+    sys.argv = [program_path]
+    namespace = globals()
+    namespace["__file__"] = program_path
+    del namespace["_main"]
+    exec(program, namespace)
+_main()
+"""
+
+
+# Benchmarks a correct program: runs the harness like HARNESS_LAUNCHER, then reruns only the test
+# cases (the calls into the student's code) after warm-up, timing each run with the CPU clock of
+# the main thread (the process clock is tick-grained under RLIMIT_CPU), and once more under
+# tracemalloc for the peak memory they allocate and the lines of the program allocating the most.
+# Interpreter startup, compilation and the template prologue are left out of the figures, written
+# as JSON to a pipe.
+BENCHMARK_LAUNCHER = """
+def _main():
+    import gc
+    import json
+    import marshal
+    import os
+    import sys
+    import time
+    import tracemalloc
+    program_path, harness_path = sys.argv[1], sys.argv[2]
+    warmup_runs, runs, top_sites, result_fd = int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5]), int(sys.argv[6])
+    with open(harness_path, "rb") as f:
+        prologue, tests = marshal.load(f)
+    with open(program_path, "rb") as f:
+        program = compile(f.read(), program_path, "exec", dont_inherit=True)
+    sys.argv = [program_path]
+    namespace = globals()
+    namespace["__file__"] = program_path
+    del namespace["_main"]
+    exec(prologue, namespace)
+    exec(program, namespace)
+
+    def run_tests():
+        try:
+            exec(tests, namespace)
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                raise
+
+    for _ in range(warmup_runs):
+        run_tests()
+    # Fast test cases are repeated within each timed sample, so that samples are long enough to measure
+    started = time.perf_counter()
+    run_tests()
+    loops = max(1, min(1000, int(0.01 / max(time.perf_counter() - started, 1e-6))))
+    cpu_times = []
+    for _ in range(runs):
+        gc.collect()
+        started = time.thread_time()
+        for _ in range(loops):
+            run_tests()
+        cpu_times.append((time.thread_time() - started) / loops)
+    # Snapshot the memory when a function of the program returns with more memory allocated than
+    # before: its locals are still alive then, unlike at the end of the run
+    largest = {"size": 0, "snapshot": None}
+
+    def on_return(frame, event, arg):
+        if event == "return" and frame.f_code.co_filename == program_path:
+            size = tracemalloc.get_traced_memory()[0]
+            if size > largest["size"] * 1.1 + 65536:
+                largest["snapshot"] = None
+                largest["size"] = size
+                largest["snapshot"] = tracemalloc.take_snapshot()
+
+    tracemalloc.start()
+    sys.setprofile(on_return)
+    try:
+        run_tests()
+    finally:
+        sys.setprofile(None)
+    peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+    snapshot = largest["snapshot"] or tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocation_sites = [
+        {"line": stat.traceback[0].lineno, "size_bytes": stat.size, "count": stat.count}
+        for stat in snapshot.filter_traces([tracemalloc.Filter(True, program_path)]).statistics("lineno")[:top_sites]
+    ]
+    figures = {
+        "cpu_times": cpu_times,
+        "loops": loops,
+        "peak_traced_bytes": peak_traced_bytes,
+        "allocation_sites": allocation_sites,
+    }
+    os.write(result_fd, json.dumps(figures).encode())
+_main()
+"""
+
+
+@dataclass
+class ExecutionResult:
+    correctness: bool
+    buggy_output: str
+    # CPU time (user + system) of the testing program, in seconds
+    cpu_time: float
+    # Wall-clock time from spawning the testing program to its exit, in seconds
+    wall_time: float
+    # Peak resident set size of the testing program, in KiB (None if unknown)
+    peak_rss_kb: Optional[int]
+    # CPU time of each notebook cell run, in seconds (notebook submissions; cells after a failing one are missing)
+    cell_times: Optional[List[float]] = None
+
+
+@dataclass
+class BenchmarkStats:
+    runs: int
+    warmup_runs: int
+    # Runs of the test cases within each timed run, for fast ones
+    loops_per_run: int
+    # Median and median absolute deviation of the CPU time of the test cases, in seconds
+    cpu_time_median: float
+    cpu_time_mad: float
+    # Peak memory allocated by Python while running the test cases (tracemalloc), in KiB
+    peak_traced_kb: int
+    # Peak resident set size of the whole benchmark process, in KiB (None if unknown)
+    peak_rss_kb: Optional[int]
+    # Lines of the program holding the most memory when it peaked: {"line", "code", "size_kb", "count"}
+    top_allocations: List[dict] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _write_test_program(program: str, assets: TaskAssets, prefix: str):
+    """
+    Write the program into a temporary file in the task's run directory (see `run_dir`): alone if the task's
+    harness is precompiled, otherwise within the harness (see `TaskAssets.build_test_program`).
+    Returns the path and the compiled harness path (None if not precompiled).
+    """
+    compiled_harness_path = assets.compiled_harness_path()
+    test_program_path = run_dir(assets) / f"{prefix}_{uuid.uuid4().hex}.py"
+    logger.info(f"Writing temporary test program to {test_program_path}")
+    if compiled_harness_path is not None:
+        test_content = program.encode("utf-8")
+    else:
+        test_content = assets.build_test_program(program)
+    with open(test_program_path, "wb") as f:
+        f.write(test_content)
+    return test_program_path, compiled_harness_path
+
 
 def run_program_on_test_cases(
         program: str,
-        test_template: str,
-        test_cases: List[str],
-        execution_path: Path,
-        timeout: int
-    ):
+        assets: TaskAssets,
+    ) -> ExecutionResult:
     """
-    Run the student's program with the provided test cases.
-    1. Write the testing program using the test template, program, and test cases into a temporary file
-    2. Run the testing program and parse the output
+    Run the student's program with the test cases of a task.
+    1. Write the program into a temporary file (see `_write_test_program`)
+    2. Run the testing program under the task's resource limits (see `run_sandboxed`) and parse the output
     3. Remove the temporary test file
-    4. Return the results
+    4. Return the results, with the resource usage of this testing program alone
     """
-    # Write the testing program using the test template, program, and test cases
-    test_content = test_template.replace(
-        r"###{{{ INPUT_PROGRAM }}}###", program
-    ).replace(
-        r"###{{{ TEST_CASES }}}###", "\n\n".join(test_cases)
-    )
-
-    test_program_path = execution_path / f"test_{uuid.uuid4().hex}.py"
-    logger.info(f"Writing temporary test program to {test_program_path}")
-    with open(test_program_path, "w") as f:
-        f.write(test_content)
+    test_program_path, compiled_harness_path = _write_test_program(program, assets, prefix="test")
+    # The launchers run in the worker's interpreter, the one that compiled the harness (marshal is version specific)
+    if compiled_harness_path is not None:
+        launcher, args = HARNESS_LAUNCHER, [test_program_path.name, str(compiled_harness_path)]
+    else:
+        launcher, args = SCRIPT_LAUNCHER, [test_program_path.name]
 
     # Run the testing program
-    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
     try:
-        test = subprocess.run(
-            ["python", test_program_path.name],
-            cwd=execution_path,
-            capture_output=True,
-            timeout=timeout,
+        run = run_sandboxed(
+            launcher,
+            args,
+            cwd=test_program_path.parent,
+            limits=assets.task.resource_limits,
+            timeout=assets.task.timeout,
         )
-        test_stderr = test.stderr.decode().strip()
-        if test_stderr:
-            correctness = False
-            buggy_output = _sanitize_error_line(test_stderr)
-        else:
-            correctness = True
-            buggy_output = ""
-    except (TimeoutError, subprocess.TimeoutExpired):
-        correctness = False
-        buggy_output = "Time limit exceeded"
-    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
-    elapsed_time = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
-    logger.info(f"Test program finished in {elapsed_time:.2f} seconds, correctness: {correctness}, buggy output: {buggy_output}")
+    finally:
+        # Remove the temporary test file
+        test_program_path.unlink()
+
+    return result_from_test_run(run)
 
-    # Remove the temporary test file
-    test_program_path.unlink()
+
+def result_from_test_run(run: SandboxedRun, cell_times: Optional[List[float]] = None) -> ExecutionResult:
+    """The result of a run of the test cases: correct if it hit no limit, printed no error and was not killed."""
+    if run.limit_verdict is not None:
+        correctness = False
+        buggy_output = run.limit_verdict
+    elif run.stderr:
+        correctness = False
+        buggy_output = _sanitize_error_line(run.stderr)
+    elif run.returncode < 0:
+        correctness = False
+        buggy_output = f"Killed by {_signal_name(-run.returncode)}"
+    else:
+        correctness = True
+        buggy_output = ""
+    logger.info(
+        f"Test program finished in {run.cpu_time:.2f} CPU seconds ({run.wall_time:.2f} s wall, {run.peak_rss_kb} KiB peak RSS), "
+        f"correctness: {correctness}, buggy output: {buggy_output}"
+    )
 
     # Return
-    return correctness, buggy_output, elapsed_time
+    return ExecutionResult(
+        correctness=correctness,
+        buggy_output=buggy_output,
+        cpu_time=run.cpu_time,
+        wall_time=run.wall_time,
+        peak_rss_kb=run.peak_rss_kb,
+        cell_times=cell_times,
+    )
+
+
+def benchmark_program(
+        program: str,
+        assets: TaskAssets,
+        runs: int = EXECUTION_BENCHMARK_RUNS,
+        warmup_runs: int = EXECUTION_BENCHMARK_WARMUP_RUNS,
+    ) -> Optional[BenchmarkStats]:
+    """
+    Benchmark a program already known to pass the test cases of a task (see BENCHMARK_LAUNCHER).
+    The time and CPU limits of the task are scaled to the number of test case runs.
+    Returns None if the task's harness is not precompiled (the test cases cannot be rerun on their
+    own) or if the benchmark did not complete.
+    """
+    test_program_path, compiled_harness_path = _write_test_program(program, assets, prefix="bench")
+    if compiled_harness_path is None:
+        test_program_path.unlink()
+        logger.warning(f"Cannot benchmark {assets.task.problem_id}: its test harness is not precompiled")
+        return None
+
+    budget_runs = _benchmark_budget_runs(warmup_runs, runs)
+    limits = assets.task.resource_limits
+    if limits.cpu_seconds is not None:
+        limits = limits.model_copy(update={"cpu_seconds": limits.cpu_seconds * budget_runs})
+    result_read_fd, result_write_fd = os.pipe()
+    try:
+        bench_args = [
+            test_program_path.name, str(compiled_harness_path),
+            str(warmup_runs), str(runs), str(MEMORY_PROFILE_TOP_SITES), str(result_write_fd),
+        ]
+        try:
+            run = run_sandboxed(
+                BENCHMARK_LAUNCHER,
+                bench_args,
+                cwd=test_program_path.parent,
+                limits=limits,
+                timeout=assets.task.timeout * budget_runs,
+                pass_fds=(result_write_fd,),
+            )
+        finally:
+            os.close(result_write_fd)
+            test_program_path.unlink()
+        chunks = []
+        while chunk := os.read(result_read_fd, 65536):
+            chunks.append(chunk)
+    finally:
+        os.close(result_read_fd)
+
+    if run.limit_verdict is not None or run.returncode != 0:
+        logger.warning(
+            f"Benchmark of a program for {assets.task.problem_id} did not complete: "
+            f"{run.limit_verdict or _sanitize_error_line(run.stderr) or f'exit code {run.returncode}'}"
+        )
+        return None
+    try:
+        figures = json.loads(b"".join(chunks))
+        cpu_times = [float(t) for t in figures["cpu_times"]]
+        loops = int(figures["loops"])
+        peak_traced_bytes = int(figures["peak_traced_bytes"])
+        program_lines = program.splitlines()
+        top_allocations = [
+            {
+                "line": int(site["line"]),
+                "code": program_lines[int(site["line"]) - 1].strip() if 0 < int(site["line"]) <= len(program_lines) else "",
+                "size_kb": round(int(site["size_bytes"]) / 1024, 1),
+                "count": int(site["count"]),
+            }
+            for site in figures.get("allocation_sites", [])
+        ]
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Benchmark of a program for {assets.task.problem_id} returned no figures: {e}")
+        return None
+
+    median = statistics.median(cpu_times)
+    stats = BenchmarkStats(
+        runs=runs,
+        warmup_runs=warmup_runs,
+        loops_per_run=loops,
+        cpu_time_median=median,
+        cpu_time_mad=statistics.median(abs(t - median) for t in cpu_times),
+        peak_traced_kb=peak_traced_bytes // 1024,
+        peak_rss_kb=run.peak_rss_kb,
+        top_allocations=top_allocations,
+    )
+    logger.info(f"Benchmarked a program for {assets.task.problem_id}: {stats}")
+    return stats
+
+
+def _benchmark_budget_runs(warmup_runs: int, runs: int) -> int:
+    # Startup, the calibration run, the traced run (tracemalloc slows it down) and margin count as a few more runs
+    return warmup_runs + runs + 4
+
+
+def execution_time_budget(assets: TaskAssets, mode: str) -> float:
+    """Wall-clock time an execution of the task can take, in seconds (the test run, and the benchmark in benchmark mode)."""
+    budget = assets.task.timeout
+    if mode == "benchmark":
+        budget += assets.task.timeout * _benchmark_budget_runs(EXECUTION_BENCHMARK_WARMUP_RUNS, EXECUTION_BENCHMARK_RUNS)
+    return budget
+
+
+def _signal_name(signum: int) -> str:
+    try:
+        return signal.Signals(signum).name
+    except ValueError:
+        return f"signal {signum}"
 
 
 def _sanitize_error_line(error_msg: str) -> str:
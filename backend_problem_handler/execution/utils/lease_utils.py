@@ -0,0 +1,164 @@
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Dict, Tuple
+
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from backend_problem_handler.settings import EXECUTION_HEARTBEAT_INTERVAL_SECONDS, EXECUTION_LEASE_SECONDS
+from execution.models import ProgramExecution
+from execution.utils.queue_utils import publish_task
+
+
+logger = logging.getLogger(__name__)
+
+# Holder of the leases taken by this process
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+WORKER_LOST_ERROR = "Execution worker stopped responding"
+
+
+def claim_lease(execution_id: int) -> bool:
+    """
+    Take the lease of a pending execution for this worker.
+    Returns False if the execution is finished, cancelled, or leased by a live worker (e.g. for
+    a message redelivered after a re-dispatch), in which case it must not be run.
+    """
+    now = timezone.now()
+    claimed = ProgramExecution.objects.filter(
+        Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now),
+        pk=execution_id,
+        is_success__isnull=True,
+        is_cancelled=False,
+    ).update(
+        worker_id=WORKER_ID,
+        claimed_at=now,
+        heartbeat_at=now,
+        lease_expires_at=now + timedelta(seconds=EXECUTION_LEASE_SECONDS),
+        attempts=F("attempts") + 1,
+    )
+    return claimed == 1
+
+
+def release_lease(execution_id: int):
+    """Give up the lease of an execution (finished, or failed and left to the retry of its task)."""
+    ProgramExecution.objects.filter(pk=execution_id, worker_id=WORKER_ID).update(lease_expires_at=None)
+
+
+class _LeaseKeeper:
+    """
+    Renews the leases of the executions running in this process from a background thread, every
+    EXECUTION_HEARTBEAT_INTERVAL_SECONDS, as long as they are running and within their time budget
+    (so a stuck execution loses its lease).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Execution id -> monotonic time after which its lease is no longer renewed
+        self._renew_until: Dict[int, float] = {}
+        self._thread = None
+
+    def add(self, execution_id: int, max_seconds: float):
+        with self._lock:
+            self._renew_until[execution_id] = time.monotonic() + max_seconds
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+                self._thread.start()
+
+    def remove(self, execution_id: int):
+        with self._lock:
+            self._renew_until.pop(execution_id, None)
+
+    def _run(self):
+        while True:
+            time.sleep(EXECUTION_HEARTBEAT_INTERVAL_SECONDS)
+            now = time.monotonic()
+            with self._lock:
+                execution_ids = [execution_id for execution_id, until in self._renew_until.items() if until > now]
+            if not execution_ids:
+                continue
+            try:
+                heartbeat_at = timezone.now()
+                ProgramExecution.objects.filter(pk__in=execution_ids, worker_id=WORKER_ID).update(
+                    heartbeat_at=heartbeat_at,
+                    lease_expires_at=heartbeat_at + timedelta(seconds=EXECUTION_LEASE_SECONDS),
+                )
+            except Exception:
+                logger.exception(f"Failed renewing the leases of executions {execution_ids}")
+            finally:
+                close_old_connections()
+
+
+_lease_keeper = _LeaseKeeper()
+
+
+@contextmanager
+def leased(execution_id: int, max_seconds: float):
+    """
+    Keep the lease of an execution claimed with `claim_lease` alive while running it (for at most
+    `max_seconds`), and release it afterwards.
+    """
+    _lease_keeper.add(execution_id, max_seconds)
+    try:
+        yield
+    finally:
+        _lease_keeper.remove(execution_id)
+        release_lease(execution_id)
+
+
+def reap_expired_leases(max_tries: int, retry_priority: int) -> Tuple[int, int]:
+    """
+    Handle the executions whose lease expired (their worker died or got stuck): re-dispatch those
+    with tries left, fail the others. Each one is taken over with a conditional update, so that
+    concurrent reapers handle it once.
+    Returns the numbers of re-dispatched and failed executions.
+    """
+    redispatched, failed = 0, 0
+    expired = ProgramExecution.objects.filter(
+        is_success__isnull=True,
+        is_cancelled=False,
+        lease_expires_at__lt=timezone.now(),
+    )
+    for exec_rec in expired:
+        unchanged = ProgramExecution.objects.filter(pk=exec_rec.pk, lease_expires_at=exec_rec.lease_expires_at)
+        if exec_rec.attempts < max_tries and exec_rec.program is not None:
+            if not unchanged.update(lease_expires_at=None, worker_id=None):
+                continue
+            try:
+                publish_task(
+                    type="execute_program",
+                    tries=exec_rec.attempts + 1,
+                    data={
+                        "problem_id": exec_rec.problem_id,
+                        "student_program": exec_rec.program,
+                        "cells": exec_rec.cells,
+                        "execution_id": exec_rec.pk,
+                        "mode": exec_rec.mode,
+                    },
+                    priority=retry_priority,
+                )
+            except Exception as e:
+                ProgramExecution.objects.filter(pk=exec_rec.pk, is_success__isnull=True).update(
+                    is_success=False, error=f"{WORKER_LOST_ERROR}; failed to re-dispatch: {e}", updated_at=timezone.now(),
+                )
+                failed += 1
+                continue
+            logger.warning(f"Re-dispatched execution {exec_rec.pk}: lease of worker {exec_rec.worker_id} expired")
+            redispatched += 1
+        else:
+            if not unchanged.update(
+                is_success=False,
+                error=f"{WORKER_LOST_ERROR} ({exec_rec.attempts} attempts)",
+                lease_expires_at=None,
+                updated_at=timezone.now(),
+            ):
+                continue
+            logger.warning(f"Failed execution {exec_rec.pk}: lease of worker {exec_rec.worker_id} expired")
+            failed += 1
+    return redispatched, failed
@@ -0,0 +1,218 @@
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from backend_problem_handler.settings import EXECUTION_WARM_NOTEBOOK_INTERPRETERS
+from execution.utils.asset_utils import run_dir
+from execution.utils.execution_utils import ExecutionResult, result_from_test_run, run_program_on_test_cases
+from execution.utils.sandbox_utils import (
+    SandboxedProcess,
+    discard_sandboxed,
+    finish_sandboxed,
+    spawn_sandboxed,
+    wait_for_exit,
+)
+from user_customizable_configs.programming_tasks.task_loader import NotebookCells, TaskAssets
+
+
+logger = logging.getLogger(__name__)
+
+# IPython line and cell magics (%time, %%timeit) and shell escapes (!pip install ...)
+MAGIC_LINE = re.compile(r"^(\s*)(?=[%!])")
+
+
+# Runs the cells of a notebook within a precompiled harness, like HARNESS_LAUNCHER runs a program:
+# the cells are compiled first (a syntax error runs nothing), then the template prologue, the cells
+# one by one and the test cases run in the namespace of `__main__`. The interpreter is started
+# ahead of time: it loads the harness, then waits for the cells as one JSON line on stdin.
+# The CPU time of each cell run is written as JSON to a pipe.
+NOTEBOOK_LAUNCHER = """
+def _main():
+    import json
+    import marshal
+    import os
+    import sys
+    import time
+    harness_path, result_fd = sys.argv[1], int(sys.argv[2])
+    with open(harness_path, "rb") as f:
+        prologue, tests = marshal.load(f)
+    job = sys.stdin.buffer.readline()
+    if not job:
+        return  # Discarded, or the worker is gone
+    null_fd = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(null_fd, 0)
+    os.close(null_fd)
+    cells = [compile(source, f"<cell {i}>", "exec", dont_inherit=True) for i, source in enumerate(json.loads(job), 1)]
+    sys.argv = ["<notebook>"]
+    namespace = globals()
+    del namespace["_main"]
+    cell_times = []
+    try:
+        exec(prologue, namespace)
+        for cell in cells:
+            started = time.thread_time()
+            exec(cell, namespace)
+            cell_times.append(time.thread_time() - started)
+        exec(tests, namespace)
+    finally:
+        os.write(result_fd, json.dumps(cell_times).encode())
+_main()
+"""
+
+
+class NotebookError(ValueError):
+    """Raised when the program of a task cannot be found in a notebook."""
+
+
+def _grade_id(cell: dict) -> Optional[str]:
+    return ((cell.get("metadata") or {}).get("nbgrader") or {}).get("grade_id")
+
+
+def _cell_source(cell: dict) -> str:
+    source = cell.get("source") or ""
+    return "".join(source) if isinstance(source, list) else str(source)
+
+
+def _without_magics(source: str) -> str:
+    """
+    The source of a cell with its IPython magics and shell escapes replaced by `pass`, if it does
+    not compile as Python otherwise (keeping line numbers and blocks).
+    """
+    try:
+        compile(source, "<cell>", "exec", dont_inherit=True)
+        return source
+    except SyntaxError:
+        pass
+    return "\n".join(MAGIC_LINE.sub(r"\1pass  # ", line, count=1) for line in source.split("\n"))
+
+
+def extract_program_cells(notebook, cells: NotebookCells) -> List[str]:
+    """
+    The sources of the code cells of a task's program in a notebook (nbformat JSON): those after the
+    cell marked `start_grade_id`, up to the cell marked `end_grade_id` (or the end of the notebook),
+    as the JupyterLab extension extracts them.
+    """
+    if not isinstance(notebook, dict) or not isinstance(notebook.get("cells"), list):
+        raise NotebookError("Invalid notebook: missing cells")
+    notebook_cells = [cell for cell in notebook["cells"] if isinstance(cell, dict)]
+    start = next((i for i, cell in enumerate(notebook_cells) if _grade_id(cell) == cells.start_grade_id), None)
+    if start is None:
+        raise NotebookError(f"No cell with grade id {cells.start_grade_id} in the notebook")
+
+    program_cells = []
+    for cell in notebook_cells[start + 1:]:
+        if _grade_id(cell) == cells.end_grade_id:
+            break
+        if cell.get("cell_type") == "code":
+            program_cells.append(_without_magics(_cell_source(cell)))
+    return program_cells
+
+
+@dataclass
+class _NotebookInterpreter:
+    # (harness path, run dir and its inode, resource limits) it was started for
+    key: tuple
+    sandboxed: SandboxedProcess
+    result_read_fd: int
+
+
+# Interpreter started ahead of time by each worker slot (thread), so it runs with the slot's placement
+_warm = threading.local()
+
+
+def _interpreter_key(assets: TaskAssets, harness_path: Path) -> tuple:
+    # A run dir removed as stale and built again is a new directory: the interpreter's cwd is gone
+    path = run_dir(assets)
+    return str(harness_path), str(path), path.stat().st_ino, assets.task.resource_limits.model_dump_json()
+
+
+def _start_interpreter(assets: TaskAssets, harness_path: Path) -> _NotebookInterpreter:
+    result_read_fd, result_write_fd = os.pipe()
+    try:
+        sandboxed = spawn_sandboxed(
+            NOTEBOOK_LAUNCHER,
+            [str(harness_path), str(result_write_fd)],
+            cwd=run_dir(assets),
+            limits=assets.task.resource_limits,
+            pass_fds=(result_write_fd,),
+            stdin=subprocess.PIPE,
+        )
+    except BaseException:
+        os.close(result_read_fd)
+        raise
+    finally:
+        os.close(result_write_fd)
+    return _NotebookInterpreter(_interpreter_key(assets, harness_path), sandboxed, result_read_fd)
+
+
+def _discard_interpreter(interpreter: _NotebookInterpreter):
+    try:
+        discard_sandboxed(interpreter.sandboxed)
+    finally:
+        os.close(interpreter.result_read_fd)
+
+
+def _take_interpreter(assets: TaskAssets, harness_path: Path) -> _NotebookInterpreter:
+    """The interpreter started ahead of time by this slot if it suits the task and is alive, a new one otherwise."""
+    interpreter = getattr(_warm, "interpreter", None)
+    _warm.interpreter = None
+    if interpreter is not None:
+        if interpreter.key == _interpreter_key(assets, harness_path) and not wait_for_exit(interpreter.sandboxed.process, timeout=0):
+            return interpreter
+        _discard_interpreter(interpreter)
+    return _start_interpreter(assets, harness_path)
+
+
+def _start_next_interpreter(assets: TaskAssets, harness_path: Path):
+    try:
+        _warm.interpreter = _start_interpreter(assets, harness_path)
+    except Exception as e:
+        logger.warning(f"Failed starting an interpreter ahead of time for {assets.task.problem_id}: {e}")
+
+
+def run_notebook_on_test_cases(
+        cells: List[str],
+        assets: TaskAssets,
+    ) -> ExecutionResult:
+    """
+    Run the cells of a student's notebook with the test cases of a task (see NOTEBOOK_LAUNCHER), in
+    an interpreter started ahead of time by this worker slot, and start the next one afterwards.
+    The cells run as one program if the task's harness is not precompiled.
+    """
+    harness_path = assets.compiled_harness_path()
+    if harness_path is None:
+        return run_program_on_test_cases(program="\n".join(cells), assets=assets)
+
+    if EXECUTION_WARM_NOTEBOOK_INTERPRETERS:
+        interpreter = _take_interpreter(assets, harness_path)
+    else:
+        interpreter = _start_interpreter(assets, harness_path)
+    try:
+        run = finish_sandboxed(
+            interpreter.sandboxed,
+            timeout=assets.task.timeout,
+            input_data=json.dumps(cells).encode("utf-8") + b"\n",
+        )
+        chunks = []
+        while chunk := os.read(interpreter.result_read_fd, 65536):
+            chunks.append(chunk)
+    finally:
+        os.close(interpreter.result_read_fd)
+
+    # Started once the run is over, so that its startup does not compete with the run for the CPU
+    if EXECUTION_WARM_NOTEBOOK_INTERPRETERS:
+        _start_next_interpreter(assets, harness_path)
+
+    cell_times = None
+    try:
+        if chunks:
+            cell_times = [float(t) for t in json.loads(b"".join(chunks))]
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Notebook run for {assets.task.problem_id} returned invalid cell times: {e}")
+    return result_from_test_run(run, cell_times=cell_times)
@@ -0,0 +1,474 @@
+import json
+import logging
+import os
+import resource
+import selectors
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import FrozenSet, Optional, Sequence
+
+from backend_problem_handler.settings import EXECUTION_CGROUP_ROOT
+from user_customizable_configs.programming_tasks.task_loader import ResourceLimits
+
+
+logger = logging.getLogger(__name__)
+
+TIME_LIMIT_EXCEEDED = "Time limit exceeded"
+MEMORY_LIMIT_EXCEEDED = "Memory limit exceeded"
+CPU_LIMIT_EXCEEDED = "CPU time limit exceeded"
+PROCESS_LIMIT_EXCEEDED = "Process limit exceeded"
+OUTPUT_LIMIT_EXCEEDED = "Output limit exceeded"
+
+# Output kept from an execution, whatever it prints: the start of stdout and the end of stderr (the traceback)
+STDOUT_HEAD_BYTES = 64 * 1024
+STDERR_TAIL_BYTES = 64 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+EXIT_POLL_INTERVAL_SECONDS = 0.005
+
+
+class ExecutionCgroup:
+    """
+    A cgroup v2 holding one execution, under the delegated cgroup `EXECUTION_CGROUP_ROOT`
+    (which must be writable by the worker and hold no processes itself).
+    Enforces memory.max and pids.max for the whole process tree, and tells if the kernel killed it.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    @classmethod
+    def create(cls, limits: ResourceLimits) -> Optional["ExecutionCgroup"]:
+        """A cgroup for the limits, or None if cgroups are not configured, not usable or not needed."""
+        if not EXECUTION_CGROUP_ROOT or (limits.memory_mb is None and limits.max_processes is None):
+            return None
+        root = Path(EXECUTION_CGROUP_ROOT)
+        try:
+            # Let child cgroups use the memory and pids controllers (no-op if already enabled)
+            (root / "cgroup.subtree_control").write_text("+memory +pids")
+            path = root / f"execution_{uuid.uuid4().hex}"
+            path.mkdir()
+            if limits.memory_mb is not None:
+                (path / "memory.max").write_text(str(limits.memory_mb * 1024 * 1024))
+                (path / "memory.swap.max").write_text("0")
+            if limits.max_processes is not None:
+                (path / "pids.max").write_text(str(limits.max_processes))
+        except OSError as e:
+            logger.warning(f"Cgroup limits unavailable under {root}, using rlimits only: {e}")
+            return None
+        return cls(path)
+
+    def add_process(self, pid: int):
+        (self.path / "cgroup.procs").write_text(str(pid))
+
+    def _event_count(self, file_name: str, event: str) -> int:
+        try:
+            for line in (self.path / file_name).read_text().splitlines():
+                name, _, count = line.partition(" ")
+                if name == event:
+                    return int(count)
+        except (OSError, ValueError):
+            pass
+        return 0
+
+    def oom_killed(self) -> bool:
+        return self._event_count("memory.events", "oom_kill") > 0
+
+    def hit_pids_limit(self) -> bool:
+        return self._event_count("pids.events", "max") > 0
+
+    def remove(self):
+        try:
+            # Kill what is left of the process tree (cgroup.kill needs Linux 5.14)
+            (self.path / "cgroup.kill").write_text("1")
+        except OSError:
+            pass
+        try:
+            self.path.rmdir()
+        except OSError as e:
+            logger.warning(f"Failed removing cgroup {self.path}: {e}")
+
+
+@dataclass
+class CapturedOutput:
+    stdout_head: bytes
+    stderr_tail: bytes
+    output_bytes: int
+    output_limit_exceeded: bool = False
+    timed_out: bool = False
+
+
+def capture_output(process: subprocess.Popen, timeout: float, max_output_bytes: Optional[int]) -> CapturedOutput:
+    """
+    Read the stdout and stderr pipes of a process as it writes them, until both are closed and the
+    process has exited, keeping only the first STDOUT_HEAD_BYTES of stdout and the last
+    STDERR_TAIL_BYTES of stderr.
+    Stops early, leaving the process running for the caller to kill, once the combined output
+    exceeds `max_output_bytes` or `timeout` seconds have passed.
+    """
+    deadline = time.monotonic() + timeout
+    stdout_head = bytearray()
+    stderr_tail = bytearray()
+    output_bytes = 0
+    with selectors.DefaultSelector() as selector:
+        selector.register(process.stdout, selectors.EVENT_READ, stdout_head)
+        selector.register(process.stderr, selectors.EVENT_READ, stderr_tail)
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return CapturedOutput(bytes(stdout_head), bytes(stderr_tail), output_bytes, timed_out=True)
+            for key, _events in selector.select(remaining):
+                chunk = os.read(key.fd, READ_CHUNK_BYTES)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    continue
+                output_bytes += len(chunk)
+                if key.data is stdout_head:
+                    stdout_head += chunk[:STDOUT_HEAD_BYTES - len(stdout_head)]
+                else:
+                    stderr_tail += chunk
+                    del stderr_tail[:-STDERR_TAIL_BYTES]
+                if max_output_bytes is not None and output_bytes > max_output_bytes:
+                    return CapturedOutput(bytes(stdout_head), bytes(stderr_tail), output_bytes, output_limit_exceeded=True)
+
+    # The pipes can close before the process exits
+    if not wait_for_exit(process, timeout=deadline - time.monotonic()):
+        return CapturedOutput(bytes(stdout_head), bytes(stderr_tail), output_bytes, timed_out=True)
+    return CapturedOutput(bytes(stdout_head), bytes(stderr_tail), output_bytes)
+
+
+def wait_for_exit(process: subprocess.Popen, timeout: float) -> bool:
+    """
+    Wait up to `timeout` seconds for the process to exit, without reaping it: its pid (and so its
+    process group) stays reserved until `reap`. Returns whether it exited.
+    """
+    try:
+        pidfd = os.pidfd_open(process.pid)
+    except (AttributeError, OSError):
+        pidfd = None
+    if pidfd is not None:
+        try:
+            with selectors.DefaultSelector() as selector:
+                selector.register(pidfd, selectors.EVENT_READ)
+                return bool(selector.select(max(timeout, 0)))
+        finally:
+            os.close(pidfd)
+
+    # No pidfd (Linux < 5.3): poll
+    deadline = time.monotonic() + timeout
+    while os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(EXIT_POLL_INTERVAL_SECONDS)
+    return True
+
+
+def reap(process: subprocess.Popen) -> Optional[resource.struct_rusage]:
+    """
+    Wait for the process to exit and reap it with wait4, returning the resources used by it and
+    its reaped descendants alone (unlike RUSAGE_CHILDREN, which sums every child of the worker).
+    Returns None if the process was already reaped.
+    """
+    if process.returncode is not None:
+        return None
+    _pid, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return rusage
+
+
+@dataclass(frozen=True)
+class SlotPlacement:
+    """Where the executions of a worker slot run: the CPUs they are pinned to and their niceness increment."""
+    cpus: Optional[FrozenSet[int]] = None
+    niceness: int = 0
+
+
+_slot = threading.local()
+
+
+def set_slot_placement(placement: SlotPlacement):
+    """Place the executions started from the current thread (called once by each worker slot thread)."""
+    _slot.placement = placement
+
+
+def get_slot_placement() -> SlotPlacement:
+    return getattr(_slot, "placement", None) or SlotPlacement()
+
+
+# Prepended to the source of the `-c` launchers run by `spawn_sandboxed`: the child applies the
+# placement of its worker slot and its rlimits to itself, after waiting for the worker to move it
+# into its cgroup (if any), before running anything else. Its settings are the first argument.
+# At exit, it writes its peak RSS since exec (VmHWM) to a pipe: the ru_maxrss of wait4 also counts
+# the worker's own RSS from before exec.
+SANDBOX_PRELUDE = """
+def _sandbox():
+    import atexit
+    import json
+    import os
+    import resource
+    import sys
+    config = json.loads(sys.argv.pop(1))
+    if config["ready_fd"] is not None:
+        os.read(config["ready_fd"], 1)
+        os.close(config["ready_fd"])
+    if config["cpus"]:
+        os.sched_setaffinity(0, config["cpus"])
+    if config["niceness"]:
+        os.nice(config["niceness"])
+    for name, soft, hard in config["rlimits"]:
+        resource.setrlimit(getattr(resource, name), (soft, hard))
+    rss_fd, pid = config["rss_fd"], os.getpid()
+    os.set_inheritable(rss_fd, False)
+
+    def report_peak_rss():
+        if os.getpid() != pid:
+            return  # A forked child of the program
+        try:
+            with open("/proc/self/status", "rb") as f:
+                for line in f:
+                    if line.startswith(b"VmHWM:"):
+                        os.write(rss_fd, line.split()[1])
+        except Exception:
+            pass
+
+    atexit.register(report_peak_rss)
+_sandbox()
+del _sandbox
+"""
+
+
+def sandbox_config(limits: ResourceLimits, ready_fd: Optional[int], rss_fd: int) -> dict:
+    """The settings SANDBOX_PRELUDE applies: the placement of the current worker slot and the rlimits."""
+    placement = get_slot_placement()
+    rlimits = []
+    if limits.memory_mb is not None:
+        memory_bytes = limits.memory_mb * 1024 * 1024
+        rlimits.append(("RLIMIT_AS", memory_bytes, memory_bytes))
+    if limits.cpu_seconds is not None:
+        # SIGXCPU at the soft limit, SIGKILL one second later if it is ignored
+        rlimits.append(("RLIMIT_CPU", limits.cpu_seconds, limits.cpu_seconds + 1))
+    if limits.max_processes is not None:
+        rlimits.append(("RLIMIT_NPROC", limits.max_processes, limits.max_processes))
+    return {
+        "ready_fd": ready_fd,
+        "rss_fd": rss_fd,
+        "cpus": sorted(placement.cpus) if placement.cpus else None,
+        "niceness": placement.niceness,
+        "rlimits": rlimits,
+    }
+
+
+def limit_verdict(
+    limits: ResourceLimits,
+    returncode: int,
+    stderr: str,
+    output: CapturedOutput,
+    cgroup: Optional[ExecutionCgroup],
+    usage: Optional[resource.struct_rusage],
+) -> Optional[str]:
+    """
+    The verdict of an execution that hit one of its resource limits, None otherwise.
+    A SIGKILL only counts as the CPU limit if the process used up its CPU time (the hard RLIMIT_CPU
+    kill): it can come from elsewhere, e.g. the kernel's OOM killer without cgroups.
+    """
+    last_line = stderr.strip().split("\n")[-1]
+    # Checked first: the process group was killed for it, which looks like a CPU limit kill
+    if output.output_limit_exceeded:
+        return OUTPUT_LIMIT_EXCEEDED
+    if cgroup is not None and cgroup.oom_killed():
+        return MEMORY_LIMIT_EXCEEDED
+    if limits.cpu_seconds is not None and (
+        returncode == -signal.SIGXCPU
+        or (returncode == -signal.SIGKILL and usage is not None and usage.ru_utime + usage.ru_stime >= limits.cpu_seconds)
+    ):
+        return CPU_LIMIT_EXCEEDED
+    if limits.max_processes is not None and (
+        (cgroup is not None and cgroup.hit_pids_limit()) or last_line.startswith("BlockingIOError")
+    ):
+        return PROCESS_LIMIT_EXCEEDED
+    if limits.memory_mb is not None and last_line.startswith("MemoryError"):
+        return MEMORY_LIMIT_EXCEEDED
+    return None
+
+
+@dataclass
+class SandboxedRun:
+    output: CapturedOutput
+    stderr: str
+    returncode: int
+    # Time or resource limit the run hit, None if it ran to completion within its limits
+    limit_verdict: Optional[str]
+    # CPU time (user + system) of the process, in seconds
+    cpu_time: float
+    # Wall-clock time from spawning the process to its exit, in seconds
+    wall_time: float
+    # Peak resident set size of the process since exec, in KiB (None if unknown, e.g. it was killed)
+    peak_rss_kb: Optional[int]
+
+
+@dataclass
+class SandboxedProcess:
+    """A process started by `spawn_sandboxed`, to be run to completion with `finish_sandboxed`."""
+    process: subprocess.Popen
+    limits: ResourceLimits
+    cgroup: Optional[ExecutionCgroup]
+    # Read end of the pipe the process writes its peak RSS to (see SANDBOX_PRELUDE)
+    rss_read_fd: int
+
+
+def spawn_sandboxed(
+    launcher: str,
+    args: Sequence[str],
+    cwd: Path,
+    limits: ResourceLimits,
+    pass_fds: Sequence[int] = (),
+    stdin: Optional[int] = None,
+) -> SandboxedProcess:
+    """
+    Start a Python launcher (the source of a `-c` program, run with the worker's interpreter) under
+    resource limits, in its own session so that its whole process tree can be killed, with its
+    stdout and stderr piped (and its stdin too with `stdin=subprocess.PIPE`).
+    The limits are applied by the child itself (see SANDBOX_PRELUDE): nothing runs between fork and
+    exec, which is not safe in the multi-threaded worker, and the child is spawned without a full
+    fork of the worker. It joins its cgroup before running anything, as the worker moves it there
+    while it waits.
+    """
+    cgroup = ExecutionCgroup.create(limits)
+    ready_read_fd = ready_write_fd = None
+    rss_read_fd, rss_write_fd = os.pipe()
+    try:
+        # Read once the process is reaped: never blocks, even if a descendant got the write end
+        os.set_blocking(rss_read_fd, False)
+        if cgroup is not None:
+            ready_read_fd, ready_write_fd = os.pipe()
+        command = [
+            sys.executable, "-c", SANDBOX_PRELUDE + launcher,
+            json.dumps(sandbox_config(limits, ready_read_fd, rss_write_fd)), *args,
+        ]
+        process = subprocess.Popen(
+            command,
+            cwd=cwd,
+            stdin=stdin,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            pass_fds=(*pass_fds, rss_write_fd, *((ready_read_fd,) if ready_read_fd is not None else ())),
+            start_new_session=True,
+        )
+        if cgroup is not None:
+            try:
+                cgroup.add_process(process.pid)
+                os.write(ready_write_fd, b"\0")
+            except BaseException:
+                with process:
+                    kill_process_group(process.pid)
+                    reap(process)
+                raise
+    except BaseException:
+        os.close(rss_read_fd)
+        if cgroup is not None:
+            cgroup.remove()
+        raise
+    finally:
+        for fd in (ready_read_fd, ready_write_fd, rss_write_fd):
+            if fd is not None:
+                os.close(fd)
+    return SandboxedProcess(process=process, limits=limits, cgroup=cgroup, rss_read_fd=rss_read_fd)
+
+
+def _read_peak_rss_kb(sandboxed: SandboxedProcess) -> Optional[int]:
+    """The peak RSS the reaped process reported at exit, None if it did not (e.g. it was killed)."""
+    try:
+        return int(os.read(sandboxed.rss_read_fd, 64))
+    except (BlockingIOError, ValueError):
+        return None
+
+
+def finish_sandboxed(sandboxed: SandboxedProcess, timeout: float, input_data: Optional[bytes] = None) -> SandboxedRun:
+    """
+    Run a process started by `spawn_sandboxed` to completion, optionally writing `input_data` to its
+    stdin first, capturing a bounded part of its output as it runs; its process tree is killed
+    when it exits or hits a limit.
+    The wall time and timeout run from this call, the resource usage is that of the process alone
+    (from wait4), so that several runs can go on concurrently in one worker process.
+    """
+    process, limits, cgroup = sandboxed.process, sandboxed.limits, sandboxed.cgroup
+    max_output_bytes = limits.max_output_kb * 1024 if limits.max_output_kb is not None else None
+    started_at = time.monotonic()
+    try:
+        with process:
+            try:
+                if input_data is not None:
+                    try:
+                        # Unbuffered: nothing is left to flush (and fail) when the pipe is closed
+                        view = memoryview(input_data)
+                        while view:
+                            view = view[os.write(process.stdin.fileno(), view):]
+                    except BrokenPipeError:
+                        pass  # It exited already: its output tells why
+                    process.stdin.close()
+                output = capture_output(process, timeout=timeout, max_output_bytes=max_output_bytes)
+            finally:
+                # Kill before reaping: the pid, and so the process group, stays reserved until then
+                kill_process_group(process.pid)
+                usage = reap(process)
+        wall_time = time.monotonic() - started_at
+        peak_rss_kb = _read_peak_rss_kb(sandboxed)
+        stderr = output.stderr_tail.decode(errors="replace").strip()
+        if output.timed_out:
+            verdict = TIME_LIMIT_EXCEEDED
+        else:
+            verdict = limit_verdict(limits, process.returncode, stderr, output, cgroup, usage)
+    finally:
+        os.close(sandboxed.rss_read_fd)
+        if cgroup is not None:
+            cgroup.remove()
+
+    return SandboxedRun(
+        output=output,
+        stderr=stderr,
+        returncode=process.returncode,
+        limit_verdict=verdict,
+        cpu_time=usage.ru_utime + usage.ru_stime if usage is not None else wall_time,
+        wall_time=wall_time,
+        peak_rss_kb=peak_rss_kb,
+    )
+
+
+def discard_sandboxed(sandboxed: SandboxedProcess):
+    """Kill and reap a process started by `spawn_sandboxed` that is no longer needed."""
+    process = sandboxed.process
+    try:
+        with process:
+            kill_process_group(process.pid)
+            reap(process)
+    finally:
+        os.close(sandboxed.rss_read_fd)
+        if sandboxed.cgroup is not None:
+            sandboxed.cgroup.remove()
+
+
+def run_sandboxed(
+    launcher: str,
+    args: Sequence[str],
+    cwd: Path,
+    limits: ResourceLimits,
+    timeout: float,
+    pass_fds: Sequence[int] = (),
+) -> SandboxedRun:
+    """
+    Run a Python launcher under resource limits (see `spawn_sandboxed` and `finish_sandboxed`).
+    """
+    return finish_sandboxed(spawn_sandboxed(launcher, args, cwd, limits, pass_fds=pass_fds), timeout=timeout)
+
+
+def kill_process_group(pgid: int):
+    """Kill the processes left in the group of a sandboxed process (e.g. forked by the student's program)."""
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
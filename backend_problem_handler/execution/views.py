@@ -3,17 +3,22 @@ import logging
 import os
 from typing import Any, Dict
 
+from django.db.models import Exists, OuterRef
 from django.http import JsonResponse, HttpRequest, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 
-from user_customizable_configs.programming_tasks.task_loader import get_task
+from user_customizable_configs.programming_tasks.task_loader import TaskMetadataLoadError, get_task
+from backend_problem_handler.settings import EXECUTION_COALESCE_IN_FLIGHT
+from execution.utils.dedup_utils import PENDING_TIMEOUT_FACTOR, find_in_flight_execution, program_hash, resolve_alias
+from execution.utils.notebook_utils import NotebookError, extract_program_cells
 from execution.utils.queue_utils import publish_task
 
 from .models import ProgramExecution
 
 logger = logging.getLogger(__name__)
 
+EXECUTION_MODES = ("test", "benchmark")
 
 
 @csrf_exempt
@@ -23,12 +28,20 @@ def execute_program(request: HttpRequest) -> HttpResponse:
     JSON body:
       {
         "problem_id": "<id>",
-        "student_program": "<python source>"
+        "student_program": "<python source>",
+        "student_notebook": {<nbformat JSON>},  # instead of student_program
+        "mode": "test" | "benchmark"  # optional, default "test"
       }
+    From a notebook, the code cells of the problem's program (see the task's `notebook` config)
+    are run one by one, and the CPU time of each cell is reported.
+    In benchmark mode, a correct program is also benchmarked (see `benchmark_program`).
+    A request for a program already in flight for the problem (e.g. a double-click on Run) is
+    coalesced with it: it is not run again, and reports the result of the first execution.
 
     Returns:
         {
             "execution_id": "<id>",
+            "alias_of": "<id>",  # only if coalesced: the execution whose result it reports
         }
     """
     if request.method != "POST":
@@ -43,22 +56,69 @@ def execute_program(request: HttpRequest) -> HttpResponse:
 
     problem_id = payload.get("problem_id")
     student_program = payload.get("student_program")
+    student_notebook = payload.get("student_notebook")
+    mode = payload.get("mode") or "test"
 
     if not problem_id:
         logger.warning("Missing field: problem_id")
         return JsonResponse({"error": "Missing field: problem_id"}, status=400)
-    if not isinstance(student_program, str):
+    if not isinstance(student_program, str) and student_notebook is None:
         logger.warning("Missing field: student_program")
-        return JsonResponse({"error": "Missing field: student_program"}, status=400)
+        return JsonResponse({"error": "Missing field: student_program or student_notebook"}, status=400)
+    if mode not in EXECUTION_MODES:
+        logger.warning(f"Invalid mode: {mode}")
+        return JsonResponse({"error": f"Invalid mode, expected one of: {', '.join(EXECUTION_MODES)}"}, status=400)
+
+    # Extract the program's cells from a notebook
+    cells = None
+    if not isinstance(student_program, str):
+        try:
+            notebook_cells = get_task(problem_id).notebook
+        except (KeyError, TaskMetadataLoadError) as e:
+            logger.warning(f"Notebook submitted for unavailable problem_id={problem_id}: {e}")
+            return JsonResponse({"error": f"Unknown problem: {problem_id}"}, status=400)
+        if notebook_cells is None:
+            logger.warning(f"Notebook submitted for problem_id={problem_id}, which has no notebook config")
+            return JsonResponse({"error": "This problem does not accept notebooks"}, status=400)
+        try:
+            if isinstance(student_notebook, str):
+                student_notebook = json.loads(student_notebook)
+            cells = extract_program_cells(student_notebook, notebook_cells)
+        except (json.JSONDecodeError, NotebookError) as e:
+            logger.warning(f"Invalid notebook for problem_id={problem_id}: {e}")
+            return JsonResponse({"error": f"Invalid student_notebook: {e}"}, status=400)
+        student_program = "\n".join(cells)
+
+    # Look for an identical execution in flight
+    hash_ = program_hash(problem_id, student_program, cells)
+    in_flight = None
+    if EXECUTION_COALESCE_IN_FLIGHT:
+        try:
+            in_flight = find_in_flight_execution(problem_id, hash_, mode)
+        except (KeyError, TaskMetadataLoadError):
+            pass  # Unknown or broken problem: the worker reports it
 
     # Create execution record
     exec_rec = ProgramExecution.objects.create(
         problem_id=problem_id,
+        mode=mode,
+        program=student_program,
+        cells=cells,
+        program_hash=hash_,
+        alias_of=in_flight,
     )
     logger.info(
         f"Added execution record id={exec_rec.pk} for problem_id={problem_id}",
     )
 
+    if in_flight is not None:
+        # Unless it was cancelled in the meantime, the execution in flight answers this one
+        if ProgramExecution.objects.filter(pk=in_flight.pk, is_cancelled=False).exists():
+            logger.info(f"Coalesced execution id={exec_rec.pk} with execution id={in_flight.pk} in flight")
+            return JsonResponse({"execution_id": exec_rec.pk, "alias_of": in_flight.pk}, status=200)
+        exec_rec.alias_of = None
+        exec_rec.save(update_fields=["alias_of", "updated_at"])
+
     # Queue this task for async processing
     try:
         publish_task(
@@ -67,7 +127,9 @@ def execute_program(request: HttpRequest) -> HttpResponse:
             data={
                 "problem_id": problem_id,
                 "student_program": student_program,
+                "cells": cells,
                 "execution_id": exec_rec.pk,
+                "mode": mode,
             },
             priority=int(os.environ["EXECUTE_PROGRAM_PRIORITY"]),
         )
@@ -95,7 +157,11 @@ def get_execution_result(request: HttpRequest) -> HttpResponse:
             "execution_id": "<id>",
             "correctness": <bool>,
             "buggy_output": "<str>",
-            "elapsed_time": <float>,
+            "elapsed_time": <float>,  # CPU seconds
+            "wall_time": <float>,
+            "peak_rss_kb": <int>,
+            "cell_times": [<float>, ...] | null,  # CPU seconds per notebook cell run
+            "benchmark": {"cpu_time_median": <float>, "cpu_time_mad": <float>, ...} | null,
         }
     """
     if request.method != "GET":
@@ -118,17 +184,22 @@ def get_execution_result(request: HttpRequest) -> HttpResponse:
         logger.info(f"Execution result requested for unknown execution_id={execution_id}")
         return JsonResponse({"error": "Execution record not found", "execution_id": execution_id}, status=404)
 
+    # A coalesced execution reports the result of the one it was coalesced with
+    exec_rec = resolve_alias(exec_rec)
+
     if exec_rec.is_success is None:
+        # Running on a worker that still renews its lease: pending (a lost worker's lease is reaped)
+        if exec_rec.lease_expires_at is not None and exec_rec.lease_expires_at >= timezone.now():
+            return JsonResponse({"job_finished": False, "execution_id": execution_id}, status=200)
         # Still pending (probably), or terminated unexpectedly without setting is_success
         # Load problem config and check if time exceeded 10 times the expected time limit, if so mark as failed
-        exec_rec = ProgramExecution.objects.get(pk=execution_id)
         try:
             task = get_task(exec_rec.problem_id, strict_files=True)
         except Exception as e:
             logger.info(f"Failed to load task config for problem_id={exec_rec.problem_id}: {e}")
             return JsonResponse({"error": "Failed to load task config", "execution_id": execution_id}, status=500)
         waited_time = (timezone.now() - exec_rec.created_at).total_seconds()
-        if waited_time > 10 * task.timeout:
+        if waited_time > PENDING_TIMEOUT_FACTOR * task.timeout:
             return JsonResponse({"error": "Execution took too long (more than 10 times the expected time limit), possibly due to worker failure", "execution_id": execution_id}, status=500)
         # Still pending
         return JsonResponse({"job_finished": False, "execution_id": execution_id}, status=200)
@@ -149,5 +220,57 @@ def get_execution_result(request: HttpRequest) -> HttpResponse:
         "correctness": exec_rec.correctness,
         "buggy_output": exec_rec.output,
         "elapsed_time": round(exec_rec.elapsed_time, 6) if exec_rec.elapsed_time is not None else None,
+        "wall_time": round(exec_rec.wall_time, 6) if exec_rec.wall_time is not None else None,
+        "peak_rss_kb": exec_rec.peak_rss_kb,
+        "cell_times": [round(t, 6) for t in exec_rec.cell_times] if exec_rec.cell_times is not None else None,
+        "benchmark": exec_rec.benchmark,
     }
-    return JsonResponse(resp, status=200)
\ No newline at end of file
+    return JsonResponse(resp, status=200)
+
+
+@csrf_exempt
+def cancel_execution(request: HttpRequest) -> HttpResponse:
+    """
+    POST /cancel_execution/
+    JSON body:
+      {
+        "execution_id": <id>
+      }
+
+    Marks a pending execution as cancelled: workers skip it instead of running it, and polling
+    reports it as finished with an error. Finished executions are left untouched, and so are
+    executions whose result other (coalesced) requesters still wait for.
+    Returns 204 on success or if the execution already finished, 409 if coalesced requesters still
+    wait for it (it keeps running), 404 if the execution is unknown.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+        execution_id = int(payload["execution_id"])
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        logger.warning("Invalid body for cancel_execution")
+        return JsonResponse({"error": "Invalid body: execution_id required"}, status=400)
+
+    if not ProgramExecution.objects.filter(pk=execution_id).exists():
+        return JsonResponse({"error": "Execution record not found", "execution_id": execution_id}, status=404)
+
+    waiting_aliases = ProgramExecution.objects.filter(
+        alias_of=OuterRef("pk"), is_success__isnull=True, is_cancelled=False,
+    )
+    cancelled = ProgramExecution.objects.filter(pk=execution_id, is_success__isnull=True).exclude(
+        Exists(waiting_aliases),
+    ).update(
+        is_cancelled=True,
+        is_success=False,
+        error="Execution cancelled",
+        updated_at=timezone.now(),
+    )
+    logger.info(f"cancel_execution execution_id={execution_id} cancelled={bool(cancelled)}")
+    if not cancelled and ProgramExecution.objects.filter(pk=execution_id, is_success__isnull=True).exists():
+        return JsonResponse(
+            {"error": "Execution still awaited by coalesced requests; not cancelled", "execution_id": execution_id},
+            status=409,
+        )
+    return HttpResponse(status=204)
@@ -1,44 +1,40 @@
 import logging
 import os
 import time
-from typing import Dict
+
+from django.utils import timezone
 
 from execution.utils.queue_utils import publish_task
 from user_customizable_configs.programming_tasks.task_loader import (
-    get_task,
+    get_task_assets,
     TaskMetadataLoadError,
 )
-from execution.utils.execution_utils import run_program_on_test_cases
+from execution.utils.execution_utils import benchmark_program, execution_time_budget, run_program_on_test_cases
+from execution.utils.lease_utils import claim_lease, leased
+from execution.utils.notebook_utils import run_notebook_on_test_cases
 from execution.models import ProgramExecution
 
 logger = logging.getLogger(__name__)
 
 
-def _load_task_assets(task) -> Dict[str, str]:
-    try:
-        test_template = task.test_template_path.read_text(encoding="utf-8")
-    except Exception as e:
-        raise RuntimeError(f"Failed reading test template: {e}")
-
-    try:
-        test_cases = [p.read_text(encoding="utf-8") for p in task.test_case_paths]
-    except Exception as e:
-        raise RuntimeError(f"Failed reading test cases: {e}")
-
-    return {"test_template": test_template, "test_cases": test_cases}
-
-
 def execute_program(arguments):
     execution_id = arguments["data"].get("execution_id")
     problem_id = arguments["data"].get("problem_id")
     program = arguments["data"].get("student_program")
+    cells = arguments["data"].get("cells")
+    mode = arguments["data"].get("mode", "test")
 
     if not problem_id or not isinstance(program, str):
         raise ValueError("Missing problem_id or student_program in data")
 
-    # Fetch task metadata
+    # Do not spawn the program if the requester has cancelled the execution in the meantime
+    if ProgramExecution.objects.filter(pk=execution_id, is_cancelled=True).exists():
+        logger.info(f"Skipping cancelled execution {execution_id} for {problem_id}")
+        return
+
+    # Fetch the task and its precompiled test harness from the registry
     try:
-        task = get_task(problem_id, strict_files=True)
+        assets = get_task_assets(problem_id)
     except KeyError:
         logger.info(f"Execute requested for unknown problem_id={problem_id}")
         raise
@@ -46,32 +42,43 @@ def execute_program(arguments):
         logger.exception(f"Task metadata load error for {problem_id}")
         raise
 
-    # Load test assets
-    try:
-        assets = _load_task_assets(task)
-    except RuntimeError as e:
-        logger.exception(f"Asset load failure for {problem_id}")
-        raise
-
-    try:
-        correctness, buggy_output, elapsed_time = run_program_on_test_cases(
-            program=program,
-            test_template=assets["test_template"],
-            test_cases=assets["test_cases"],
-            execution_path=task.execution_dir_path,
-            timeout=task.timeout,
+    # Hold the execution's lease while running it: if this worker dies, the reaper re-dispatches it
+    if not claim_lease(execution_id):
+        logger.info(f"Skipping execution {execution_id} for {problem_id}: finished, cancelled or run by another worker")
+        return
+
+    with leased(execution_id, max_seconds=execution_time_budget(assets, mode)):
+        try:
+            if cells is not None:
+                result = run_notebook_on_test_cases(
+                    cells=cells,
+                    assets=assets,
+                )
+            else:
+                result = run_program_on_test_cases(
+                    program=program,
+                    assets=assets,
+                )
+            # Only a correct program is worth benchmarking
+            benchmark = None
+            if mode == "benchmark" and result.correctness:
+                benchmark = benchmark_program(program=program, assets=assets)
+        except Exception as e:
+            logger.exception(f"Execution failure for {problem_id}: {e}")
+            raise
+
+        # Save execution result to database (unless the execution was cancelled while running)
+        ProgramExecution.objects.filter(pk=execution_id, is_cancelled=False).update(
+            output=result.buggy_output,
+            correctness=result.correctness,
+            elapsed_time=result.cpu_time,
+            wall_time=result.wall_time,
+            peak_rss_kb=result.peak_rss_kb,
+            cell_times=result.cell_times,
+            benchmark=benchmark.as_dict() if benchmark is not None else None,
+            is_success=True,
+            updated_at=timezone.now(),
         )
-    except Exception as e:
-        logger.exception(f"Execution failure for {problem_id}: {e}")
-        raise
-
-    # Save execution result to database
-    exec_rec = ProgramExecution.objects.get(pk=execution_id)
-    exec_rec.output = buggy_output
-    exec_rec.correctness = correctness
-    exec_rec.elapsed_time = elapsed_time
-    exec_rec.is_success = True
-    exec_rec.save(update_fields=["output", "correctness", "elapsed_time", "is_success"])
 
 
 def set_unsuccessful(arguments, error_message):
@@ -79,6 +86,8 @@ def set_unsuccessful(arguments, error_message):
         if arguments["type"] == "execute_program":
             execution_id = arguments["data"].get("execution_id")
             exec_rec = ProgramExecution.objects.get(pk=execution_id)
+            if exec_rec.is_cancelled:
+                return
             exec_rec.is_success = False
             exec_rec.error = error_message
             exec_rec.save(update_fields=["is_success", "error", "updated_at"])
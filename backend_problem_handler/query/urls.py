@@ -5,4 +5,5 @@ from . import views
 app_name = "query"
 urlpatterns = [
     path("programming_problems/", views.query_programming_problems, name="query_programming_problems"),
+    path("reload_programming_problems/", views.reload_programming_problems, name="reload_programming_problems"),
 ]
\ No newline at end of file
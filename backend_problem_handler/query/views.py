@@ -1,44 +1,59 @@
+import hashlib
+import json
 import logging
 from typing import Any, Dict, List
 
 from django.http import JsonResponse, HttpRequest, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.cache import get_conditional_response
 
 logger = logging.getLogger(__name__)
 
 from user_customizable_configs.programming_tasks.task_loader import (
-    get_task_metadata,
-    get_task,
+    TaskAssets,
+    get_all_task_assets,
+    get_task_assets,
+    reload_task_metadata,
 )
 
 
-def _serialize_task_basic(task, include_description: bool) -> Dict[str, Any]:
+def _serialize_task_basic(assets: TaskAssets, include_description: bool) -> Dict[str, Any]:
+    task = assets.task
     data = {"problem_id": task.problem_id, "name": getattr(task, "name", None) or task.problem_id}
     if include_description:
-        try:
-            data["task_description"] = task.description_path.read_text(encoding="utf-8")
-        except FileNotFoundError:
-            data["task_description_error"] = (
-                f"Description file missing: {task.description_path}"
-            )
-        except OSError as e:
-            data["task_description_error"] = f"Error reading description: {e}"
-        
-        try:
-            data["template_code"] = task.template_code_path.read_text(encoding="utf-8")
-        except FileNotFoundError:
-            data["template_code_error"] = (
-                f"Template code file missing: {task.template_code_path}"
-            )
-        except OSError as e:
-            data["template_code_error"] = f"Error reading template code: {e}"
+        # Texts are preloaded in the task registry
+        if assets.task_description is not None:
+            data["task_description"] = assets.task_description
+        else:
+            data["task_description_error"] = assets.task_description_error
+
+        if assets.template_code is not None:
+            data["template_code"] = assets.template_code
+        else:
+            data["template_code_error"] = assets.template_code_error
     return data
 
 
+def _conditional_json_response(request: HttpRequest, data: Any) -> HttpResponse:
+    """
+    JSON response with an ETag of its content; 304 Not Modified if the client's
+    If-None-Match already names this content, so consumers can cache problems and revalidate.
+    """
+    body = json.dumps(data)
+    etag = f'"{hashlib.sha256(body.encode("utf-8")).hexdigest()[:32]}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type="application/json", status=200)
+    response["ETag"] = etag
+    return response
+
+
 def query_programming_problems(request: HttpRequest) -> HttpResponse:
     """
     GET /query_programming_problems
       Optional query params:
         problem_id=<id>            Return a single problem.
+      Responses carry an ETag; send it back in If-None-Match to get 304 if unchanged.
     """
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -48,19 +63,19 @@ def query_programming_problems(request: HttpRequest) -> HttpResponse:
     # Single problem path
     if problem_id:
         try:
-            task = get_task(problem_id)
+            assets = get_task_assets(problem_id)
         except KeyError:
             logger.info(f"Problem not found: {problem_id}")
             return JsonResponse(
                 {"error": "Problem not found", "problem_id": problem_id}, status=404
             )
-        data = _serialize_task_basic(task, include_description=True)
+        data = _serialize_task_basic(assets, include_description=True)
         logger.info(f"Returning single programming problem: {problem_id}")
-        return JsonResponse(data, status=200)
+        return _conditional_json_response(request, data)
 
     # Listing path
     try:
-        tasks = get_task_metadata()
+        tasks = get_all_task_assets()
     except Exception as e:
         logger.exception("Failed loading task metadata")
         return JsonResponse(
@@ -69,4 +84,26 @@ def query_programming_problems(request: HttpRequest) -> HttpResponse:
 
     listing: List[Dict[str, Any]] = [_serialize_task_basic(t, False) for t in tasks]
     logger.info(f"Returning {len(listing)} programming problems")
-    return JsonResponse(listing, safe=False, status=200)
+    return _conditional_json_response(request, listing)
+
+
+@csrf_exempt
+def reload_programming_problems(request: HttpRequest) -> HttpResponse:
+    """
+    POST /reload_programming_problems
+      Rebuild the task registry of this process from the task files now
+      (other processes pick up changed files through the registry's file watch).
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        n_tasks = reload_task_metadata()
+    except Exception as e:
+        logger.exception("Failed reloading task metadata")
+        return JsonResponse(
+            {"error": "Failed to reload tasks", "detail": str(e)}, status=500
+        )
+
+    logger.info(f"Reloaded {n_tasks} programming problems")
+    return JsonResponse({"n_tasks": n_tasks}, status=200)
@@ -0,0 +1,3 @@
+def read_file():
+    with open("assets/data.txt", encoding="utf-8") as f:
+        return f.read()
@@ -1,6 +1,14 @@
-from functools import lru_cache
+import hashlib
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 from natsort import natsorted
 import yaml
@@ -13,9 +21,18 @@ from backend_problem_handler.settings import (
     PROGRAMMING_TASK_CONFIGS_TEST_TEMPLATES,
     PROGRAMMING_TASK_CONFIGS_TEST_CASES,
     PROGRAMMING_TASK_CONFIGS_EXECUTION_BOXES,
+    PROGRAMMING_TASK_CONFIGS_REFERENCE_SOLUTIONS,
+    PROGRAMMING_TASK_REGISTRY_WATCH_INTERVAL_SECONDS,
+    PROGRAMMING_TASK_HARNESS_CACHE_DIR,
 )
 
 
+logger = logging.getLogger(__name__)
+
+PROGRAM_PLACEHOLDER = r"###{{{ INPUT_PROGRAM }}}###"
+TEST_CASES_PLACEHOLDER = r"###{{{ TEST_CASES }}}###"
+
+
 REQUIRED_TASK_FIELDS = {
     "task_description_file",
     "template_code_file",
@@ -26,6 +43,20 @@ REQUIRED_TASK_FIELDS = {
 }
 
 
+class ResourceLimits(BaseModel):
+    """Caps of one execution of a student's program (None: not capped)."""
+    memory_mb: PositiveInt | None = Field(default=None, description="Address space (RLIMIT_AS), and memory.max with cgroups.")
+    cpu_seconds: PositiveInt | None = Field(default=None, description="CPU time (RLIMIT_CPU).")
+    max_processes: PositiveInt | None = Field(default=None, description="Processes (RLIMIT_NPROC, per user), and pids.max with cgroups.")
+    max_output_kb: PositiveInt | None = Field(default=None, description="Combined stdout and stderr size.")
+
+
+class NotebookCells(BaseModel):
+    """Where a task's program is in a notebook: the code cells between two cells marked with nbgrader grade ids."""
+    start_grade_id: str = Field(..., description="Grade id of the cell before the program (the question).")
+    end_grade_id: str = Field(..., description="Grade id of the cell after the program (e.g. the assertions).")
+
+
 class TaskMetadata(BaseModel):
     problem_id: str = Field(..., description="Unique task ID (YAML key).")
     name: str | None = Field(default=None, description="Human-friendly task name.") # Optional human-friendly name
@@ -35,6 +66,12 @@ class TaskMetadata(BaseModel):
     test_case_files: str
     execution_dir: str
     timeout: PositiveInt
+    # Top-level `default_resource_limits`, overridden field by field by the task's `resource_limits`
+    resource_limits: ResourceLimits = Field(default_factory=ResourceLimits)
+    # Cells of the task's program in a notebook submission (None: notebooks are not accepted)
+    notebook: NotebookCells | None = None
+    # Glob patterns, relative to the execution dir, of the data files preloaded into memory for the executions
+    preload_assets: List[str] = Field(default_factory=list)
 
     @property
     def description_path(self) -> Path:
@@ -56,6 +93,16 @@ class TaskMetadata(BaseModel):
     def execution_dir_path(self) -> Path:
         return PROGRAMMING_TASK_CONFIGS_EXECUTION_BOXES / self.execution_dir
 
+    @property
+    def reference_solution_path(self) -> Path:
+        """A correct program for the task (optional file), named like its template code."""
+        return PROGRAMMING_TASK_CONFIGS_REFERENCE_SOLUTIONS / self.template_code_file
+
+    @property
+    def preload_asset_paths(self) -> List[Path]:
+        paths = {p for pattern in self.preload_assets for p in self.execution_dir_path.glob(pattern) if p.is_file()}
+        return sorted(paths)
+
 
 class TaskMetadataLoadError(RuntimeError):
     pass
@@ -72,6 +119,10 @@ def _parse_yaml(path: Path) -> Dict[str, TaskMetadata]:
     if not isinstance(tasks_section, dict):
         raise TaskMetadataLoadError("'tasks' key missing or not a mapping.")
 
+    default_limits = raw.get("default_resource_limits") or {}
+    if not isinstance(default_limits, dict):
+        raise TaskMetadataLoadError("'default_resource_limits' must be a mapping.")
+
     base_dir = path.parent
     tasks: Dict[str, TaskMetadata] = {}
 
@@ -88,6 +139,7 @@ def _parse_yaml(path: Path) -> Dict[str, TaskMetadata]:
         # Pull optional friendly name; default to problem_id if not provided
         data_with_id_and_name = {**data}
         data_with_id_and_name.setdefault("name", problem_id)
+        data_with_id_and_name["resource_limits"] = {**default_limits, **(data.get("resource_limits") or {})}
 
         model = TaskMetadata(
             problem_id=problem_id,
@@ -117,24 +169,220 @@ def _validate_file_existence(tasks: Dict[str, TaskMetadata]) -> None:
             "File existence validation failed:\n  " + "\n  ".join(missing)
         )
 
-@lru_cache(maxsize=2)
-def load_task_metadata(strict_files: bool = False) -> List[TaskMetadata]:
+@dataclass(frozen=True)
+class TaskAssets:
+    """
+    A task with its files read once, when the registry is built.
+    Files that cannot be read are recorded as errors instead of failing the whole registry.
+    """
+    task: TaskMetadata
+    task_description: Optional[str]
+    task_description_error: Optional[str]
+    template_code: Optional[str]
+    template_code_error: Optional[str]
+    # Test harness (test template with the test cases filled in), split at the program placeholder
+    harness_parts: Tuple[bytes, ...]
+    harness_error: Optional[str]
+    # The code objects of the harness before and after the program, marshaled (None if the parts
+    # do not compile on their own, e.g. a template wrapping the program in a block)
+    compiled_harness: Optional[bytes] = None
+    # (path relative to the execution dir, size, mtime) of each file to preload
+    preloaded_files: Tuple[Tuple[str, int, int], ...] = ()
+
+    def build_test_program(self, program: str) -> bytes:
+        """The test program for a student's program: the harness with the program filled in."""
+        if self.harness_error:
+            raise TaskMetadataLoadError(self.harness_error)
+        return program.encode("utf-8").join(self.harness_parts)
+
+    def compiled_harness_path(self) -> Optional[Path]:
+        """
+        Path of the file holding `compiled_harness`, written on first use (None if not precompiled).
+        The file name depends on the content and the interpreter version, so stale files are never used.
+        """
+        if self.harness_error:
+            raise TaskMetadataLoadError(self.harness_error)
+        if self.compiled_harness is None:
+            return None
+        digest = hashlib.sha256(sys.version.encode("utf-8") + self.compiled_harness).hexdigest()[:16]
+        path = Path(PROGRAMMING_TASK_HARNESS_CACHE_DIR) / f"{self.task.problem_id}-{digest}.marshal"
+        if not path.is_file():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            tmp_path.write_bytes(self.compiled_harness)
+            os.replace(tmp_path, path)  # atomic: concurrent runs never read a partial file
+        return path
+
+
+def _read_text(path: Path, label: str) -> Tuple[Optional[str], Optional[str]]:
+    try:
+        return path.read_text(encoding="utf-8"), None
+    except FileNotFoundError:
+        return None, f"{label} file missing: {path}"
+    except OSError as e:
+        return None, f"Error reading {label.lower()}: {e}"
+
+
+def _load_assets(task: TaskMetadata) -> TaskAssets:
+    description, description_error = _read_text(task.description_path, "Description")
+    template_code, template_code_error = _read_text(task.template_code_path, "Template code")
+
+    harness_parts: Tuple[bytes, ...] = ()
+    harness_error = None
+    test_template, test_template_error = _read_text(task.test_template_path, "Test template")
+    if test_template_error:
+        harness_error = test_template_error
+    elif not task.execution_dir_path.is_dir():
+        harness_error = f"Missing execution dir {task.execution_dir_path}"
+    else:
+        try:
+            test_cases = [p.read_text(encoding="utf-8") for p in task.test_case_paths]
+        except OSError as e:
+            harness_error = f"Failed reading test cases: {e}"
+        else:
+            harness = test_template.replace(TEST_CASES_PLACEHOLDER, "\n\n".join(test_cases))
+            harness_parts = tuple(part.encode("utf-8") for part in harness.split(PROGRAM_PLACEHOLDER))
+
+    return TaskAssets(
+        task=task,
+        task_description=description,
+        task_description_error=description_error,
+        template_code=template_code,
+        template_code_error=template_code_error,
+        harness_parts=harness_parts,
+        harness_error=harness_error,
+        compiled_harness=_compile_harness(task, harness_parts),
+        preloaded_files=_preloaded_files(task),
+    )
+
+
+def _preloaded_files(task: TaskMetadata) -> Tuple[Tuple[str, int, int], ...]:
+    files = []
+    for path in task.preload_asset_paths:
+        try:
+            stat = path.stat()
+        except OSError as e:
+            logger.warning(f"Asset {path} of {task.problem_id} is not preloaded: {e}")
+            continue
+        files.append((str(path.relative_to(task.execution_dir_path)), stat.st_size, stat.st_mtime_ns))
+    return tuple(files)
+
+
+def _compile_harness(task: TaskMetadata, harness_parts: Tuple[bytes, ...]) -> Optional[bytes]:
+    """
+    Compile the harness before the program (template prologue) and after it (test cases) into
+    marshaled code objects, so that only the student's program is compiled per run.
+    """
+    if len(harness_parts) != 2:
+        return None
+    try:
+        prologue = compile(harness_parts[0], f"<{task.problem_id} test template>", "exec", dont_inherit=True)
+        tests = compile(harness_parts[1], f"<{task.problem_id} test cases>", "exec", dont_inherit=True)
+    except SyntaxError as e:
+        logger.info(f"Test harness of {task.problem_id} is compiled with each program ({e})")
+        return None
+    return marshal.dumps((prologue, tests))
+
+
+def _files_signature(tasks: Dict[str, TaskMetadata]) -> Tuple:
+    """
+    (path, mtime, size) of every file the registry is built from, to detect changes. Not the execution
+    dirs themselves: executions write and remove their temporary programs there, changing their mtime.
+    """
+    paths = [Path(PROGRAMMING_TASK_CONFIGS_TASK_METADATA)]
+    for t in tasks.values():
+        paths.extend([t.description_path, t.template_code_path, t.test_template_path])
+        paths.extend(t.test_case_paths)
+        paths.extend(t.preload_asset_paths)
+    signature = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((str(path), None, None))
+    # By path: the tasks come in file order when building the registry, in sorted order when checking it
+    return tuple(sorted(signature, key=lambda entry: entry[0]))
+
+
+@dataclass
+class _Registry:
+    tasks: Dict[str, TaskAssets]  # by problem_id, in sorted order
+    signature: Tuple
+    checked_at: float
+
+
+_registry: Optional[_Registry] = None
+_registry_lock = threading.Lock()
+
+
+def _build_registry() -> _Registry:
     path = Path(PROGRAMMING_TASK_CONFIGS_TASK_METADATA).resolve()
     if not path.is_file():
         raise TaskMetadataLoadError(f"Metadata file not found: {path}")
     tasks = _parse_yaml(path)
+    registry = _Registry(
+        tasks={k: _load_assets(tasks[k]) for k in sorted(tasks.keys())},
+        signature=_files_signature(tasks),
+        checked_at=time.monotonic(),
+    )
+    for assets in registry.tasks.values():
+        if assets.harness_error:
+            logger.warning(f"Task {assets.task.problem_id} cannot be executed: {assets.harness_error}")
+    logger.info(f"Built task registry with {len(registry.tasks)} tasks")
+    return registry
+
+
+def _get_registry() -> _Registry:
+    """
+    The registry of all tasks, built on first use. With a watch interval configured, the task
+    files are checked for changes at most that often and the registry is rebuilt if they changed.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = _build_registry()
+        elif (
+            PROGRAMMING_TASK_REGISTRY_WATCH_INTERVAL_SECONDS > 0
+            and time.monotonic() - _registry.checked_at >= PROGRAMMING_TASK_REGISTRY_WATCH_INTERVAL_SECONDS
+        ):
+            signature = _files_signature({a.task.problem_id: a.task for a in _registry.tasks.values()})
+            if signature != _registry.signature:
+                logger.info("Task files changed, rebuilding the task registry")
+                _registry = _build_registry()
+            else:
+                _registry.checked_at = time.monotonic()
+        return _registry
+
+
+def load_task_metadata(strict_files: bool = False) -> List[TaskMetadata]:
+    tasks = {problem_id: assets.task for problem_id, assets in _get_registry().tasks.items()}
     if strict_files:
         _validate_file_existence(tasks)
-    return [tasks[k] for k in sorted(tasks.keys())]
+    return list(tasks.values())
 
-def reload_task_metadata() -> None:
-    load_task_metadata.cache_clear()
+def reload_task_metadata() -> int:
+    """Rebuild the task registry from the files now. Returns the number of tasks."""
+    global _registry
+    registry = _build_registry()
+    with _registry_lock:
+        _registry = registry
+    return len(registry.tasks)
 
 def get_task_metadata(strict_files: bool = False) -> List[TaskMetadata]:
     return load_task_metadata(strict_files=strict_files)
 
+def get_all_task_assets() -> List[TaskAssets]:
+    return list(_get_registry().tasks.values())
+
+def get_task_assets(problem_id: str) -> TaskAssets:
+    try:
+        return _get_registry().tasks[problem_id]
+    except KeyError:
+        raise KeyError(f"Unknown problem_id '{problem_id}'") from None
+
 def get_task(problem_id: str, strict_files: bool = False) -> TaskMetadata:
-    for task in load_task_metadata(strict_files=strict_files):
-        if task.problem_id == problem_id:
-            return task
-    raise KeyError(f"Unknown problem_id '{problem_id}'")
\ No newline at end of file
+    assets = get_task_assets(problem_id)
+    if strict_files and assets.harness_error:
+        raise TaskMetadataLoadError(f"{problem_id}: {assets.harness_error}")
+    return assets.task
@@ -14,6 +14,7 @@ interface PendingAIHint {
   request_id: number;
   type: 'plan' | 'debug' | 'optimize';
   created_at: string;
+  partial_hint?: string | null; // hint text streamed so far
 }
 
 // Per-hint-type reflection questions
@@ -223,6 +224,11 @@ export default function App() {
             setActiveHintRef({ type: 'ai', id: status.request_id });
           } else {
             logDebug('HINT', 'poll:pending', status);
+            if (status.partial_hint) {
+              setPendingHints((p: PendingAIHint[]) =>
+                p.map((h) => (h.request_id === ph.request_id ? { ...h, partial_hint: status.partial_hint } : h))
+              );
+            }
           }
         })
         .catch((err) => {
@@ -635,6 +641,7 @@ export default function App() {
                     const current = pendingHints[pendingHints.length - 1];
                     const label = current?.type === 'plan' ? 'Planning Hint' : current?.type === 'debug' ? 'Debugging Hint' : 'Optimization Hint';
                     return (
+                      <div>
                       <div className="flex justify-center items-center gap-2">
                         <div className="flex items-center rounded py-1.5 px-2 text-sm text-gray-700 whitespace-nowrap">
                           <span className="inline-block w-4 h-4 border-2 border-gray-300 border-t-gray-600 rounded-full animate-spin mr-2" />
@@ -664,6 +671,10 @@ export default function App() {
                           </button>
                         </div>
                       </div>
+                      {current?.partial_hint && (
+                        <div className="mt-2 text-sm text-gray-700 whitespace-pre-wrap border rounded p-2 bg-gray-50">{current.partial_hint}</div>
+                      )}
+                      </div>
                     );
                   })()
                 ) : (
@@ -25,6 +25,7 @@ export interface AIHintStatusResponse {
   successful?: boolean; // backend may omit; treat undefined as success if hint present
   returned_hint?: string | null;
   hint?: string | null; // some backend variants may use 'hint'
+  partial_hint?: string | null; // hint text streamed so far, while job_finished is false
 }
 
 export interface InstructorFeedback {
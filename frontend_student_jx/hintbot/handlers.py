@@ -1,13 +1,14 @@
 import json
 import os
 import time
-import requests
 import tornado
 import traceback
 import logging
 from jupyter_server.base.handlers import JupyterHandler
 from jupyter_server.extension.handler import ExtensionHandlerMixin
 
+from .http_utils import get_http_session
+
 logger = logging.getLogger(__name__)
 
 ORCH_BASE = os.getenv('HOST_URL', 'http://localhost:8000').rstrip('/')
@@ -40,7 +41,7 @@ class Job:
             self._timer += 1
             if self._timer % 5 == 0:
                 try:
-                    resp = requests.get(
+                    resp = get_http_session().get(
                         f"{ORCH_BASE}/ai_hint/query_hint/",
                         params={"request_id": self._request_id},
                         timeout=10,
@@ -87,7 +88,7 @@ class RouteHandler(ExtensionHandlerMixin, JupyterHandler):
                 student_id = os.getenv('VOC_USERID') or DEFAULT_FALLBACK_USER_ID
 
                 try:
-                    resp = requests.get(
+                    resp = get_http_session().get(
                         f"{ORCH_BASE}/ai_hint/quota_left/",
                         params={
                             "student_id": student_id,
@@ -118,7 +119,7 @@ class RouteHandler(ExtensionHandlerMixin, JupyterHandler):
                 # Use VOC_USERID if available, otherwise fallback to a fixed ID
                 student_id = os.getenv('VOC_USERID') or DEFAULT_FALLBACK_USER_ID
                 try:
-                    resp = requests.get(
+                    resp = get_http_session().get(
                         f"{ORCH_BASE}/ai_hint/has_ever_requested/",
                         params={"student_id": student_id},
                         timeout=10,
@@ -148,7 +149,7 @@ class RouteHandler(ExtensionHandlerMixin, JupyterHandler):
                     return
                 student_id = os.getenv('VOC_USERID') or DEFAULT_FALLBACK_USER_ID
                 try:
-                    resp = requests.get(
+                    resp = get_http_session().get(
                         f"{ORCH_BASE}/ai_hint/query_all_hint/",
                         params={"student_id": student_id, "problem_id": problem_id},
                         timeout=10,
@@ -172,7 +173,7 @@ class RouteHandler(ExtensionHandlerMixin, JupyterHandler):
                     return
                 student_id = os.getenv('VOC_USERID') or DEFAULT_FALLBACK_USER_ID
                 try:
-                    resp = requests.get(
+                    resp = get_http_session().get(
                         f"{ORCH_BASE}/instructor_feedback/query_all_feedback/",
                         params={"student_id": student_id, "problem_id": problem_id},
                         timeout=10,
@@ -225,7 +226,7 @@ class RouteHandler(ExtensionHandlerMixin, JupyterHandler):
                 # Debug: sending add_request to orchestration
                 self.log.info(f"Posting add_request to ORCH_BASE={ORCH_BASE} payload problem_id={problem_id} hint_type={hint_type}")
                 try:
-                    resp = requests.post(
+                    resp = get_http_session().post(
                         f"{ORCH_BASE}/ai_hint/add_request/",
                         json=payload,
                         timeout=10,
@@ -251,8 +252,10 @@ class RouteHandler(ExtensionHandlerMixin, JupyterHandler):
                     self.set_header("Content-Type", "application/json")
                     self.write(json.dumps({"request_id": req_id}))
                 else:
-                    # Forward status code and body from orchestration so client sees exact error (e.g., 429 quota)
+                    # Forward status code and body from orchestration so client sees exact error (e.g., 429 quota, 503 busy)
                     self.set_status(resp.status_code)
+                    if resp.headers.get("Retry-After"):
+                        self.set_header("Retry-After", resp.headers["Retry-After"])
                     # Try to preserve JSON body if possible
                     try:
                         # If orchestration returned JSON text, write it as-is
@@ -267,7 +270,7 @@ class RouteHandler(ExtensionHandlerMixin, JupyterHandler):
                 reflection_answer = body.get('reflection_answer')
                 self.log.info(f"Posting add_reflection to ORCH_BASE={ORCH_BASE} for request_id={request_id}")
                 try:
-                    resp = requests.post(
+                    resp = get_http_session().post(
                         f"{ORCH_BASE}/ai_hint/add_reflection/",
                         json={
                             "request_id": request_id,
@@ -336,7 +339,7 @@ class RouteHandler(ExtensionHandlerMixin, JupyterHandler):
 
                 # Forward cancellation to orchestration so the request is marked cancelled in DB
                 try:
-                    resp = requests.post(
+                    resp = get_http_session().post(
                         f"{ORCH_BASE}/ai_hint/cancel_request/",
                         json={"request_id": request_id},
                         timeout=10,
@@ -367,7 +370,7 @@ class RouteHandler(ExtensionHandlerMixin, JupyterHandler):
                 problem_id = body.get('problem_id')
                 self.log.info(f"Posting instructor_feedback add_request to ORCH_BASE={ORCH_BASE} for request_id={request_id}")
                 try:
-                    resp = requests.post(
+                    resp = get_http_session().post(
                         f"{ORCH_BASE}/instructor_feedback/add_request/",
                         json={
                             "request_id": request_id,
@@ -409,7 +412,7 @@ class RouteHandler(ExtensionHandlerMixin, JupyterHandler):
                     return
 
                 try:
-                    resp = requests.post(
+                    resp = get_http_session().post(
                         f"{ORCH_BASE}/ai_hint/save_hint_rating/",
                         json={
                             "request_id": request_id,
@@ -447,7 +450,7 @@ class RouteHandler(ExtensionHandlerMixin, JupyterHandler):
                     return
 
                 try:
-                    resp = requests.post(
+                    resp = get_http_session().post(
                         f"{ORCH_BASE}/instructor_feedback/save_feedback_rating/",
                         json={
                             "instructor_request_id": instructor_request_id,
@@ -479,7 +482,7 @@ class RouteHandler(ExtensionHandlerMixin, JupyterHandler):
                     self.write({"statusCode": 400, "message": "Missing identifiers to check instructor feedback"})
                     return
                 try:
-                    resp = requests.get(
+                    resp = get_http_session().get(
                         f"{ORCH_BASE}/instructor_feedback/query_all_feedback/",
                         params={
                             "student_id": student_id,